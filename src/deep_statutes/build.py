@@ -0,0 +1,104 @@
+import dataclasses
+import functools
+import hashlib
+import importlib.util
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+from pydantic import BaseModel
+
+
+@functools.cache
+def code_version(*modules: str) -> str:
+    """
+    sha256 of the source of the given modules (e.g. "deep_statutes.pdf.parse"), or of the
+    whole package if none are given, so that changing the code a stage runs rebuilds it.
+    """
+    if len(modules) == 0:
+        package_dir = Path(__file__).parent
+        paths = {
+            str(p.relative_to(package_dir)): p for p in package_dir.rglob("*.py")
+        }
+    else:
+        paths = {m: Path(importlib.util.find_spec(m).origin) for m in modules}
+
+    h = hashlib.sha256()
+    for name in sorted(paths):
+        h.update(f"{name}:{file_hash(paths[name])}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def file_hash(path: Path, chunk_size: int = 1 << 20) -> str:
+    """sha256 of a file's contents."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def json_hash(obj: Any) -> str:
+    """
+    sha256 of a JSON-able object (or dataclass), independent of dict ordering.
+    """
+    if dataclasses.is_dataclass(obj):
+        obj = dataclasses.asdict(obj)
+    return text_hash(json.dumps(obj, sort_keys=True, default=str))
+
+
+class StageRecord(BaseModel):
+    inputs: dict[str, str]
+    outputs: list[str]  # relative to the build root
+
+    def is_current(self, inputs: dict[str, str], root: Path) -> bool:
+        """
+        A stage is current if it was built from exactly these inputs and all of its outputs still exist.
+        """
+        return self.inputs == inputs and all(
+            (root / output).exists() for output in self.outputs
+        )
+
+    def remove_outputs(self, root: Path) -> None:
+        for output in self.outputs:
+            (root / output).unlink(missing_ok=True)
+
+
+TargetRecord = dict[str, StageRecord]  # stage name -> record
+
+
+class BuildManifest(BaseModel):
+    """
+    Records, for every target (e.g. one input PDF) and stage, the hashes of the inputs
+    the stage's outputs were built from.
+    """
+
+    targets: dict[str, TargetRecord] = {}
+
+    @classmethod
+    def load(cls, path: Path) -> "BuildManifest":
+        if not path.exists():
+            return cls()
+        with open(path, "r") as f:
+            return cls.model_validate_json(f.read())
+
+    def save(self, path: Path) -> None:
+        # write atomically so that an interrupted build never leaves a corrupt manifest
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            f.write(self.model_dump_json(indent=2))
+        os.replace(tmp_path, path)
+
+
+def stage_record(
+    inputs: dict[str, str], outputs: list[Path], root: Path
+) -> StageRecord:
+    return StageRecord(
+        inputs=inputs,
+        outputs=[str(Path(o).relative_to(root)) for o in outputs],
+    )
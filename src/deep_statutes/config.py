@@ -3,4 +3,22 @@ from pathlib import Path
 
 STATUTES_DATA_DIR=Path(os.environ.get('STATUTES_DATA_DIR', '/Users/eric/Development/deep_statutes_data'))
 
-GEMINI_API_KEY=os.environ.get('GEMINI_API_KEY')
\ No newline at end of file
+# local caches of LLM responses etc.; safe to delete
+STATUTES_CACHE_DIR=Path(os.environ.get('STATUTES_CACHE_DIR', STATUTES_DATA_DIR / 'cache'))
+
+GEMINI_API_KEY=os.environ.get('GEMINI_API_KEY')
+
+# where Gemini requests go: live, record (live, and save every exchange) or replay
+# (serve saved exchanges offline, shaped by e.g. LLM_REPLAY_OPTIONS="error_rate=0.01,seed=3")
+LLM_BACKEND=os.environ.get('LLM_BACKEND', 'live')
+LLM_RECORDING_DIR=Path(os.environ.get('LLM_RECORDING_DIR', STATUTES_CACHE_DIR / 'llm_recordings'))
+LLM_REPLAY_OPTIONS=os.environ.get('LLM_REPLAY_OPTIONS', '')
+
+# every LLM call's latency, token use etc.; summarized by llm-telemetry
+LLM_TELEMETRY_PATH=Path(os.environ.get('LLM_TELEMETRY_PATH', STATUTES_DATA_DIR / 'telemetry' / 'llm_calls.jsonl'))
+
+# section number -> location, built by co-split and wy-convert; queried by section-lookup
+SECTION_INDEX_PATH=Path(os.environ.get('SECTION_INDEX_PATH', STATUTES_DATA_DIR / 'index' / 'sections.sqlite'))
+
+# which sections cite which; built and queried by citation-graph
+CITATION_GRAPH_PATH=Path(os.environ.get('CITATION_GRAPH_PATH', STATUTES_DATA_DIR / 'index' / 'citations.npz'))
@@ -0,0 +1,409 @@
+import datetime
+import hashlib
+import logging
+import os
+import random
+import shutil
+import threading
+import time
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from fnmatch import fnmatch
+from pathlib import Path, PurePosixPath
+from typing import Literal
+from urllib.parse import urlparse
+
+import requests
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "download_manifest.json"
+
+USER_AGENT = "deep-statutes downloader"
+
+CHUNK_SIZE = 1 << 16
+
+
+class DownloadRecord(BaseModel):
+    """What we know about a URL's last download, for conditional and range requests."""
+
+    path: str  # relative to the manifest's directory
+    etag: str | None = None
+    last_modified: str | None = None
+    size: int | None = None
+    sha256: str | None = None
+    downloaded_at: datetime.datetime | None = None
+    # validators of the response a partial file came from; a resumed request only
+    # continues it if the file is unchanged
+    partial_etag: str | None = None
+    partial_last_modified: str | None = None
+
+
+class DownloadManifest(BaseModel):
+    """Download records by URL."""
+
+    files: dict[str, DownloadRecord] = {}
+
+    @classmethod
+    def load(cls, path: Path) -> "DownloadManifest":
+        if not path.exists():
+            return cls()
+        with open(path, "r") as f:
+            return cls.model_validate_json(f.read())
+
+    def save(self, path: Path) -> None:
+        # write atomically so that an interruption never leaves a corrupt manifest
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            f.write(self.model_dump_json(indent=2))
+        os.replace(tmp_path, path)
+
+
+@dataclass
+class Download:
+    url: str
+    path: Path
+    sha256: str | None = None  # expected checksum, if known
+
+
+DownloadStatus = Literal["downloaded", "unchanged", "missing", "failed"]
+
+
+@dataclass
+class DownloadResult:
+    url: str
+    path: Path
+    status: DownloadStatus
+    error: str | None = None
+
+
+class _HostLimiter:
+    """
+    Politeness limits per host: at most `max_concurrent` requests at a time, started at
+    least `min_interval` seconds apart.
+    """
+
+    def __init__(self, max_concurrent: int, min_interval: float):
+        self.max_concurrent = max_concurrent
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._semaphores: dict[str, threading.Semaphore] = {}
+        self._next_start: dict[str, float] = {}
+
+    def _semaphore(self, host: str) -> threading.Semaphore:
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.Semaphore(self.max_concurrent)
+            return self._semaphores[host]
+
+    def acquire(self, host: str) -> None:
+        self._semaphore(host).acquire()
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start.get(host, now))
+            self._next_start[host] = start + self.min_interval
+        time.sleep(start - now)
+
+    def release(self, host: str) -> None:
+        self._semaphore(host).release()
+
+
+class _RetryableError(Exception):
+    pass
+
+
+class Downloader:
+    """
+    Downloads files concurrently, skipping the ones that haven't changed.
+
+    Each file is streamed to a `.part` file next to it and renamed into place once
+    complete, so a file is never half-written. Interrupted downloads are resumed with a
+    range request if the server still has the same version of the file. Files that were
+    downloaded before are requested conditionally (ETag / Last-Modified), so unchanged
+    files aren't transferred again. What was downloaded is recorded in a manifest in
+    `root`.
+
+    Args:
+        root: Directory the manifest lives in; download paths must be inside it.
+        max_workers: Maximum number of downloads in flight overall.
+        max_per_host: Maximum number of downloads in flight per host.
+        min_interval: Minimum seconds between the starts of requests to the same host.
+        timeout: Seconds to wait for the server before giving up on a request.
+        max_retries: Retries of a download after connection errors and 5xx responses.
+        force: Download everything again, ignoring the manifest.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        max_workers: int = 8,
+        max_per_host: int = 4,
+        min_interval: float = 0.0,
+        timeout: float = 30.0,
+        max_retries: int = 3,
+        force: bool = False,
+    ):
+        self.root = root
+        self.manifest_path = root / MANIFEST_NAME
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.force = force
+
+        self.manifest = DownloadManifest.load(self.manifest_path)
+        self._lock = threading.Lock()
+        self._hosts = _HostLimiter(max_per_host, min_interval)
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        # sessions aren't thread-safe, so each worker thread gets its own
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+            self._local.session.headers["User-Agent"] = USER_AGENT
+        return self._local.session
+
+    def _record(self, url: str) -> DownloadRecord | None:
+        with self._lock:
+            record = self.manifest.files.get(url)
+            return None if record is None else record.model_copy()
+
+    def _update(self, url: str, record: DownloadRecord) -> None:
+        with self._lock:
+            self.manifest.files[url] = record
+            self.manifest.save(self.manifest_path)
+
+    def download_all(self, downloads: list[Download]) -> list[DownloadResult]:
+        """Download the files concurrently, returning the outcome of each (in order)."""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(self.download, downloads))
+
+        counts: dict[str, int] = {}
+        for result in results:
+            counts[result.status] = counts.get(result.status, 0) + 1
+        logger.info(
+            "Downloads: " + ", ".join(f"{n} {status}" for status, n in counts.items())
+        )
+        return results
+
+    def download(self, download: Download) -> DownloadResult:
+        """Download one file, retrying connection errors and server errors."""
+        host = urlparse(download.url).netloc
+        for attempt in range(self.max_retries + 1):
+            self._hosts.acquire(host)
+            try:
+                status = self._fetch(download)
+                return DownloadResult(download.url, download.path, status)
+            except _RetryableError as e:
+                error = str(e)
+            except (requests.HTTPError, ValueError) as e:
+                # e.g. a 403 or a checksum mismatch; retrying won't help
+                logger.error(f"Failed to download {download.url}: {e}")
+                return DownloadResult(download.url, download.path, "failed", str(e))
+            except requests.RequestException as e:
+                # connection errors, timeouts, truncated responses, ...
+                error = repr(e)
+            finally:
+                self._hosts.release(host)
+
+            if attempt < self.max_retries:
+                delay = random.uniform(0, min(60.0, 2.0**attempt))
+                logger.warning(
+                    f"Downloading {download.url} failed ({error}); "
+                    f"retrying in {delay:.1f}s"
+                )
+                time.sleep(delay)
+
+        logger.error(f"Failed to download {download.url}: {error}")
+        return DownloadResult(download.url, download.path, "failed", error)
+
+    def _fetch(self, download: Download) -> DownloadStatus:
+        url, path = download.url, download.path
+        part_path = path.with_name(path.name + ".part")
+        rel_path = str(path.relative_to(self.root))
+
+        record = None if self.force else self._record(url)
+        if record is not None and record.path != rel_path:
+            record = None
+
+        headers = {}
+        # only ask whether the file changed if we still have the file we got
+        if record is not None and path.exists() and path.stat().st_size == record.size:
+            if record.etag is not None:
+                headers["If-None-Match"] = record.etag
+            if record.last_modified is not None:
+                headers["If-Modified-Since"] = record.last_modified
+
+        offset = 0
+        if record is not None and part_path.exists():
+            # If-Range needs a strong ETag
+            validator = record.partial_etag
+            if validator is None or validator.startswith("W/"):
+                validator = record.partial_last_modified
+            if validator is not None:
+                offset = part_path.stat().st_size
+                headers["Range"] = f"bytes={offset}-"
+                headers["If-Range"] = validator
+
+        response = self._session().get(
+            url, headers=headers, stream=True, timeout=self.timeout
+        )
+        with response:
+            if response.status_code == 304:
+                logger.info(f"Unchanged: {url}")
+                return "unchanged"
+            if response.status_code == 404:
+                logger.info(f"Not found: {url}")
+                return "missing"
+            if response.status_code == 416:
+                # the partial file doesn't fit the file on the server any more
+                part_path.unlink(missing_ok=True)
+                raise _RetryableError("requested range not satisfiable")
+            if response.status_code >= 500 or response.status_code == 429:
+                raise _RetryableError(f"HTTP {response.status_code}")
+            response.raise_for_status()
+
+            if response.status_code != 206:
+                offset = 0
+
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if record is None:
+                record = DownloadRecord(path=rel_path)
+            record.partial_etag = etag
+            record.partial_last_modified = last_modified
+            self._update(url, record)
+
+            h = hashlib.sha256()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if offset > 0:
+                logger.info(f"Resuming {url} at byte {offset}")
+                with open(part_path, "rb") as f:
+                    while chunk := f.read(CHUNK_SIZE):
+                        h.update(chunk)
+            else:
+                logger.info(f"Downloading {url} -> {path}")
+
+            with open(part_path, "ab" if offset > 0 else "wb") as f:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+                    h.update(chunk)
+
+        # with a Content-Encoding, the length is that of the encoded body
+        size = part_path.stat().st_size
+        expected_size = response.headers.get("Content-Length")
+        if (
+            expected_size is not None
+            and "Content-Encoding" not in response.headers
+            and size != offset + int(expected_size)
+        ):
+            raise _RetryableError(f"incomplete download ({size} bytes)")
+
+        sha256 = h.hexdigest()
+        if download.sha256 is not None and sha256 != download.sha256:
+            part_path.unlink(missing_ok=True)
+            raise ValueError(
+                f"checksum mismatch: expected {download.sha256}, got {sha256}"
+            )
+
+        os.replace(part_path, path)
+        self._update(
+            url,
+            DownloadRecord(
+                path=rel_path,
+                etag=etag,
+                last_modified=last_modified,
+                size=size,
+                sha256=sha256,
+                downloaded_at=datetime.datetime.now(datetime.timezone.utc),
+            ),
+        )
+        logger.info(f"Downloaded {url} ({size} bytes)")
+        return "downloaded"
+
+
+def _file_crc32(path: Path) -> int:
+    crc = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def _extract_member(
+    zip_path: Path, info: zipfile.ZipInfo, output_path: Path
+) -> bool:
+    """Extract one member unless it's already there. Returns whether it extracted it."""
+    if (
+        output_path.exists()
+        and output_path.stat().st_size == info.file_size
+        and _file_crc32(output_path) == info.CRC
+    ):
+        return False
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_name(output_path.name + ".part")
+    # each member gets its own handle, so members decompress in parallel
+    with zipfile.ZipFile(zip_path) as zf, zf.open(info) as src:
+        with open(tmp_path, "wb") as dst:
+            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+    os.replace(tmp_path, output_path)
+    return True
+
+
+def extract_zip(
+    zip_path: Path,
+    output_dir: Path,
+    include: list[str] | None = None,
+    max_workers: int = 8,
+) -> list[Path]:
+    """
+    Extract (some of) a zip's files in parallel, skipping files already extracted.
+
+    A file counts as already extracted if one of the same size and CRC-32 as the
+    member is at its path. Files are extracted to a temporary name and renamed into
+    place, so an interrupted extraction never leaves a truncated file.
+
+    Args:
+        zip_path: The zip file.
+        output_dir: Where to extract to (keeping the members' relative paths).
+        include: Glob patterns (e.g. "usc26*.pdf"); only members whose file name matches
+            one of them are extracted. None extracts everything.
+        max_workers: Maximum number of members to extract at once.
+
+    Returns:
+        The paths of the selected members, whether they were extracted now or before.
+    """
+    with zipfile.ZipFile(zip_path) as zf:
+        infos = [info for info in zf.infolist() if not info.is_dir()]
+
+    selected: list[tuple[zipfile.ZipInfo, Path]] = []
+    for info in infos:
+        name = PurePosixPath(info.filename)
+        if include is not None and not any(fnmatch(name.name, p) for p in include):
+            continue
+        # never write outside output_dir, whatever the member names say
+        if name.is_absolute() or ".." in name.parts:
+            logger.warning(f"Skipping zip member with unsafe path: {info.filename}")
+            continue
+        selected.append((info, output_dir / name))
+
+    logger.info(f"Extracting {len(selected)} of {len(infos)} files from {zip_path}")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        extracted = list(
+            executor.map(
+                lambda item: _extract_member(zip_path, *item),
+                selected,
+            )
+        )
+
+    num_extracted = sum(extracted)
+    logger.info(
+        f"Extracted {num_extracted} files; "
+        f"{len(extracted) - num_extracted} were up to date."
+    )
+    return [path for _, path in selected]
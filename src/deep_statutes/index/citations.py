@@ -0,0 +1,278 @@
+import argparse
+import logging
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, Literal
+
+import numpy as np
+import polars as pl
+
+from deep_statutes.config import CITATION_GRAPH_PATH, SECTION_INDEX_PATH
+from deep_statutes.index.sections import SECTION_RE, SectionIndex, section_number
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# token stream markup, e.g. "<<LINE (35, 2, 0)>>" or "<<SPAN_M>>"
+_TOKEN_RE = r"\s*<<[^>]*>>\s*"
+# a citation hyphen-wrapped across lines, e.g. "2-2-" then "703.5" on the next line
+_WRAPPED_RE = r"(\d-)(?:\s|<<[^>]*>>)+(\d)"
+# runs of digits, dots and hyphens; the ones that are whole section numbers are citations
+# (so e.g. the end of "1-800-555-0100" isn't one)
+_CANDIDATE_RE = r"\d[\d.-]*\d"
+_CITATION_RE = rf"^{SECTION_RE.pattern}$"
+
+
+def _neighbors(
+    indptr: np.ndarray, indices: np.ndarray, nodes: np.ndarray
+) -> np.ndarray:
+    """All neighbors of the given nodes in a CSR adjacency, without Python loops."""
+    starts = indptr[nodes]
+    lengths = indptr[nodes + 1] - starts
+    # each neighbor's position within its node's row
+    row_starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    offsets = np.arange(lengths.sum()) - row_starts
+    return indices[np.repeat(starts, lengths) + offsets]
+
+
+def _csr(
+    src: np.ndarray, dst: np.ndarray, num_nodes: int
+) -> tuple[np.ndarray, np.ndarray]:
+    order = np.lexsort((dst, src))
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=num_nodes), out=indptr[1:])
+    return indptr, dst[order].astype(np.int32)
+
+
+@dataclass
+class CitationGraph:
+    """
+    Which sections cite which, as compressed sparse row adjacencies in both directions.
+
+    Nodes are sections, identified by (state, edition, section number); the edition is ""
+    if it's unknown.
+    """
+
+    state: np.ndarray  # str
+    edition: np.ndarray  # str
+    section: np.ndarray  # str
+    cites_indptr: np.ndarray  # int64, num nodes + 1
+    cites_indices: np.ndarray  # int32
+    cited_by_indptr: np.ndarray  # int64, num nodes + 1
+    cited_by_indices: np.ndarray  # int32
+
+    def __len__(self) -> int:
+        return len(self.section)
+
+    @classmethod
+    def from_edges(
+        cls, nodes: pl.DataFrame, src: np.ndarray, dst: np.ndarray
+    ) -> "CitationGraph":
+        """
+        Args:
+            nodes: The state, edition and section of each node.
+            src: The citing node of each edge.
+            dst: The cited node of each edge.
+        """
+        cites_indptr, cites_indices = _csr(src, dst, len(nodes))
+        cited_by_indptr, cited_by_indices = _csr(dst, src, len(nodes))
+        return cls(
+            state=nodes["state"].to_numpy().astype(str),
+            edition=nodes["edition"].to_numpy().astype(str),
+            section=nodes["section"].to_numpy().astype(str),
+            cites_indptr=cites_indptr,
+            cites_indices=cites_indices,
+            cited_by_indptr=cited_by_indptr,
+            cited_by_indices=cited_by_indices,
+        )
+
+    def num_edges(self) -> int:
+        return len(self.cites_indices)
+
+    def find(self, citation: str, state: str | None = None) -> np.ndarray:
+        """The nodes of a section (one per state and edition it's in)."""
+        mask = self.section == section_number(citation)
+        if state is not None:
+            mask &= self.state == state
+        return np.flatnonzero(mask)
+
+    def label(self, node: int) -> str:
+        edition = f" {self.edition[node]}" if self.edition[node] != "" else ""
+        return f"{self.state[node]}{edition} {self.section[node]}"
+
+    def cites(self, node: int) -> np.ndarray:
+        return self.cites_indices[
+            self.cites_indptr[node] : self.cites_indptr[node + 1]
+        ]
+
+    def cited_by(self, node: int) -> np.ndarray:
+        return self.cited_by_indices[
+            self.cited_by_indptr[node] : self.cited_by_indptr[node + 1]
+        ]
+
+    def k_hop(
+        self,
+        nodes: np.ndarray | list[int],
+        k: int,
+        direction: Literal["cites", "cited_by", "both"] = "both",
+    ) -> np.ndarray:
+        """All nodes within k citations of the given ones (including them), sorted."""
+        visited = np.zeros(len(self), dtype=bool)
+        frontier = np.unique(np.asarray(nodes, dtype=np.int64))
+        visited[frontier] = True
+        for _ in range(k):
+            reached = []
+            if direction in ("cites", "both"):
+                reached.append(
+                    _neighbors(self.cites_indptr, self.cites_indices, frontier)
+                )
+            if direction in ("cited_by", "both"):
+                reached.append(
+                    _neighbors(self.cited_by_indptr, self.cited_by_indices, frontier)
+                )
+            reached = np.unique(np.concatenate(reached))
+            frontier = reached[~visited[reached]]
+            if len(frontier) == 0:
+                break
+            visited[frontier] = True
+        return np.flatnonzero(visited)
+
+    def save(self, path: Path) -> None:
+        with open(path, "wb") as f:
+            np.savez_compressed(f, **vars(self))
+
+    @classmethod
+    def load(cls, path: Path) -> "CitationGraph":
+        with np.load(path) as data:
+            return cls(**{name: data[name] for name in data.files})
+
+
+def _section_bodies(sections: pl.DataFrame) -> Iterator[pl.DataFrame]:
+    """
+    The text of each section, one token stream at a time so that only one is in memory.
+
+    A section's body runs from its header to the next section's header.
+    """
+    sections = sections.filter(pl.col("token_stream").is_not_null()).sort(
+        "token_stream", "char_offset"
+    )
+    by_token_stream = sections.group_by("token_stream", maintain_order=True)
+    for (token_stream,), group in by_token_stream:
+        with open(token_stream, "r") as f:
+            text = f.read()
+        starts = group["char_offset"].to_list()
+        ends = starts[1:] + [len(text)]
+        yield group.select("node").with_columns(
+            body=pl.Series([text[start:end] for start, end in zip(starts, ends)])
+        )
+
+
+def extract_citations(bodies: pl.DataFrame, nodes: pl.DataFrame) -> pl.DataFrame:
+    """
+    The citations in section bodies, resolved against the known sections of the same
+    state and edition.
+
+    Args:
+        bodies: The node and (token stream) text of each section.
+        nodes: The state, edition and section of each node, with node ids as row numbers.
+    Returns:
+        The (src, dst) of each pair of citing and cited sections.
+    """
+    known = nodes.with_row_index("dst")
+    return (
+        bodies.join(
+            nodes.with_row_index("node").select("node", "state", "edition"),
+            on="node",
+        )
+        .select(
+            pl.col("node").alias("src"),
+            "state",
+            "edition",
+            section=pl.col("body")
+            .str.replace_all(_WRAPPED_RE, "${1}${2}")
+            .str.replace_all(_TOKEN_RE, " ")
+            .str.extract_all(_CANDIDATE_RE),
+        )
+        .explode("section")
+        .filter(pl.col("section").str.contains(_CITATION_RE))
+        .join(known, on=["state", "edition", "section"])
+        .filter(pl.col("src") != pl.col("dst"))
+        .select("src", "dst")
+        .unique()
+        .sort("src", "dst")
+    )
+
+
+def build_graph(index: SectionIndex, state: str | None = None) -> CitationGraph:
+    """Extract the citation graph of every indexed section (of a state)."""
+    start = time.monotonic()
+    sections = index.to_frame(state).with_columns(pl.col("edition").fill_null(""))
+
+    # sections listed more than once (e.g. in two printings) are one node
+    nodes = sections.select("state", "edition", "section").unique(maintain_order=True)
+    sections = sections.join(
+        nodes.with_row_index("node"), on=["state", "edition", "section"]
+    )
+
+    edges = [extract_citations(bodies, nodes) for bodies in _section_bodies(sections)]
+    if len(edges) > 0:
+        edges = pl.concat(edges).unique(["src", "dst"])
+        src = edges["src"].to_numpy().astype(np.int64)
+        dst = edges["dst"].to_numpy().astype(np.int64)
+    else:
+        src = dst = np.array([], dtype=np.int64)
+    graph = CitationGraph.from_edges(nodes, src, dst)
+    logger.info(
+        f"Found {graph.num_edges()} citations between {len(graph)} sections "
+        f"in {time.monotonic() - start:.1f}s."
+    )
+    return graph
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build or query the graph of citations between statute sections."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser(
+        "build", help="Extract the citations of every section in the section index."
+    )
+    build.add_argument("--index", type=Path, default=SECTION_INDEX_PATH)
+    build.add_argument("--state", default=None, help="Only this state's sections.")
+
+    show = subparsers.add_parser(
+        "show", help="Show what a section cites and is cited by."
+    )
+    show.add_argument("citation", help='A section number or citation, e.g. "2-2-701".')
+    show.add_argument("--state", default=None)
+    show.add_argument(
+        "-k",
+        type=int,
+        default=1,
+        help="Also show the sections within this many citations in either direction.",
+    )
+
+    for subparser in (build, show):
+        subparser.add_argument("--graph", type=Path, default=CITATION_GRAPH_PATH)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        with SectionIndex(args.index) as index:
+            graph = build_graph(index, args.state)
+        args.graph.parent.mkdir(parents=True, exist_ok=True)
+        graph.save(args.graph)
+        return
+
+    graph = CitationGraph.load(args.graph)
+    nodes = graph.find(args.citation, args.state)
+    if len(nodes) == 0:
+        print(f"{args.citation}: not found")
+    for node in nodes:
+        print(graph.label(node))
+        print("  cites: " + ", ".join(graph.section[graph.cites(node)]))
+        print("  cited by: " + ", ".join(graph.section[graph.cited_by(node)]))
+        if args.k > 1:
+            nearby = graph.k_hop([node], args.k)
+            print(f"  within {args.k}: " + ", ".join(graph.section[nearby]))
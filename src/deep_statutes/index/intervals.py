@@ -0,0 +1,206 @@
+import json
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+
+from deep_statutes.pdf.header_array import HeaderArray
+from deep_statutes.pdf.token_stream import token_stream_lines
+
+# roughly, for English text
+CHARS_PER_TOKEN = 4
+
+
+@dataclass
+class HeaderIntervals:
+    """
+    Which headers cover a page or a token stream position, in O(log n) per query.
+
+    Headers are in TOC order, so their start pages and offsets are sorted and a point's
+    innermost header is the last one starting at or before it. A node's character range
+    runs from its header up to the next header at its level or above (or the end of the
+    token stream); its page range is the tree's, i.e. the page of that next header is shared.
+
+    Args:
+        tree: The header tree.
+        char_start: Each node's start offset in the token stream, if known.
+        char_end: Each node's (exclusive) end offset; -1 for the end of the token stream.
+        text_chars: The characters of text in each node's subtree, if known.
+    """
+
+    tree: HeaderArray
+    char_start: np.ndarray | None = None  # int64
+    char_end: np.ndarray | None = None  # int64
+    text_chars: np.ndarray | None = None  # int64
+
+    def __post_init__(self):
+        if (np.diff(self.tree.page_start) < 0).any():
+            raise ValueError("Header start pages must be in TOC order.")
+        if self.char_start is not None and (np.diff(self.char_start) < 0).any():
+            raise ValueError("Header offsets must be in TOC order.")
+
+    @classmethod
+    def build(
+        cls,
+        tree: HeaderArray,
+        text_ranges: list[tuple[int, int]] | None = None,
+        token_stream_path: Path | None = None,
+    ) -> "HeaderIntervals":
+        """
+        Args:
+            tree: The header tree.
+            text_ranges: The token stream (start, end) offsets of each header, as returned
+                by `find_headers_with_ranges`, if the tree came from a token stream.
+            token_stream_path: The token stream, to count the text in each node (in one pass).
+        """
+        if text_ranges is None:
+            return cls(tree)
+
+        char_start = np.array([start for start, _ in text_ranges], dtype=np.int64)
+        # a node ends where the first header after its subtree starts
+        next_start = np.append(char_start, -1)
+        intervals = cls(tree, char_start, next_start[tree.subtree_end])
+        if token_stream_path is not None:
+            intervals.text_chars = intervals._count_text_chars(token_stream_path)
+        return intervals
+
+    def _count_text_chars(self, token_stream_path: Path) -> np.ndarray:
+        offsets = []
+        lengths = []
+        with open(token_stream_path, "r") as f:
+            for line in token_stream_lines(f):
+                offsets.append(line.offset)
+                lengths.append(len(line.text) + 1)
+
+        # each node's own text, then the totals of its subtree (a contiguous range)
+        own = np.bincount(
+            self.at_offsets(offsets) + 1, weights=lengths, minlength=len(self.tree) + 1
+        )[1:]
+        totals = np.concatenate([[0], np.cumsum(own)])
+        subtree = totals[self.tree.subtree_end] - totals[: len(self.tree)]
+        return subtree.astype(np.int64)
+
+    def estimated_tokens(self) -> np.ndarray:
+        """Roughly how many tokens the text of each node's subtree is."""
+        if self.text_chars is None:
+            raise ValueError("The index has no text counts.")
+        return self.text_chars // CHARS_PER_TOKEN
+
+    def at_pages(self, pages: np.ndarray | list[int]) -> np.ndarray:
+        """
+        The innermost header in effect on each (1-indexed) page, i.e. the last one starting
+        on or before it; -1 before the first header.
+        """
+        return np.searchsorted(self.tree.page_start, pages, side="right") - 1
+
+    def at_offsets(self, offsets: np.ndarray | list[int]) -> np.ndarray:
+        """The innermost header containing each token stream offset; -1 before the first header."""
+        if self.char_start is None:
+            raise ValueError("The index has no token stream offsets.")
+        return np.searchsorted(self.char_start, offsets, side="right") - 1
+
+    def in_pages(self, first_page: int, last_page: int) -> np.ndarray:
+        """All nodes whose page range overlaps the given (1-indexed, inclusive) pages, in TOC order."""
+        # the nodes starting before the range that reach into it are exactly the path to the
+        # last one of them, since any other node ends (at the latest) where that one starts
+        if first_page > self.tree.page_end[0]:
+            # past the end of the document
+            return np.array([], dtype=np.int64)
+        start = np.searchsorted(self.tree.page_start, first_page, side="left")
+        end = np.searchsorted(self.tree.page_start, last_page, side="right")
+        before = self.tree.path(int(start) - 1) if start > 0 else []
+        return np.concatenate(
+            [np.array(before, dtype=np.int64), np.arange(start, end, dtype=np.int64)]
+        )
+
+    def in_offsets(self, start: int, end: int) -> np.ndarray:
+        """All nodes overlapping the token stream offsets [start, end), in TOC order."""
+        if self.char_start is None:
+            raise ValueError("The index has no token stream offsets.")
+        # character ranges nest without sharing boundaries, so the nodes starting before the
+        # range that overlap it are the path to the node containing its start
+        first = np.searchsorted(self.char_start, start, side="right")
+        last = np.searchsorted(self.char_start, end, side="left")
+        before = self.tree.path(int(first) - 1) if first > 0 else []
+        return np.concatenate(
+            [np.array(before, dtype=np.int64), np.arange(first, last, dtype=np.int64)]
+        )
+
+    def paths(self, nodes: np.ndarray | list[int], sep: str = "--") -> list[str | None]:
+        """The header path of each node (e.g. "TITLE 1--ARTICLE 2"); None for -1."""
+        nodes = np.asarray(nodes)
+        unique, inverse = np.unique(nodes, return_inverse=True)
+        texts = [self.tree.path_text(int(i), sep) if i >= 0 else None for i in unique]
+        return [texts[i] for i in inverse]
+
+    def to_frame(self) -> pl.DataFrame:
+        """One row per node, with its header, intervals and path."""
+        tree = self.tree
+        no_offsets = [None] * len(tree)
+        columns = {
+            "node": np.arange(len(tree), dtype=np.int32),
+            "parent": tree.parent,
+            "depth": tree.depth,
+            "type": [tree.header_types[i] for i in tree.type_id],
+            "text": [tree.strings[i] for i in tree.text_id],
+            "sub_text": [tree.strings[i] for i in tree.sub_text_id],
+            "page_start": tree.page_start,
+            "page_end": tree.page_end,
+            "subtree_end": tree.subtree_end,
+            "char_start": self.char_start if self.char_start is not None else no_offsets,
+            "char_end": self.char_end if self.char_end is not None else no_offsets,
+            "text_chars": (
+                self.text_chars if self.text_chars is not None else no_offsets
+            ),
+            "path": [tree.path_text(i) for i in range(len(tree))],
+        }
+        return pl.DataFrame(
+            columns,
+            schema_overrides={
+                "char_start": pl.Int64,
+                "char_end": pl.Int64,
+                "text_chars": pl.Int64,
+            },
+        )
+
+    def write(self, path: Path) -> None:
+        # the frame only has each node's type, not the hierarchy of types
+        self.to_frame().write_parquet(
+            path, metadata={"header_types": json.dumps(self.tree.header_types)}
+        )
+
+    @classmethod
+    def read(cls, path: Path) -> "HeaderIntervals":
+        df = pl.read_parquet(path)
+        metadata = pl.read_parquet_metadata(path)
+
+        # written without the hierarchy, the types are in order of appearance
+        header_types = {
+            t: i for i, t in enumerate(json.loads(metadata.get("header_types", "[]")))
+        }
+        string_ids: dict[str, int] = {}
+        type_id = [header_types.setdefault(t, len(header_types)) for t in df["type"]]
+        text_id = [string_ids.setdefault(t, len(string_ids)) for t in df["text"]]
+        sub_text_id = [string_ids.setdefault(t, len(string_ids)) for t in df["sub_text"]]
+
+        tree = HeaderArray(
+            header_types=list(header_types),
+            strings=list(string_ids),
+            parent=df["parent"].to_numpy(),
+            depth=df["depth"].to_numpy(),
+            type_id=np.array(type_id, dtype=np.int32),
+            text_id=np.array(text_id, dtype=np.int32),
+            sub_text_id=np.array(sub_text_id, dtype=np.int32),
+            page_start=df["page_start"].to_numpy(),
+            page_end=df["page_end"].to_numpy(),
+            subtree_end=df["subtree_end"].to_numpy(),
+        )
+        if df["char_start"].null_count() > 0:
+            return cls(tree)
+        text_chars = None
+        if "text_chars" in df.columns and df["text_chars"].null_count() == 0:
+            text_chars = df["text_chars"].to_numpy()
+        return cls(
+            tree, df["char_start"].to_numpy(), df["char_end"].to_numpy(), text_chars
+        )
@@ -0,0 +1,260 @@
+import argparse
+import logging
+import re
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+from pydantic import BaseModel
+
+from deep_statutes.config import SECTION_INDEX_PATH
+from deep_statutes.index.intervals import HeaderIntervals
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    state TEXT NOT NULL,
+    source TEXT NOT NULL,
+    edition TEXT,
+    input_hash TEXT NOT NULL,
+    PRIMARY KEY (state, source)
+);
+CREATE TABLE IF NOT EXISTS sections (
+    state TEXT NOT NULL,
+    edition TEXT,
+    section TEXT NOT NULL,
+    source TEXT NOT NULL,
+    page INTEGER,
+    token_stream TEXT,
+    char_offset INTEGER,
+    split_file TEXT,
+    heading TEXT NOT NULL,
+    path TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sections_by_number ON sections (section, state);
+CREATE INDEX IF NOT EXISTS sections_by_source ON sections (state, source);
+"""
+
+_COLUMNS = [
+    "state",
+    "edition",
+    "section",
+    "source",
+    "page",
+    "token_stream",
+    "char_offset",
+    "split_file",
+    "heading",
+    "path",
+]
+_INSERT_SECTION = (
+    f"INSERT INTO sections ({', '.join(_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(_COLUMNS))})"
+)
+
+# e.g. "2-2-701", "24-1-136.5" or "39-22-104.6"; also found in "C.R.S. § 2-2-701(3)"
+SECTION_RE = re.compile(r"\d+(?:\.\d+)?-\d+(?:\.\d+)?-\d+(?:\.\d+)?")
+
+
+class SectionEntry(BaseModel):
+    state: str
+    edition: str | None
+    section: str  # e.g. "2-2-701"
+    source: str  # the source PDF
+    page: int | None = None  # 1-indexed, if the token stream has pages
+    token_stream: str | None = None
+    char_offset: int | None = None  # of the section header in the token stream
+    split_file: str | None = None  # the split PDF containing the section, if any
+    heading: str
+    path: str  # e.g. "TITLE 2--ARTICLE 2--PART 7--2-2-701"
+
+
+def section_number(citation: str) -> str:
+    """The section number in a citation, e.g. "2-2-701" for "C.R.S. § 2-2-701(3)"."""
+    m = SECTION_RE.search(citation)
+    return m.group(0) if m is not None else citation.strip()
+
+
+class SectionIndex:
+    """
+    A SQLite index from section numbers to where the sections are.
+
+    Entries are replaced a whole source document at a time, so that titles can be
+    (re)indexed independently and by several processes.
+    """
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # writers wait for each other rather than failing
+        self._conn = sqlite3.connect(path, timeout=60)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "SectionIndex":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def is_current(self, state: str, source: str, input_hash: str) -> bool:
+        """Whether the source was indexed from the same inputs."""
+        row = self._conn.execute(
+            "SELECT input_hash FROM sources WHERE state = ? AND source = ?",
+            (state, source),
+        ).fetchone()
+        return row is not None and row[0] == input_hash
+
+    def replace_source(
+        self,
+        state: str,
+        source: str,
+        edition: str | None,
+        input_hash: str,
+        entries: list[SectionEntry],
+    ) -> None:
+        with self._conn:
+            self._conn.execute(
+                "DELETE FROM sections WHERE state = ? AND source = ?", (state, source)
+            )
+            self._conn.executemany(
+                _INSERT_SECTION,
+                [tuple(getattr(e, c) for c in _COLUMNS) for e in entries],
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)",
+                (state, source, edition, input_hash),
+            )
+        logger.info(f"Indexed {len(entries)} sections of {source}.")
+
+    def lookup(
+        self, citation: str, state: str | None = None, edition: str | None = None
+    ) -> list[SectionEntry]:
+        query = f"SELECT {', '.join(_COLUMNS)} FROM sections WHERE section = ?"
+        params: list[str] = [section_number(citation)]
+        if state is not None:
+            query += " AND state = ?"
+            params.append(state)
+        if edition is not None:
+            query += " AND edition = ?"
+            params.append(edition)
+        rows = self._conn.execute(query, params).fetchall()
+        return [SectionEntry(**dict(zip(_COLUMNS, row))) for row in rows]
+
+    def to_frame(self, state: str | None = None) -> pl.DataFrame:
+        """All entries (of a state), in document order."""
+        query = f"SELECT {', '.join(_COLUMNS)} FROM sections"
+        params: list[str] = []
+        if state is not None:
+            query += " WHERE state = ?"
+            params.append(state)
+        query += " ORDER BY state, source, char_offset"
+        rows = self._conn.execute(query, params).fetchall()
+        return pl.DataFrame(
+            rows,
+            schema={
+                c: pl.Int64 if c in ("page", "char_offset") else pl.String
+                for c in _COLUMNS
+            },
+            orient="row",
+        )
+
+
+def sections_from_intervals(
+    intervals: HeaderIntervals,
+    state: str,
+    edition: str | None,
+    source: str,
+    token_stream: str | None,
+    split_nodes: list[tuple[int, str]],
+    section_type: str = "section",
+) -> list[SectionEntry]:
+    """
+    The index entries for the sections of a header tree.
+
+    Args:
+        split_nodes: The (node, file name) of each split, e.g. as in the split manifest.
+    """
+    tree = intervals.tree
+
+    split_file = np.full(len(tree), -1, dtype=np.int64)
+    for i, (node, _) in enumerate(split_nodes):
+        split_file[node : tree.subtree_end[node]] = i
+
+    if section_type not in tree.header_types:
+        return []
+    sections = np.flatnonzero(tree.type_id == tree.header_types.index(section_type))
+    return [
+        SectionEntry(
+            state=state,
+            edition=edition,
+            section=section_number(tree.strings[tree.text_id[i]]),
+            source=source,
+            page=int(tree.page_start[i]),
+            token_stream=token_stream,
+            char_offset=(
+                int(intervals.char_start[i]) if intervals.char_start is not None else None
+            ),
+            split_file=split_nodes[split_file[i]][1] if split_file[i] >= 0 else None,
+            heading=tree.strings[tree.sub_text_id[i]],
+            path=tree.path_text(i),
+        )
+        for i in sections
+    ]
+
+
+def _describe(entry: SectionEntry) -> str:
+    lines = [
+        f"{entry.state} {entry.edition or ''} {entry.section}: {entry.heading}",
+        f"  {entry.path}",
+    ]
+    location = entry.source
+    if entry.page is not None:
+        location += f" page {entry.page}"
+    if entry.split_file is not None:
+        location += f" ({entry.split_file})"
+    lines.append(f"  {location}")
+    if entry.token_stream is not None:
+        lines.append(f"  {entry.token_stream} @ {entry.char_offset}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Look up where statute sections are, e.g. section-lookup 2-2-701 --state co."
+    )
+    parser.add_argument(
+        "citations",
+        nargs="+",
+        help='Section numbers or citations containing one, e.g. "C.R.S. 2-2-701".',
+    )
+    parser.add_argument("--state", default=None)
+    parser.add_argument("--edition", default=None)
+    parser.add_argument(
+        "--index",
+        type=Path,
+        default=SECTION_INDEX_PATH,
+        help="The section index, as built by co-split and wy-convert.",
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="Print each entry as a line of JSON."
+    )
+    args = parser.parse_args()
+
+    if not args.index.exists():
+        parser.error(f"No section index at {args.index}.")
+
+    with SectionIndex(args.index) as index:
+        for citation in args.citations:
+            entries = index.lookup(citation, state=args.state, edition=args.edition)
+            if len(entries) == 0:
+                print(f"{citation}: not found")
+            for entry in entries:
+                if args.json:
+                    print(entry.model_dump_json())
+                else:
+                    print(_describe(entry))
@@ -0,0 +1,153 @@
+import asyncio
+import json
+import logging
+import os
+from pathlib import Path
+
+from google import genai
+from google.genai import types
+
+from deep_statutes.llm.engine import RateLimitedEngine
+
+logger = logging.getLogger(__name__)
+
+_TERMINAL_STATES = {
+    types.JobState.JOB_STATE_SUCCEEDED,
+    types.JobState.JOB_STATE_FAILED,
+    types.JobState.JOB_STATE_CANCELLED,
+    types.JobState.JOB_STATE_EXPIRED,
+}
+
+
+class BatchRunner:
+    """
+    Runs generate_content requests through the Gemini Batch API rather than one by one.
+
+    Requests are packaged into jobs of at most `max_requests_per_job`, which are polled
+    until they finish. Submitted jobs are recorded in `state_path`, so if the process
+    dies while waiting, the next run picks the jobs up again instead of resubmitting
+    (and paying for) their requests.
+
+    Args:
+        client: The Gemini client.
+        model: The model to run the requests with.
+        state_path: Where to record submitted jobs and the request keys in them.
+        max_requests_per_job: Largest number of requests per batch job.
+        poll_interval: Seconds between checks on a job's state.
+        engine: Retries quota, server and transport errors of job submissions and polls.
+    """
+
+    def __init__(
+        self,
+        client: genai.Client,
+        model: str,
+        state_path: Path,
+        max_requests_per_job: int = 1000,
+        poll_interval: float = 60.0,
+        engine: RateLimitedEngine | None = None,
+    ):
+        self.client = client
+        self.model = model
+        self.state_path = state_path
+        self.max_requests_per_job = max_requests_per_job
+        self.poll_interval = poll_interval
+        self.engine = engine if engine is not None else RateLimitedEngine()
+
+    def _load_state(self) -> dict[str, list[str]]:
+        try:
+            with open(self.state_path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save_state(self, state: dict[str, list[str]]) -> None:
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_name(f"{self.state_path.name}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    async def run(
+        self, requests: dict[str, types.InlinedRequest]
+    ) -> dict[str, types.GenerateContentResponse | Exception]:
+        """
+        Run the requests, keyed by a caller-chosen key (e.g. a journal key).
+
+        Returns:
+            The response, or the error, for each key.
+        """
+        state = self._load_state()
+
+        jobs: dict[str, list[str]] = {}
+        remaining = dict(requests)
+        for name, keys in state.items():
+            if any(k in remaining for k in keys):
+                logger.info(f"Resuming batch job {name} from an earlier run")
+                jobs[name] = keys
+                for k in keys:
+                    remaining.pop(k, None)
+
+        keys = list(remaining)
+        for start in range(0, len(keys), self.max_requests_per_job):
+            chunk = keys[start : start + self.max_requests_per_job]
+            job = await self.engine.run(
+                lambda: self.client.aio.batches.create(
+                    model=self.model,
+                    src=[remaining[k] for k in chunk],
+                    config=types.CreateBatchJobConfig(
+                        display_name=f"deep-statutes-{len(chunk)}-requests"
+                    ),
+                )
+            )
+            logger.info(f"Submitted batch job {job.name} with {len(chunk)} requests")
+            jobs[job.name] = chunk
+            state[job.name] = chunk
+            self._save_state(state)
+
+        results: dict[str, types.GenerateContentResponse | Exception] = {}
+        for job_results in await asyncio.gather(
+            *(self._wait(name, job_keys) for name, job_keys in jobs.items())
+        ):
+            results.update(job_results)
+
+        state = self._load_state()
+        for name in jobs:
+            state.pop(name, None)
+        self._save_state(state)
+
+        return {k: v for k, v in results.items() if k in requests}
+
+    async def _wait(
+        self, name: str, keys: list[str]
+    ) -> dict[str, types.GenerateContentResponse | Exception]:
+        while True:
+            job = await self.engine.run(
+                lambda: self.client.aio.batches.get(name=name)
+            )
+            if job.state in _TERMINAL_STATES:
+                break
+            logger.info(f"Batch job {name} is {job.state}")
+            await asyncio.sleep(self.poll_interval)
+
+        if job.state != types.JobState.JOB_STATE_SUCCEEDED:
+            error = RuntimeError(f"Batch job {name} ended as {job.state}: {job.error}")
+            return {k: error for k in keys}
+
+        inlined = [] if job.dest is None else job.dest.inlined_responses or []
+        results: dict[str, types.GenerateContentResponse | Exception] = {}
+        for i, response in enumerate(inlined):
+            # responses carry the request's metadata, but fall back to the request order
+            metadata = getattr(response, "metadata", None) or {}
+            key = metadata.get("key", keys[i] if i < len(keys) else None)
+            if key is None:
+                continue
+            if response.error is not None or response.response is None:
+                results[key] = RuntimeError(f"Batch request failed: {response.error}")
+            else:
+                results[key] = response.response
+
+        for k in keys:
+            if k not in results:
+                results[k] = RuntimeError(f"Batch job {name} returned no response")
+
+        return results
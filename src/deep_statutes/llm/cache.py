@@ -0,0 +1,78 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    A content-addressed on-disk cache of JSON-able LLM results.
+
+    Each entry is one JSON file named by its key. Entries are evicted least-recently-used
+    first once the cache grows beyond `max_bytes`.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int = 256 * 2**20):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(*parts: str) -> str:
+        """
+        Build a key from everything that determines the response (content hashes, prompt, model, ...).
+        """
+        h = hashlib.sha256()
+        for part in parts:
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key: str) -> Any | None:
+        path = self._path(key)
+        try:
+            with open(path, "r") as f:
+                value = json.load(f)
+        except FileNotFoundError:
+            return None
+        except json.JSONDecodeError:
+            logger.warning(f"Ignoring corrupt cache entry {path}")
+            return None
+
+        # mark as recently used for eviction
+        os.utime(path)
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        path = self._path(key)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+
+        self.evict()
+
+    def evict(self) -> None:
+        entries = []
+        for path in self.cache_dir.glob("*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            logger.info(f"Evicting cache entry {path}")
+            path.unlink(missing_ok=True)
+            total_bytes -= size
@@ -0,0 +1,88 @@
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Literal
+
+from google import genai
+from google.genai import types
+
+from deep_statutes.config import (
+    LLM_BACKEND,
+    LLM_RECORDING_DIR,
+    LLM_REPLAY_OPTIONS,
+)
+from deep_statutes.llm.replay import (
+    AsyncRecordingTransport,
+    AsyncReplayTransport,
+    Recording,
+    RecordingTransport,
+    ReplayOptions,
+    ReplayTransport,
+)
+
+BackendMode = Literal["live", "record", "replay"]
+
+
+@dataclass
+class LLMBackend:
+    """
+    Where a Gemini client's requests go.
+
+    "live" talks to the API, "record" talks to the API and records every exchange in
+    `recording_dir`, and "replay" serves the recorded exchanges back without any network
+    access (as shaped by `replay_options`), e.g. to load-test the pipeline on CI.
+    """
+
+    mode: BackendMode = "live"
+    recording_dir: Path = LLM_RECORDING_DIR
+    replay_options: ReplayOptions = field(default_factory=ReplayOptions)
+
+    @classmethod
+    def from_env(cls) -> "LLMBackend":
+        """The backend configured by the LLM_* environment variables."""
+        if LLM_BACKEND not in ("live", "record", "replay"):
+            raise ValueError(f"Unknown LLM backend: {LLM_BACKEND}")
+        return cls(
+            mode=LLM_BACKEND,
+            recording_dir=LLM_RECORDING_DIR,
+            replay_options=ReplayOptions.parse(LLM_REPLAY_OPTIONS),
+        )
+
+
+def make_client(
+    api_key: str | None,
+    base_url: str | None = None,
+    backend: LLMBackend | None = None,
+) -> genai.Client:
+    """
+    Build a Gemini client for the given backend (by default, the one configured in the
+    environment).
+
+    Recording and replaying happen at the HTTP transport, so every SDK call (uploads,
+    cached contents, batches, ...) is covered and callers don't need to know which
+    backend they have.
+    """
+    if backend is None:
+        backend = LLMBackend.from_env()
+
+    http_options = types.HttpOptions()
+    if base_url is not None:
+        http_options.base_url = base_url
+
+    if backend.mode == "record":
+        recording = Recording(backend.recording_dir)
+        http_options.client_args = {"transport": RecordingTransport(recording)}
+        http_options.async_client_args = {
+            "transport": AsyncRecordingTransport(recording)
+        }
+    elif backend.mode == "replay":
+        recording = Recording(backend.recording_dir)
+        http_options.client_args = {
+            "transport": ReplayTransport(recording, backend.replay_options)
+        }
+        http_options.async_client_args = {
+            "transport": AsyncReplayTransport(recording, backend.replay_options)
+        }
+        # there's no account behind a replay
+        api_key = api_key or "replay"
+
+    return genai.Client(api_key=api_key, http_options=http_options)
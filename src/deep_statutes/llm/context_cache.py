@@ -0,0 +1,151 @@
+import asyncio
+import datetime
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from google import genai
+from google.genai import errors, types
+
+from deep_statutes.llm.engine import RateLimitedEngine
+
+logger = logging.getLogger(__name__)
+
+DISPLAY_NAME_PREFIX = "deep-statutes"
+
+
+@dataclass
+class _CacheEntry:
+    name: str | None = None
+    expire_time: datetime.datetime | None = None
+    users: int = 0
+
+
+class ContextCache:
+    """
+    Gemini cached contents shared by groups of requests (e.g. a title's splits).
+
+    Each group announces how many requests will use it with `expect`. The cached content
+    is created on first use, its TTL is extended while it's still in use, and it's
+    deleted once the group's last request calls `release`. `close` deletes anything
+    left over, e.g. after failures.
+
+    Args:
+        client: The Gemini client.
+        engine: Runs the create requests under the same limits as everything else.
+        model: The model the cached content is for.
+        ttl: How long the cached content lives without being extended.
+        refresh_margin: Extend the TTL once less than this is left.
+    """
+
+    def __init__(
+        self,
+        client: genai.Client,
+        engine: RateLimitedEngine,
+        model: str,
+        ttl: datetime.timedelta = datetime.timedelta(hours=1),
+        refresh_margin: datetime.timedelta = datetime.timedelta(minutes=10),
+    ):
+        self.client = client
+        self.engine = engine
+        self.model = model
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+
+        self._entries: dict[str, _CacheEntry] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    def _ttl(self) -> str:
+        return f"{int(self.ttl.total_seconds())}s"
+
+    def expect(self, key: str, num_users: int) -> None:
+        """Announce that `num_users` more requests will use the cached content."""
+        self._entries.setdefault(key, _CacheEntry()).users += num_users
+
+    async def get(
+        self,
+        key: str,
+        make_config: Callable[[], Awaitable[types.CreateCachedContentConfig]],
+        estimated_tokens: int = 0,
+    ) -> str:
+        """
+        Get the name of the cached content for `key`, creating it if necessary.
+
+        Args:
+            key: Identifies the shared content (e.g. its hash).
+            make_config: Builds the cached content (contents and system instruction).
+                Only called when the cached content has to be created.
+            estimated_tokens: Tokens in the cached content, for the TPM limit.
+        """
+        entry = self._entries.setdefault(key, _CacheEntry())
+        lock = self._locks.setdefault(key, asyncio.Lock())
+
+        async with lock:
+            now = datetime.datetime.now(datetime.timezone.utc)
+            if entry.name is not None and entry.expire_time is not None:
+                if entry.expire_time - self.refresh_margin > now:
+                    return entry.name
+                if entry.expire_time > now:
+                    try:
+                        config = types.UpdateCachedContentConfig(ttl=self._ttl())
+                        cached = await self.engine.run(
+                            lambda: self.client.aio.caches.update(
+                                name=entry.name, config=config
+                            )
+                        )
+                        entry.expire_time = cached.expire_time
+                        return entry.name
+                    except errors.ClientError as e:
+                        logger.warning(
+                            f"Couldn't extend cached content {entry.name}: {e}"
+                        )
+
+            create_config = await make_config()
+            create_config.ttl = self._ttl()
+            create_config.display_name = f"{DISPLAY_NAME_PREFIX}-{key[:16]}"
+            cached = await self.engine.run(
+                lambda: self.client.aio.caches.create(
+                    model=self.model, config=create_config
+                ),
+                estimated_tokens=estimated_tokens,
+            )
+            logger.info(f"Created cached content {cached.name} for {key[:16]}")
+
+            entry.name = cached.name
+            entry.expire_time = cached.expire_time
+            if entry.expire_time is None:
+                entry.expire_time = now + self.ttl
+            return entry.name
+
+    def invalidate(self, key: str) -> None:
+        """Forget the cached content for `key`, e.g. if the API no longer has it."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.name = None
+            entry.expire_time = None
+
+    async def release(self, key: str) -> None:
+        """Note that a request is done with the cached content; the last deletes it."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        entry.users -= 1
+        if entry.users <= 0:
+            await self._delete(key)
+
+    async def _delete(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        self._locks.pop(key, None)
+        if entry is None or entry.name is None:
+            return
+        try:
+            await self.client.aio.caches.delete(name=entry.name)
+            logger.info(f"Deleted cached content {entry.name}")
+        except errors.APIError as e:
+            # it expires on its own anyway
+            logger.warning(f"Couldn't delete cached content {entry.name}: {e}")
+
+    async def close(self) -> None:
+        """Delete all cached content this object created."""
+        for key in list(self._entries):
+            await self._delete(key)
@@ -0,0 +1,269 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, TypeVar
+
+from google.genai import errors
+import httpx
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# statuses that mean "slow down" rather than "this request is broken"
+_OVERLOAD_CODES = (408, 429, 500, 502, 503, 504)
+
+
+def is_retryable(e: BaseException) -> bool:
+    """Whether a failed request is worth retrying (quota, server and transport errors)."""
+    if isinstance(e, errors.APIError):
+        return e.code in _OVERLOAD_CODES
+    return isinstance(e, (asyncio.TimeoutError, httpx.TransportError))
+
+
+def backoff_delay(
+    attempt: int, base_delay: float = 1.0, max_delay: float = 60.0
+) -> float:
+    """Exponential backoff with full jitter: uniform in [0, min(max_delay, base_delay * 2**attempt)]."""
+    return random.uniform(0.0, min(max_delay, base_delay * 2**attempt))
+
+
+class TokenBucket:
+    """
+    An async token bucket refilled continuously at `per_minute` tokens per minute.
+
+    The bucket holds at most one minute's worth of tokens, so bursts can't exceed the
+    per-minute limit. A `per_minute` of 0 means unlimited.
+    """
+
+    def __init__(
+        self, per_minute: float, clock: Callable[[], float] = time.monotonic
+    ):
+        self.capacity = float(per_minute)
+        self.clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock: asyncio.Lock | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.capacity / 60.0
+        )
+        self._updated = now
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        """Wait until `amount` tokens are available and take them."""
+        if self.capacity <= 0:
+            return
+
+        # a single request larger than the bucket would otherwise wait forever
+        amount = min(amount, self.capacity)
+
+        # the lock makes waiters queue up in order rather than starve large requests
+        async with self._loop_lock():
+            while True:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                await asyncio.sleep(
+                    (amount - self._tokens) * 60.0 / self.capacity
+                )
+
+    def _loop_lock(self) -> asyncio.Lock:
+        # asyncio locks belong to one event loop, and the bucket may outlive it
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._loop is not loop:
+            self._lock = asyncio.Lock()
+            self._loop = loop
+        return self._lock
+
+    def adjust(self, amount: float) -> None:
+        """
+        Take (or, if negative, return) tokens without waiting, e.g. to correct an estimate
+        once the actual usage is known. The balance may go negative.
+        """
+        if self.capacity <= 0:
+            return
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens - amount)
+
+
+class AdaptiveConcurrency:
+    """
+    An async concurrency limit that adapts to how the service is coping (AIMD).
+
+    The limit grows by about one per limit's worth of successful requests, and shrinks
+    multiplicatively when requests fail with overload errors or their latency rises well
+    above the recent typical latency (an exponentially weighted moving average, so that
+    the baseline follows the workload rather than the fastest request ever seen).
+    """
+
+    def __init__(
+        self,
+        max_limit: int,
+        initial_limit: int | None = None,
+        min_limit: int = 1,
+        backoff_factor: float = 0.5,
+        latency_tolerance: float = 2.0,
+        latency_smoothing: float = 0.1,
+    ):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.backoff_factor = backoff_factor
+        self.latency_tolerance = latency_tolerance
+        self.latency_smoothing = latency_smoothing
+
+        self.limit = float(
+            initial_limit if initial_limit is not None else max(min_limit, max_limit // 2)
+        )
+        self.in_flight = 0
+        self.baseline_latency: float | None = None
+        self._cond: asyncio.Condition | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def _loop_cond(self) -> asyncio.Condition:
+        # asyncio conditions belong to one event loop, and the limiter may outlive it
+        loop = asyncio.get_running_loop()
+        if self._cond is None or self._loop is not loop:
+            self._cond = asyncio.Condition()
+            self._loop = loop
+        return self._cond
+
+    async def acquire(self) -> None:
+        cond = self._loop_cond()
+        async with cond:
+            await cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, latency: float | None, overloaded: bool = False) -> None:
+        """
+        Args:
+            latency: The request's latency in seconds, or None if it failed.
+            overloaded: Whether the request failed because the service is overloaded.
+        """
+        cond = self._loop_cond()
+        async with cond:
+            self.in_flight -= 1
+
+            if overloaded:
+                self._decrease()
+            elif latency is not None:
+                if self.baseline_latency is None:
+                    self.baseline_latency = latency
+                if latency > self.latency_tolerance * self.baseline_latency:
+                    self._decrease()
+                else:
+                    self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+                self.baseline_latency += self.latency_smoothing * (
+                    latency - self.baseline_latency
+                )
+
+            cond.notify_all()
+
+    def _decrease(self) -> None:
+        limit = max(self.min_limit, self.limit * self.backoff_factor)
+        if int(limit) < int(self.limit):
+            logger.info(f"Reducing concurrency to {int(limit)}")
+        self.limit = limit
+
+
+class RateLimitedEngine:
+    """
+    Runs LLM requests under requests-per-minute and tokens-per-minute limits with
+    adaptive concurrency, retrying quota, server and transport errors with jittered
+    exponential backoff.
+
+    Args:
+        rpm: Requests per minute (0 for unlimited).
+        tpm: Tokens per minute (0 for unlimited).
+        max_concurrency: Upper bound on the number of requests in flight.
+        max_retries: Retries per request before giving up.
+        base_delay: Backoff base delay in seconds.
+        max_delay: Backoff delay cap in seconds.
+        timeout: Per-attempt timeout in seconds (None for no timeout).
+    """
+
+    def __init__(
+        self,
+        rpm: float = 0,
+        tpm: float = 0,
+        max_concurrency: int = 8,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        timeout: float | None = None,
+    ):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.concurrency = AdaptiveConcurrency(max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+
+    async def run(
+        self,
+        fn: Callable[[], Awaitable[T]],
+        estimated_tokens: int = 0,
+        actual_tokens: Callable[[T], int | None] | None = None,
+        on_retry: Callable[[Exception], None] | None = None,
+    ) -> T:
+        """
+        Run `fn` (which makes one request) under the limits, retrying it as needed.
+
+        Args:
+            fn: Makes the request. Called once per attempt.
+            estimated_tokens: Tokens to reserve against the TPM limit before the request.
+            actual_tokens: Gets the actual token use from the result, to correct the estimate.
+            on_retry: Called with the error of each attempt that is retried.
+        """
+        attempt = 0
+        while True:
+            await self.concurrency.acquire()
+            latency = None
+            overloaded = False
+            reserved = False
+            try:
+                await self.requests.acquire(1)
+                await self.tokens.acquire(estimated_tokens)
+                reserved = True
+
+                start = time.monotonic()
+                if self.timeout is not None:
+                    result = await asyncio.wait_for(fn(), self.timeout)
+                else:
+                    result = await fn()
+                latency = time.monotonic() - start
+            except Exception as e:
+                # a failed attempt didn't use the tokens it reserved
+                if reserved:
+                    self.tokens.adjust(-estimated_tokens)
+
+                retryable = is_retryable(e)
+                overloaded = retryable
+                if not retryable or attempt >= self.max_retries:
+                    raise
+
+                if on_retry is not None:
+                    on_retry(e)
+                delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+                logger.warning(
+                    f"Request failed ({e!r}); retrying in {delay:.1f}s "
+                    f"(attempt {attempt + 1}/{self.max_retries})"
+                )
+            finally:
+                await self.concurrency.release(latency, overloaded)
+
+            if latency is not None:
+                if actual_tokens is not None:
+                    used = actual_tokens(result)
+                    if used is not None:
+                        self.tokens.adjust(used - estimated_tokens)
+                return result
+
+            attempt += 1
+            await asyncio.sleep(delay)
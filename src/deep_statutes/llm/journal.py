@@ -0,0 +1,107 @@
+import datetime
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Literal
+
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+
+class JournalEntry(BaseModel):
+    key: str
+    status: Literal["done", "failed"]
+    source: str
+    outputs: list[str] = []
+    usage: dict[str, Any] | None = None
+    error: str | None = None
+    time: str
+
+
+class Journal:
+    """
+    An append-only JSON Lines record of LLM work items, so an interrupted run can resume
+    where it left off.
+
+    Items are keyed by everything that determines the result (see `ResponseCache.key`);
+    the last entry for a key wins. A partially written last line (e.g. from a crash) is
+    ignored.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: dict[str, JournalEntry] = self._load()
+
+    def _load(self) -> dict[str, JournalEntry]:
+        entries = {}
+        try:
+            with open(self.path, "r") as f:
+                for line_no, line in enumerate(f, start=1):
+                    if line.strip() == "":
+                        continue
+                    try:
+                        entry = JournalEntry.model_validate_json(line)
+                    except ValueError:
+                        logger.warning(
+                            f"Ignoring corrupt journal line {self.path}:{line_no}"
+                        )
+                        continue
+                    entries[entry.key] = entry
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def _ends_mid_line(self) -> bool:
+        try:
+            with open(self.path, "rb") as f:
+                if f.seek(0, os.SEEK_END) == 0:
+                    return False
+                f.seek(-1, os.SEEK_END)
+                return f.read(1) != b"\n"
+        except FileNotFoundError:
+            return False
+
+    def get(self, key: str) -> JournalEntry | None:
+        with self._lock:
+            return self._entries.get(key)
+
+    def is_done(self, key: str) -> bool:
+        """Whether the item completed and all of its outputs still exist."""
+        entry = self.get(key)
+        return (
+            entry is not None
+            and entry.status == "done"
+            and all(Path(p).exists() for p in entry.outputs)
+        )
+
+    def record(
+        self,
+        key: str,
+        status: Literal["done", "failed"],
+        source: Path,
+        outputs: list[Path] | None = None,
+        usage: dict[str, Any] | None = None,
+        error: str | None = None,
+    ) -> None:
+        entry = JournalEntry(
+            key=key,
+            status=status,
+            source=str(source),
+            outputs=[str(p) for p in outputs or []],
+            usage=usage,
+            error=error,
+            time=datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        )
+
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            needs_newline = self._ends_mid_line()
+            with open(self.path, "a") as f:
+                # end a partial line left by a crash, so only it is lost rather than this entry
+                if needs_newline:
+                    f.write("\n")
+                f.write(entry.model_dump_json() + "\n")
+            self._entries[key] = entry
@@ -0,0 +1,277 @@
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, fields
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# response headers worth keeping; the rest (dates, server info, ...) only add noise
+_RECORDED_HEADERS = {"content-type", "x-goog-upload-url", "x-goog-upload-status"}
+
+# credentials are never part of a request's key (request headers aren't recorded at all)
+_SECRET_PARAMS = {"key"}
+
+
+class Recording:
+    """
+    Request/response pairs captured from the Gemini API, one JSON file per distinct
+    request.
+
+    Requests are identified by their method, path, query (minus credentials) and body,
+    so the same request made again (e.g. the same split summarized twice) maps to the
+    same file, which holds every response it got.
+    """
+
+    def __init__(self, recording_dir: Path):
+        self.recording_dir = recording_dir
+        self._lock = threading.Lock()
+        self._next: dict[str, int] = {}
+
+    @staticmethod
+    def _canonical_body(content: bytes) -> bytes:
+        try:
+            return json.dumps(json.loads(content), sort_keys=True).encode("utf-8")
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            return content
+
+    @classmethod
+    def key(cls, request: httpx.Request) -> str:
+        query = [
+            (k, v)
+            for k, v in parse_qsl(request.url.query.decode("utf-8"))
+            if k not in _SECRET_PARAMS
+        ]
+        h = hashlib.sha256()
+        for part in [request.method, request.url.path, urlencode(sorted(query))]:
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        h.update(cls._canonical_body(request.content))
+        return h.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.recording_dir / f"{key}.json"
+
+    def _read(self, key: str) -> dict | None:
+        try:
+            with open(self._path(key), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def add(
+        self, request: httpx.Request, response: httpx.Response, latency: float
+    ) -> None:
+        """Record a response (whose content must already have been read)."""
+        key = self.key(request)
+        exchange = {
+            "status": response.status_code,
+            "headers": {
+                k: v
+                for k, v in response.headers.items()
+                if k.lower() in _RECORDED_HEADERS
+            },
+            "content": base64.b64encode(response.content).decode("ascii"),
+            "latency": latency,
+        }
+
+        with self._lock:
+            entry = self._read(key)
+            if entry is None:
+                entry = {
+                    "method": request.method,
+                    "path": request.url.path,
+                    "responses": [],
+                }
+            entry["responses"].append(exchange)
+
+            self.recording_dir.mkdir(parents=True, exist_ok=True)
+            path = self._path(key)
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+
+    def next(self, request: httpx.Request) -> dict | None:
+        """
+        The next recorded response to the request, cycling through them if it was
+        recorded several times, or None if it never was.
+        """
+        key = self.key(request)
+        with self._lock:
+            entry = self._read(key)
+            if entry is None or len(entry["responses"]) == 0:
+                return None
+            i = self._next.get(key, 0)
+            self._next[key] = i + 1
+            return entry["responses"][i % len(entry["responses"])]
+
+
+@dataclass
+class ReplayOptions:
+    """
+    How a replay deviates from the recording, to load-test the pipeline offline.
+
+    Args:
+        latency_scale: Multiplies the recorded latencies (0 replays instantly).
+        latency_median: If set, ignore the recorded latencies and draw each one from a
+            log-normal distribution with this median (in seconds) instead.
+        latency_sigma: Spread (sigma of the underlying normal) of the log-normal
+            latencies.
+        error_rate: Fraction of requests that fail with a 500 instead.
+        rate_limit_rate: Fraction of requests that fail with a 429 instead.
+        seed: Seed for the random choices, for reproducible runs.
+    """
+
+    latency_scale: float = 1.0
+    latency_median: float | None = None
+    latency_sigma: float = 0.5
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    seed: int | None = None
+
+    @classmethod
+    def parse(cls, spec: str) -> "ReplayOptions":
+        """
+        Parse options written as comma-separated assignments, e.g.
+        "error_rate=0.01,seed=3".
+        """
+        names = {f.name for f in fields(cls)}
+        options = {}
+        for assignment in spec.split(","):
+            if assignment.strip() == "":
+                continue
+            name, _, value = assignment.partition("=")
+            name = name.strip()
+            if name not in names:
+                raise ValueError(f"Unknown replay option: {name}")
+            options[name] = int(value) if name == "seed" else float(value)
+        return cls(**options)
+
+
+class _Replayer:
+    """The decisions shared by the sync and async replay transports."""
+
+    def __init__(self, recording: Recording, options: ReplayOptions):
+        self.recording = recording
+        self.options = options
+        self._random = random.Random(options.seed)
+        self._lock = threading.Lock()
+
+    def respond(self, request: httpx.Request) -> tuple[httpx.Response, float]:
+        """The response to serve and how long to wait before serving it."""
+        exchange = self.recording.next(request)
+
+        with self._lock:
+            u = self._random.random()
+            if self.options.latency_median is not None:
+                latency = self._random.lognormvariate(0, self.options.latency_sigma)
+                latency *= self.options.latency_median
+            elif exchange is not None:
+                latency = exchange["latency"] * self.options.latency_scale
+            else:
+                latency = 0.0
+
+        if exchange is None:
+            logger.warning(
+                f"No recorded response for {request.method} {request.url.path}"
+            )
+            return _error(request, 404, "No recorded response for this request"), 0.0
+        if u < self.options.rate_limit_rate:
+            return _error(request, 429, "Injected rate limit"), latency
+        if u < self.options.rate_limit_rate + self.options.error_rate:
+            return _error(request, 500, "Injected server error"), latency
+
+        response = httpx.Response(
+            exchange["status"],
+            headers=exchange["headers"],
+            content=base64.b64decode(exchange["content"]),
+            request=request,
+        )
+        return response, latency
+
+
+def _error(request: httpx.Request, status: int, message: str) -> httpx.Response:
+    return httpx.Response(
+        status,
+        json={"error": {"code": status, "message": message}},
+        request=request,
+    )
+
+
+class RecordingTransport(httpx.BaseTransport):
+    """Passes requests through to the API and records every exchange."""
+
+    def __init__(
+        self, recording: Recording, transport: httpx.BaseTransport | None = None
+    ):
+        self.recording = recording
+        self.transport = transport if transport is not None else httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.monotonic()
+        response = self.transport.handle_request(request)
+        response.read()
+        self.recording.add(request, response, time.monotonic() - start)
+        return response
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+class AsyncRecordingTransport(httpx.AsyncBaseTransport):
+    """Passes requests through to the API and records every exchange."""
+
+    def __init__(
+        self, recording: Recording, transport: httpx.AsyncBaseTransport | None = None
+    ):
+        self.recording = recording
+        if transport is None:
+            transport = httpx.AsyncHTTPTransport()
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.monotonic()
+        response = await self.transport.handle_async_request(request)
+        await response.aread()
+        latency = time.monotonic() - start
+        await asyncio.to_thread(self.recording.add, request, response, latency)
+        return response
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+class ReplayTransport(httpx.BaseTransport):
+    """Serves recorded responses without touching the network."""
+
+    def __init__(self, recording: Recording, options: ReplayOptions | None = None):
+        self._replayer = _Replayer(recording, options or ReplayOptions())
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.read()
+        response, latency = self._replayer.respond(request)
+        time.sleep(latency)
+        return response
+
+
+class AsyncReplayTransport(httpx.AsyncBaseTransport):
+    """Serves recorded responses without touching the network."""
+
+    def __init__(self, recording: Recording, options: ReplayOptions | None = None):
+        self._replayer = _Replayer(recording, options or ReplayOptions())
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        response, latency = await asyncio.to_thread(self._replayer.respond, request)
+        await asyncio.sleep(latency)
+        return response
@@ -0,0 +1,230 @@
+import argparse
+import datetime
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Literal
+
+import polars as pl
+from google.genai import types
+from pydantic import BaseModel
+
+from deep_statutes.config import LLM_TELEMETRY_PATH
+
+logger = logging.getLogger(__name__)
+
+# USD per million tokens (at the time of writing, for prompts up to 200k tokens):
+# (input, cached input, output, thinking)
+MODEL_PRICES: dict[str, tuple[float, float, float, float]] = {
+    "gemini-2.5-flash-preview-04-17": (0.15, 0.0375, 0.60, 3.50),
+    "gemini-2.5-flash": (0.30, 0.075, 2.50, 2.50),
+    "gemini-2.5-pro": (1.25, 0.31, 10.00, 10.00),
+}
+
+# batch jobs are billed at half the interactive price
+BATCH_DISCOUNT = 0.5
+
+
+class LLMCall(BaseModel):
+    """One logical LLM call, including any retries."""
+
+    time: datetime.datetime
+    state: str | None = None
+    stage: str
+    model: str
+    input_hash: str | None = None
+    status: Literal["ok", "error"] = "ok"
+    error: str | None = None
+    batch: bool = False
+    # seconds
+    latency: float = 0.0
+    upload_time: float | None = None
+    retries: int = 0
+    prompt_tokens: int | None = None
+    cached_tokens: int | None = None
+    candidate_tokens: int | None = None
+    thinking_tokens: int | None = None
+    total_tokens: int | None = None
+
+    def set_usage(self, response: types.GenerateContentResponse) -> None:
+        usage = response.usage_metadata
+        if usage is None:
+            return
+        self.prompt_tokens = usage.prompt_token_count
+        self.cached_tokens = usage.cached_content_token_count
+        self.candidate_tokens = usage.candidates_token_count
+        self.thinking_tokens = usage.thoughts_token_count
+        self.total_tokens = usage.total_token_count
+
+    def retry(self, error: Exception) -> None:
+        """Note a failed attempt that's being retried (see `RateLimitedEngine.run`)."""
+        self.retries += 1
+
+
+class Telemetry:
+    """
+    An append-only JSONL log of LLM calls, for `llm-telemetry` to summarize.
+
+    Args:
+        path: The log file. None records nothing, so callers needn't check.
+        state: The state whose statutes the calls are for, if any.
+    """
+
+    def __init__(self, path: Path | None, state: str | None = None):
+        self.path = path
+        self.state = state
+        self._lock = threading.Lock()
+
+    def record(self, call: LLMCall) -> None:
+        if self.path is None:
+            return
+        line = call.model_dump_json() + "\n"
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(line)
+
+    @contextmanager
+    def track(
+        self, stage: str, model: str, input_hash: str | None = None
+    ) -> Iterator[LLMCall]:
+        """
+        Time a call and record it when the block exits, as an error if it raises.
+
+        The block fills in the rest, e.g. `call.set_usage(response)`.
+        """
+        call = LLMCall(
+            time=datetime.datetime.now(datetime.timezone.utc),
+            state=self.state,
+            stage=stage,
+            model=model,
+            input_hash=input_hash,
+        )
+        start = time.monotonic()
+        try:
+            yield call
+        except BaseException as e:
+            call.status = "error"
+            call.error = repr(e)
+            raise
+        finally:
+            call.latency = time.monotonic() - start
+            self.record(call)
+
+
+_SCHEMA = {
+    "time": pl.String,
+    "state": pl.String,
+    "stage": pl.String,
+    "model": pl.String,
+    "input_hash": pl.String,
+    "status": pl.String,
+    "error": pl.String,
+    "batch": pl.Boolean,
+    "latency": pl.Float64,
+    "upload_time": pl.Float64,
+    "retries": pl.Int64,
+    "prompt_tokens": pl.Int64,
+    "cached_tokens": pl.Int64,
+    "candidate_tokens": pl.Int64,
+    "thinking_tokens": pl.Int64,
+    "total_tokens": pl.Int64,
+}
+
+
+def read_calls(path: Path) -> pl.DataFrame:
+    """Read a telemetry log (JSONL, or Parquet as written by `llm-telemetry --parquet`)."""
+    if path.suffix == ".parquet":
+        return pl.read_parquet(path)
+    calls = pl.read_ndjson(path, schema=_SCHEMA)
+    return calls.with_columns(pl.col("time").str.to_datetime(time_zone="UTC"))
+
+
+def _with_cost(calls: pl.DataFrame) -> pl.DataFrame:
+    prices = pl.DataFrame(
+        {
+            "model": list(MODEL_PRICES),
+            "input_price": [p[0] for p in MODEL_PRICES.values()],
+            "cached_price": [p[1] for p in MODEL_PRICES.values()],
+            "output_price": [p[2] for p in MODEL_PRICES.values()],
+            "thinking_price": [p[3] for p in MODEL_PRICES.values()],
+        }
+    )
+    priced = calls.join(prices, on="model", how="left")
+    unknown = priced.filter(pl.col("input_price").is_null())["model"].unique()
+    if len(unknown) > 0:
+        logger.warning(f"No prices for {', '.join(unknown)}; their cost is left out.")
+
+    cached = pl.col("cached_tokens").fill_null(0)
+    cost = (
+        (pl.col("prompt_tokens").fill_null(0) - cached) * pl.col("input_price")
+        + cached * pl.col("cached_price")
+        + pl.col("candidate_tokens").fill_null(0) * pl.col("output_price")
+        + pl.col("thinking_tokens").fill_null(0) * pl.col("thinking_price")
+    ) / 1e6
+    cost = pl.when(pl.col("batch")).then(cost * BATCH_DISCOUNT).otherwise(cost)
+    return priced.with_columns(cost=cost.fill_null(0))
+
+
+def summarize_calls(calls: pl.DataFrame) -> pl.DataFrame:
+    """
+    Per state and stage: call and error counts, latency percentiles, throughput and cost.
+    """
+    return (
+        _with_cost(calls)
+        .group_by("state", "stage")
+        .agg(
+            calls=pl.len(),
+            errors=(pl.col("status") == "error").sum(),
+            retries=pl.col("retries").sum(),
+            p50_latency=pl.col("latency").quantile(0.5),
+            p95_latency=pl.col("latency").quantile(0.95),
+            mean_prompt_tokens=pl.col("prompt_tokens").mean(),
+            total_tokens=pl.col("total_tokens").sum(),
+            # tokens per second of call time, i.e. per concurrent slot
+            tokens_per_sec=pl.col("total_tokens").sum() / pl.col("latency").sum(),
+            cost_usd=pl.col("cost").sum(),
+        )
+        .sort("state", "stage", nulls_last=True)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Summarize recorded LLM calls: latency, tokens and cost per state and stage."
+    )
+    parser.add_argument(
+        "path",
+        type=Path,
+        nargs="?",
+        default=LLM_TELEMETRY_PATH,
+        help="The telemetry log (JSONL or Parquet).",
+    )
+    parser.add_argument(
+        "--since",
+        type=datetime.datetime.fromisoformat,
+        default=None,
+        help="Only include calls from this time on (ISO format, UTC if no zone is given).",
+    )
+    parser.add_argument(
+        "--parquet",
+        type=Path,
+        default=None,
+        help="Also write the calls to this Parquet file, e.g. for notebooks.",
+    )
+    args = parser.parse_args()
+
+    calls = read_calls(args.path)
+    if args.since is not None:
+        since = args.since
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=datetime.timezone.utc)
+        calls = calls.filter(pl.col("time") >= since)
+
+    if args.parquet is not None:
+        calls.write_parquet(args.parquet)
+
+    with pl.Config(tbl_rows=-1, tbl_cols=-1, tbl_width_chars=200, float_precision=3):
+        print(summarize_calls(calls))
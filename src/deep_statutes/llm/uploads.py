@@ -0,0 +1,142 @@
+import datetime
+import json
+import logging
+import os
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+
+from google import genai
+from google.genai import types
+
+from deep_statutes.build import file_hash
+from deep_statutes.llm.cache import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+
+class UploadRegistry:
+    """
+    A persistent record of files uploaded to the Gemini Files API, keyed by content hash.
+
+    Uploaded files expire (after 48 hours at the time of writing), so a file is reused
+    only while it has at least `expiry_margin` left. Concurrent uploads of the same
+    content within a process are deduplicated: later callers wait for the first upload.
+
+    Uploaded files belong to a project, so entries are also keyed by `namespace` (e.g. the
+    API key; only its hash is stored).
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        namespace: str = "",
+        expiry_margin: datetime.timedelta = datetime.timedelta(minutes=30),
+    ):
+        self.path = path
+        self.namespace = namespace
+        self.expiry_margin = expiry_margin
+
+        self._lock = threading.Lock()
+        self._pending: dict[str, Future] = {}
+        self._entries: dict[str, dict] = self._load()
+
+    def _load(self) -> dict[str, dict]:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except json.JSONDecodeError:
+            logger.warning(f"Ignoring corrupt upload registry {self.path}")
+            return {}
+
+    def _save(self, removed: tuple[str, ...] = ()) -> None:
+        # merge with whatever other processes have recorded in the meantime
+        entries = self._load()
+        entries.update(self._entries)
+        for key in removed:
+            entries.pop(key, None)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        entries = {
+            k: e
+            for k, e in entries.items()
+            if datetime.datetime.fromisoformat(e["expiration_time"]) > now
+        }
+        self._entries = entries
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(entries, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def _key(self, file_path: Path) -> str:
+        return ResponseCache.key(self.namespace, file_hash(file_path))
+
+    def _valid_file(self, key: str) -> types.File | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expiration_time = datetime.datetime.fromisoformat(entry["expiration_time"])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        if expiration_time - self.expiry_margin <= now:
+            return None
+
+        return types.File(
+            name=entry["name"],
+            uri=entry["uri"],
+            mime_type=entry["mime_type"],
+            expiration_time=expiration_time,
+        )
+
+    def upload(self, client: genai.Client, file_path: Path) -> types.File:
+        """
+        Get a still-valid uploaded copy of the file, uploading it only if necessary.
+        """
+        key = self._key(file_path)
+
+        with self._lock:
+            if (file := self._valid_file(key)) is not None:
+                logger.info(f"Reusing uploaded file {file.name} for {file_path}")
+                return file
+
+            pending = self._pending.get(key)
+            if pending is None:
+                self._pending[key] = future = Future()
+
+        if pending is not None:
+            return pending.result()
+
+        try:
+            file = client.files.upload(file=file_path)
+
+            with self._lock:
+                if file.expiration_time is not None:
+                    self._entries[key] = {
+                        "name": file.name,
+                        "uri": file.uri,
+                        "mime_type": file.mime_type,
+                        "expiration_time": file.expiration_time.isoformat(),
+                        "source": str(file_path),
+                    }
+                    self._save()
+
+            future.set_result(file)
+            return file
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def invalidate(self, file_path: Path) -> None:
+        """
+        Forget the uploaded copy of a file, e.g. if the API no longer knows about it.
+        """
+        key = self._key(file_path)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._save(removed=(key,))
@@ -0,0 +1,297 @@
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from deep_statutes.pdf.toc import DocumentTOC, Header, HeaderTreeNode
+
+
+@dataclass
+class HeaderArray:
+    """
+    A header tree stored as parallel arrays, one entry per node in pre-order (i.e. TOC order).
+
+    This is much smaller and faster to build and query than a tree of `HeaderTreeNode`s for
+    documents with tens of thousands of headers; convert with `to_tree` / `from_tree` only
+    where the pydantic models are needed (e.g. for JSON).
+
+    Node i's subtree is the index range [i, subtree_end[i]), and node indices are the node
+    ids of the split manifest.
+    """
+
+    header_types: list[str]
+    strings: list[str]  # interned header texts and sub texts
+    parent: np.ndarray  # int32, -1 for the root
+    depth: np.ndarray  # int32, 0 for the root
+    type_id: np.ndarray  # int32 index into header_types
+    text_id: np.ndarray  # int32 index into strings
+    sub_text_id: np.ndarray  # int32 index into strings
+    page_start: np.ndarray  # int32, 1-indexed and inclusive
+    page_end: np.ndarray  # int32, 1-indexed and inclusive
+    subtree_end: np.ndarray  # int32, exclusive
+
+    def __len__(self) -> int:
+        return len(self.parent)
+
+    @classmethod
+    def from_toc(cls, toc: DocumentTOC, num_pages: int) -> "HeaderArray":
+        """
+        Build the header tree of a TOC in linear time (see `HeaderTreeNode.from_toc`).
+        """
+        if toc.headers[0].page == 0:
+            # TODO EDF this is a hack to make sure the first header is on page 1
+            # should just name everything "page_idx" to make clear it's 0-indexed
+            for header in toc.headers:
+                header.page += 1
+
+        assert toc.headers[0].page == 1, (
+            f"First header must be on page 1 but got {toc.headers[0].page}"
+        )
+
+        n = len(toc.headers)
+        levels = {header_type: i for i, header_type in enumerate(toc.header_types)}
+        string_ids: dict[str, int] = {}
+
+        parent = np.full(n, -1, dtype=np.int32)
+        depth = np.zeros(n, dtype=np.int32)
+        type_id = np.zeros(n, dtype=np.int32)
+        text_id = np.zeros(n, dtype=np.int32)
+        sub_text_id = np.zeros(n, dtype=np.int32)
+        page_start = np.zeros(n, dtype=np.int32)
+        page_end = np.full(n, num_pages, dtype=np.int32)
+        subtree_end = np.full(n, n, dtype=np.int32)
+
+        path_levels: list[int] = []
+        path: list[int] = []
+        for i, header in enumerate(toc.headers):
+            level = levels[header.type]
+            type_id[i] = level
+            text_id[i] = string_ids.setdefault(header.text, len(string_ids))
+            sub_text_id[i] = string_ids.setdefault(header.sub_text, len(string_ids))
+            page_start[i] = header.page
+
+            if i > 0:
+                while path_levels[-1] >= level:
+                    # there's no "whole document" header above the first one
+                    assert len(path) > 1
+                    page_end[path[-1]] = header.page
+                    subtree_end[path[-1]] = i
+                    path.pop()
+                    path_levels.pop()
+                parent[i] = path[-1]
+                depth[i] = len(path)
+
+            path.append(i)
+            path_levels.append(level)
+
+        return cls(
+            header_types=list(toc.header_types),
+            strings=list(string_ids),
+            parent=parent,
+            depth=depth,
+            type_id=type_id,
+            text_id=text_id,
+            sub_text_id=sub_text_id,
+            page_start=page_start,
+            page_end=page_end,
+            subtree_end=subtree_end,
+        )
+
+    @classmethod
+    def from_tree(
+        cls, root: HeaderTreeNode, header_types: list[str] | None = None
+    ) -> "HeaderArray":
+        """
+        Args:
+            root: The root of the tree.
+            header_types: The header types in hierarchical order, e.g. the TOC's. By
+                default, each type goes above the types of its nodes' children.
+        """
+        nodes: list[tuple[HeaderTreeNode, int, int]] = []
+        frontier: list[tuple[HeaderTreeNode, int, int]] = [(root, -1, 0)]
+        while len(frontier) > 0:
+            node, parent_idx, node_depth = frontier.pop()
+            idx = len(nodes)
+            nodes.append((node, parent_idx, node_depth))
+            frontier += [
+                (child, idx, node_depth + 1) for child in reversed(node.children)
+            ]
+
+        if header_types is None:
+            types = list(dict.fromkeys(node.header.type for node, _, _ in nodes))
+            above: dict[str, set[str]] = {t: set() for t in types}
+            for node, parent_idx, _ in nodes:
+                if parent_idx >= 0:
+                    above[node.header.type].add(nodes[parent_idx][0].header.type)
+            header_types = []
+            while len(types) > 0:
+                # the first type not below another remaining one (any, given a cycle)
+                remaining = set(types)
+                t = next(
+                    (t for t in types if above[t].isdisjoint(remaining - {t})),
+                    types[0],
+                )
+                header_types.append(t)
+                types.remove(t)
+        levels = {header_type: i for i, header_type in enumerate(header_types)}
+
+        n = len(nodes)
+        string_ids: dict[str, int] = {}
+        parent = np.array([p for _, p, _ in nodes], dtype=np.int32)
+        depth = np.array([d for _, _, d in nodes], dtype=np.int32)
+        type_id = np.array(
+            [levels[node.header.type] for node, _, _ in nodes], dtype=np.int32
+        )
+        text_id = np.zeros(n, dtype=np.int32)
+        sub_text_id = np.zeros(n, dtype=np.int32)
+        for i, (node, _, _) in enumerate(nodes):
+            text_id[i] = string_ids.setdefault(node.header.text, len(string_ids))
+            sub_text_id[i] = string_ids.setdefault(
+                node.header.sub_text, len(string_ids)
+            )
+
+        # a node's subtree ends where the next node at its depth or above starts
+        subtree_end = np.full(n, n, dtype=np.int32)
+        path: list[int] = []
+        for i in range(n):
+            while len(path) > depth[i]:
+                subtree_end[path.pop()] = i
+            path.append(i)
+
+        return cls(
+            header_types=list(header_types),
+            strings=list(string_ids),
+            parent=parent,
+            depth=depth,
+            type_id=type_id,
+            text_id=text_id,
+            sub_text_id=sub_text_id,
+            page_start=np.array(
+                [node.page_range[0] for node, _, _ in nodes], dtype=np.int32
+            ),
+            page_end=np.array(
+                [node.page_range[1] for node, _, _ in nodes], dtype=np.int32
+            ),
+            subtree_end=subtree_end,
+        )
+
+    def header(self, i: int) -> Header:
+        return Header(
+            type=self.header_types[self.type_id[i]],
+            text=self.strings[self.text_id[i]],
+            sub_text=self.strings[self.sub_text_id[i]],
+            page=int(self.page_start[i]),
+        )
+
+    def page_range(self, i: int) -> tuple[int, int]:
+        return int(self.page_start[i]), int(self.page_end[i])
+
+    def num_pages(self) -> np.ndarray:
+        """The number of pages of every node."""
+        return self.page_end - self.page_start + 1
+
+    def path(self, i: int) -> list[int]:
+        """The nodes from the root down to (and including) node i."""
+        path = [i]
+        while self.parent[path[-1]] >= 0:
+            path.append(int(self.parent[path[-1]]))
+        path.reverse()
+        return path
+
+    def path_text(self, i: int, sep: str = "--") -> str:
+        """The header texts from the root down to node i, e.g. "TITLE 1--ARTICLE 2"."""
+        return sep.join(self.strings[self.text_id[j]] for j in self.path(i))
+
+    def children(self, i: int) -> np.ndarray:
+        """The children of node i, in document order."""
+        start, end = i + 1, self.subtree_end[i]
+        return np.flatnonzero(self.parent[start:end] == i) + start
+
+    def overlapping(self, first_page: int, last_page: int) -> np.ndarray:
+        """The nodes whose page range overlaps the given (1-indexed, inclusive) pages."""
+        return np.flatnonzero(
+            (self.page_start <= last_page) & (self.page_end >= first_page)
+        )
+
+    def choose_splits(self, max_num_pages_hint: int) -> list[int]:
+        """
+        The highest nodes of at most `max_num_pages_hint` pages (see `_choose_split_headers`).
+
+        Nodes with more pages and no children aren't split on at all. The nodes are returned
+        in the same (reverse document) order as `_choose_split_headers` returns them.
+        """
+        return self._highest(self.num_pages() > max_num_pages_hint)
+
+    def choose_splits_by_tokens(
+        self, tokens: np.ndarray, target_tokens: int, max_tokens: int
+    ) -> list[int]:
+        """
+        Choose splits of about `target_tokens` tokens each, given each node's (estimated) tokens.
+
+        A node is split into its children if it has more than `max_tokens`, or if it has more
+        than `target_tokens` and its children are on average closer to the target (by ratio),
+        so that a node just over the target isn't broken into many tiny splits. Nodes without
+        children are split on whatever their size. The nodes are returned in the same order
+        as `choose_splits`.
+        """
+        num_children = np.bincount(self.parent[1:], minlength=len(self))
+        tokens = np.maximum(tokens, 1)
+        mean_child_tokens = tokens / np.maximum(num_children, 1)
+        closer = np.abs(np.log(mean_child_tokens / target_tokens)) < np.abs(
+            np.log(tokens / target_tokens)
+        )
+        descend = (num_children > 0) & (
+            (tokens > max_tokens) | ((tokens > target_tokens) & closer)
+        )
+        return self._highest(descend)
+
+    def _highest(self, descend: np.ndarray) -> list[int]:
+        """The nodes that aren't descended into but whose ancestors all are, in reverse order."""
+        # whether every ancestor of the node is descended into
+        open_path = np.zeros(len(self), dtype=bool)
+        open_path[0] = True
+        for i in range(1, len(self)):
+            p = self.parent[i]
+            open_path[i] = open_path[p] and descend[p]
+        return [int(i) for i in np.flatnonzero(~descend & open_path)[::-1]]
+
+    def to_tree(self, i: int = 0) -> HeaderTreeNode:
+        """Build the `HeaderTreeNode` subtree rooted at node i."""
+        end = self.subtree_end[i]
+        nodes: dict[int, HeaderTreeNode] = {}
+        for j in range(i, end):
+            parent = nodes.get(int(self.parent[j])) if j > i else None
+            node = HeaderTreeNode(
+                header=self.header(j), parent=parent, page_range=self.page_range(j)
+            )
+            if parent is not None:
+                parent.children.append(node)
+            nodes[j] = node
+        return nodes[i]
+
+    def save(self, path: Path) -> None:
+        """Save as an .npz file."""
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                header_types=np.array(self.header_types, dtype=str),
+                strings=np.array(self.strings, dtype=str),
+                parent=self.parent,
+                depth=self.depth,
+                type_id=self.type_id,
+                text_id=self.text_id,
+                sub_text_id=self.sub_text_id,
+                page_start=self.page_start,
+                page_end=self.page_end,
+                subtree_end=self.subtree_end,
+            )
+
+    @classmethod
+    def load(cls, path: Path) -> "HeaderArray":
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files}
+        return cls(
+            header_types=arrays.pop("header_types").tolist(),
+            strings=arrays.pop("strings").tolist(),
+            **arrays,
+        )
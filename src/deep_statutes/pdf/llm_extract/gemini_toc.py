@@ -1,12 +1,19 @@
+from concurrent.futures import ThreadPoolExecutor
 import logging
 from pathlib import Path
+import tempfile
+from typing import Mapping
 
-from google import genai
 from google.genai import types
-import pdfplumber
+import pymupdf
 
-from deep_statutes.config import GEMINI_API_KEY
+from deep_statutes.build import file_hash, json_hash
+from deep_statutes.config import GEMINI_API_KEY, STATUTES_CACHE_DIR
+from deep_statutes.llm.cache import ResponseCache
+from deep_statutes.llm.client import make_client
+from deep_statutes.llm.telemetry import Telemetry
 from deep_statutes.pdf.toc import DocumentTOC, Header
+from deep_statutes.pdf.verify import check_headers_present, normalize_text
 
 
 logger = logging.getLogger(__name__)
@@ -14,6 +21,8 @@ logger = logging.getLogger(__name__)
 
 MODEL_FLASH = "gemini-2.5-flash-preview-04-17"
 
+TOC_CACHE_DIR = STATUTES_CACHE_DIR / "gemini_toc"
+
 
 TOC_PROMPT = """\n\n
 This document is a PDF of laws. It contains text with a specific structure, e.g a hierarchy like:
@@ -60,7 +69,7 @@ The "page" field should contain the page number where the header is found (the f
 
 
 def _query_toc_from_gemini(pdf_path: Path) -> types.GenerateContentResponse:
-    client = genai.Client(api_key=GEMINI_API_KEY)
+    client = make_client(GEMINI_API_KEY)
     gem_pdf_file = client.files.upload(file=pdf_path)
 
 
@@ -84,40 +93,243 @@ def _query_toc_from_gemini(pdf_path: Path) -> types.GenerateContentResponse:
     return response
 
 
+def _toc_cache_key(pdf_path: Path, page_range: tuple[int, int] | None = None) -> str:
+    """
+    Everything that determines the TOC response: the PDF contents (and page window, if any),
+    prompt, model and schema.
+    """
+    parts = [
+        file_hash(pdf_path),
+        TOC_PROMPT,
+        MODEL_FLASH,
+        json_hash(DocumentTOC.model_json_schema()),
+    ]
+    if page_range is not None:
+        parts.append(f"pages {page_range[0]}-{page_range[1]}")
+    return ResponseCache.key(*parts)
+
+
+def _query_toc(
+    pdf_path: Path,
+    cache: ResponseCache,
+    use_cache: bool,
+    page_range: tuple[int, int] | None = None,
+    telemetry: Telemetry | None = None,
+) -> DocumentTOC:
+    """
+    Get the (uncleaned) TOC from the cache if possible and otherwise from Gemini.
+
+    With use_cache=False the cache is not read, but the fresh response still replaces any cached one.
+
+    Args:
+        page_range (tuple[int, int] | None): If given, only this (1-indexed, inclusive) range of
+            pages is sent, and header page numbers in the result are relative to the window.
+        telemetry (Telemetry | None): Where to record the Gemini call, if anywhere.
+    """
+    if telemetry is None:
+        telemetry = Telemetry(None)
+    key = _toc_cache_key(pdf_path, page_range)
+
+    if use_cache and (entry := cache.get(key)) is not None:
+        logger.info(f"Using cached TOC response for {pdf_path} (pages {page_range}).")
+        return DocumentTOC.model_validate(entry["toc"])
+
+    if page_range is None:
+        with telemetry.track("toc", MODEL_FLASH, key) as call:
+            toc_response = _query_toc_from_gemini(pdf_path)
+            call.set_usage(toc_response)
+    else:
+        page_start, page_end = page_range
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            window_path = Path(tmp_dir) / f"{pdf_path.stem}_{page_start}-{page_end}.pdf"
+            window_doc = pymupdf.open()
+            window_doc.insert_pdf(
+                pymupdf.open(pdf_path),
+                from_page=page_start - 1,
+                to_page=page_end - 1,
+                final=1,
+            )
+            window_doc.save(window_path)
+
+            with telemetry.track("toc", MODEL_FLASH, key) as call:
+                toc_response = _query_toc_from_gemini(window_path)
+                call.set_usage(toc_response)
+
+    toc = toc_response.parsed
+
+    usage = toc_response.usage_metadata
+    cache.put(
+        key,
+        {
+            "toc": toc.model_dump(),
+            "usage_metadata": None if usage is None else usage.model_dump(mode="json"),
+        },
+    )
+
+    return toc
+
+
+def _window_ranges(
+    num_pages: int, window_pages: int, window_overlap: int
+) -> list[tuple[int, int]]:
+    """
+    Overlapping (1-indexed, inclusive) page windows covering the whole document.
+    """
+    if window_overlap >= window_pages:
+        raise ValueError("Window overlap must be smaller than the window size.")
+
+    ranges = []
+    start = 1
+    while True:
+        end = min(start + window_pages - 1, num_pages)
+        ranges.append((start, end))
+        if end == num_pages:
+            break
+        start = end - window_overlap + 1
+    return ranges
+
 
-def _check_headers_present(pdf_path: Path, toc: DocumentTOC) -> list[str]:
+def _merge_header_types(header_types_lists: list[list[str]]) -> list[str]:
     """
-    Check if the headers in the TOC are present in the PDF.
-    
-    Returns:
-        list[str]: A list of headers that were not found in the PDF.
+    Merge the header hierarchies reported for each window, keeping their relative order.
+
+    Later windows may not contain the higher levels (e.g. the title), so a type first seen
+    in a later window is placed right after the closest higher type that we already know
+    (or else right before the closest lower one).
+    """
+    merged: list[str] = []
+    for header_types in header_types_lists:
+        for i, header_type in enumerate(header_types):
+            if header_type in merged:
+                continue
+            prev = next((t for t in reversed(header_types[:i]) if t in merged), None)
+            if prev is not None:
+                merged.insert(merged.index(prev) + 1, header_type)
+                continue
+            next_ = next((t for t in header_types[i + 1 :] if t in merged), None)
+            if next_ is not None:
+                merged.insert(merged.index(next_), header_type)
+            else:
+                merged.append(header_type)
+    return merged
+
+
+def _merge_window_tocs(
+    window_tocs: list[tuple[tuple[int, int], DocumentTOC]],
+) -> DocumentTOC:
     """
-    not_found = []
-    with pdfplumber.open(pdf_path) as pdf:
+    Merge the TOCs of overlapping windows (with page numbers relative to each window).
+
+    Each page in an overlap is owned by the window in which it is furthest from the edge
+    (i.e. the overlap is cut in half), so headers in the overlap are taken from only one window.
+    """
+    headers: list[Header] = []
+    seen: set[tuple[str, str, int]] = set()
+    for i, ((page_start, page_end), toc) in enumerate(window_tocs):
+        own_start = page_start
+        if i > 0:
+            prev_end = window_tocs[i - 1][0][1]
+            own_start = (page_start + prev_end) // 2 + 1
+        own_end = page_end
+        if i < len(window_tocs) - 1:
+            next_start = window_tocs[i + 1][0][0]
+            own_end = (next_start + page_end) // 2
+
         for header in toc.headers:
-            found = False
-            page = pdf.pages[header.page - 1]  # page numbers are 1-indexed in the TOC
-            text = page.extract_text(layout=False)
-            found = header.text in text
-            if not found:
-                # this may not be an error, e.g. footer text could be mixed in with the header text,
-                # but generate a warning so we can investigate
-                logger.info(f"Header '{header.text}' not found on PDF page {header.page}.")
-                not_found.append(header.text)
-    return not_found
+            page = header.page + page_start - 1
+            if not own_start <= page <= own_end:
+                continue
+
+            key = (header.type, normalize_text(header.text), page)
+            if key in seen:
+                continue
+            seen.add(key)
+
+            headers.append(header.model_copy(update={"page": page}))
+
+    return DocumentTOC(
+        header_types=_merge_header_types([toc.header_types for _, toc in window_tocs]),
+        headers=headers,
+    )
+
 
+def _query_toc_windowed(
+    pdf_path: Path,
+    cache: ResponseCache,
+    use_cache: bool,
+    window_pages: int,
+    window_overlap: int,
+    max_workers: int,
+    telemetry: Telemetry | None = None,
+) -> DocumentTOC:
+    """
+    Query overlapping page windows of the document concurrently and merge the results.
+    """
+    num_pages = pymupdf.open(pdf_path).page_count
+    page_ranges = _window_ranges(num_pages, window_pages, window_overlap)
 
-def parse_toc(pdf_path: Path) -> DocumentTOC:
-    toc_response = _query_toc_from_gemini(pdf_path)
+    logger.info(f"Querying TOC for {pdf_path} in {len(page_ranges)} windows.")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        window_tocs = list(
+            executor.map(
+                lambda page_range: _query_toc(
+                    pdf_path, cache, use_cache, page_range, telemetry
+                ),
+                page_ranges,
+            )
+        )
 
-    logger.info("Found hierarchy: " + ", ".join(toc_response.parsed.header_types))
+    return _merge_window_tocs(list(zip(page_ranges, window_tocs)))
 
-    if (not_found := _check_headers_present(pdf_path, toc_response.parsed)) :
+
+def parse_toc(
+    pdf_path: Path,
+    use_cache: bool = True,
+    header_search_radius: int = 0,
+    page_text: Mapping[int, str] | None = None,
+    window_pages: int = 0,
+    window_overlap: int = 4,
+    max_workers: int = 8,
+    telemetry: Telemetry | None = None,
+) -> DocumentTOC:
+    """
+    Args:
+        pdf_path (Path): The PDF to extract the TOC from.
+        use_cache (bool): Whether to reuse a cached response for the same PDF, prompt, model and schema.
+        header_search_radius (int): If a header isn't found on its page, search this many pages
+            on either side and correct its page number if it is found there.
+        page_text (Mapping[int, str] | None): Optional text of each 0-indexed page (e.g. from a
+            token stream or corpus) to verify headers against instead of extracting it from the PDF.
+        window_pages (int): If > 0 and the document is longer than this, query overlapping windows
+            of this many pages concurrently instead of sending the whole document at once.
+        window_overlap (int): Number of pages shared by consecutive windows.
+        max_workers (int): Maximum number of concurrent window queries.
+        telemetry (Telemetry | None): Where to record the Gemini calls, if anywhere.
+    """
+    cache = ResponseCache(TOC_CACHE_DIR)
+    if window_pages > 0 and pymupdf.open(pdf_path).page_count > window_pages:
+        toc = _query_toc_windowed(
+            pdf_path,
+            cache,
+            use_cache=use_cache,
+            window_pages=window_pages,
+            window_overlap=window_overlap,
+            max_workers=max_workers,
+            telemetry=telemetry,
+        )
+    else:
+        toc = _query_toc(pdf_path, cache, use_cache=use_cache, telemetry=telemetry)
+
+    logger.info("Found hierarchy: " + ", ".join(toc.header_types))
+
+    not_found = check_headers_present(
+        pdf_path, toc, search_radius=header_search_radius, page_text=page_text
+    )
+    if not_found:
         logger.warning("Headers in TOC not found in PDF. Please check the PDF for accuracy.")
         logger.warning("\tMissing headers: " + ", ".join(not_found))
 
-    toc = toc_response.parsed
-
     cleaned_headers = []
     missing_header_types = set()
     for header in toc.headers:
@@ -0,0 +1,253 @@
+import logging
+import re
+from collections import Counter
+from statistics import median
+
+import pymupdf
+
+from deep_statutes.pdf.toc import DocumentTOC, Header
+from deep_statutes.pdf.util import LineDict
+from deep_statutes.pdf.verify import check_headers_present, normalize_text
+
+logger = logging.getLogger(__name__)
+
+
+# e.g. "TITLE 11—BANKRUPTCY", "CHAPTER 3. CASE ADMINISTRATION", "PART 7", "SUBCHAPTER IV-A"
+_HEADER_RE = re.compile(
+    r"^((?i:TITLE|SUBTITLE|CHAPTER|SUBCHAPTER|ARTICLE|PART|SUBPART|DIVISION))\s+"
+    r"([0-9]+[A-Z]?(?:[.-][0-9A-Z]+)*|[IVXLC]+(?:-[A-Z])?|[A-Z])"
+    r"(?:\s*[—–.:-]+\s*|\s+|$)(.*)$"
+)
+
+
+def _parse_header_text(text: str) -> tuple[str, str, str] | None:
+    """
+    Split e.g. "CHAPTER 3—CASE ADMINISTRATION" into ("chapter", "CHAPTER 3", "CASE ADMINISTRATION").
+    """
+    m = _HEADER_RE.match(normalize_text(text))
+    if m is None:
+        return None
+    keyword, number, sub_text = m.groups()
+    return keyword.lower(), f"{keyword} {number}", sub_text.strip()
+
+
+def _order_header_types(header_types: list[str], rank: dict[str, float]) -> list[str]:
+    """
+    Order header types by rank (lower is higher in the hierarchy), breaking ties by first appearance.
+    """
+    first_seen = {t: i for i, t in reversed(list(enumerate(header_types)))}
+    return sorted(first_seen, key=lambda t: (rank[t], first_seen[t]))
+
+
+def verified_fraction(doc: pymupdf.Document, toc: DocumentTOC) -> float:
+    """The fraction of headers that are actually on their page."""
+    if len(toc.headers) == 0:
+        return 0.0
+    not_found = check_headers_present(doc, toc)
+    return 1.0 - len(not_found) / len(toc.headers)
+
+
+def _confidence(toc: DocumentTOC, verified: float) -> float:
+    """
+    The fraction of headers that are actually on their page, discounted for very short TOCs.
+    """
+    if len(toc.headers) < 2:
+        return 0.0
+    return verified * min(1.0, len(toc.headers) / 3)
+
+
+def toc_from_outline(doc: pymupdf.Document) -> tuple[DocumentTOC | None, float]:
+    """
+    Build a TOC from the PDF's embedded outline (bookmarks).
+
+    Sections (e.g. "§ 101.") are skipped since, like the LLM TOC, we only go down to the
+    level above sections. Entries that don't look like a known header get a per-level type.
+
+    Returns:
+        The TOC (or None if the PDF has no usable outline) and a confidence score in [0, 1].
+    """
+    toc = _outline_toc(doc)
+    if toc is None:
+        return None, 0.0
+    return toc, _confidence(toc, verified_fraction(doc, toc))
+
+
+def _outline_toc(doc: pymupdf.Document) -> DocumentTOC | None:
+    headers = []
+    levels: dict[str, list[int]] = {}
+    for level, title, page in doc.get_toc(simple=True):
+        title = normalize_text(title)
+        if page < 1 or title == "" or title.startswith("§"):
+            continue
+
+        if (parsed := _parse_header_text(title)) is not None:
+            header_type, text, sub_text = parsed
+        else:
+            header_type, text, sub_text = f"level_{level}", title, ""
+
+        levels.setdefault(header_type, []).append(level)
+        headers.append(Header(type=header_type, text=text, sub_text=sub_text, page=page))
+
+    if len(headers) == 0:
+        return None
+
+    header_types = _order_header_types(
+        [h.type for h in headers], {t: median(lv) for t, lv in levels.items()}
+    )
+    return DocumentTOC(header_types=header_types, headers=headers)
+
+
+def _line_font(line: LineDict) -> tuple[str, float] | None:
+    for span in line["spans"]:
+        if span["text"].strip() != "":
+            return span["font"], round(span["size"], 1)
+    return None
+
+
+def toc_from_fonts(
+    doc: pymupdf.Document, max_font_fraction: float = 0.05
+) -> tuple[DocumentTOC | None, float]:
+    """
+    Detect headers as lines set in rare fonts that look like headers (e.g. "CHAPTER 3").
+
+    Fonts are "rare" if, counting from the least used font, they make up no more than
+    `max_font_fraction` of the document's characters (as in scripts/pdf_standouts.ipynb).
+    A rare-font line directly following a header is used as its sub text if the header
+    line has none.
+
+    Returns:
+        The TOC (or None if no headers were found) and a confidence score in [0, 1], based
+        on whether each header type is consistently set in one font.
+    """
+    # one get_text("dict") per page
+    pages = [page.get_text("dict") for page in doc]
+
+    font_chars: Counter[tuple[str, float]] = Counter()
+    for d in pages:
+        for block in d["blocks"]:
+            for line in block.get("lines", []):
+                for span in line["spans"]:
+                    font = (span["font"], round(span["size"], 1))
+                    font_chars[font] += len(normalize_text(span["text"]))
+
+    total_chars = sum(font_chars.values())
+    if total_chars == 0:
+        return None, 0.0
+
+    rare_fonts = set()
+    cum_chars = 0
+    for font, count in reversed(font_chars.most_common()):
+        cum_chars += count
+        if cum_chars / total_chars > max_font_fraction:
+            break
+        rare_fonts.add(font)
+
+    headers: list[Header] = []
+    header_fonts: list[tuple[str, float]] = []
+    for page_idx, d in enumerate(pages):
+        prev_header = None
+        for block in d["blocks"]:
+            for line in block.get("lines", []):
+                font = _line_font(line)
+                if font is None:
+                    continue
+                if font not in rare_fonts:
+                    prev_header = None
+                    continue
+
+                text = normalize_text(" ".join(span["text"] for span in line["spans"]))
+                if (parsed := _parse_header_text(text)) is not None:
+                    header_type, header_text, sub_text = parsed
+                    prev_header = Header(
+                        type=header_type,
+                        text=header_text,
+                        sub_text=sub_text,
+                        page=page_idx + 1,
+                    )
+                    headers.append(prev_header)
+                    header_fonts.append(font)
+                elif prev_header is not None and prev_header.sub_text == "":
+                    prev_header.sub_text = text
+                    prev_header = None
+
+    if len(headers) == 0:
+        return None, 0.0
+
+    # larger fonts are higher in the hierarchy
+    sizes: dict[str, list[float]] = {}
+    fonts_by_type: dict[str, Counter] = {}
+    for header, font in zip(headers, header_fonts):
+        sizes.setdefault(header.type, []).append(font[1])
+        fonts_by_type.setdefault(header.type, Counter())[font] += 1
+
+    header_types = _order_header_types(
+        [h.type for h in headers], {t: -median(s) for t, s in sizes.items()}
+    )
+
+    consistent = sum(c.most_common(1)[0][1] for c in fonts_by_type.values())
+    consistency = consistent / len(headers)
+
+    toc = DocumentTOC(header_types=header_types, headers=headers)
+    return toc, consistency * min(1.0, len(headers) / 3)
+
+
+def local_toc(doc: pymupdf.Document) -> tuple[DocumentTOC | None, float, float]:
+    """
+    Extract a TOC without an LLM: from the PDF outline if it has one, and otherwise (or if
+    the outline doesn't hold up) from font statistics.
+
+    Returns:
+        The more confident TOC (None if neither method found headers), its confidence in
+        [0, 1] and the fraction of its headers that are on their pages.
+    """
+    toc = _outline_toc(doc)
+    verified = verified_fraction(doc, toc) if toc is not None else 0.0
+    confidence = _confidence(toc, verified) if toc is not None else 0.0
+    logger.info(f"Outline TOC confidence: {confidence:.2f}")
+    if confidence >= 0.99:
+        return toc, confidence, verified
+
+    font_toc, font_confidence = toc_from_fonts(doc)
+    logger.info(f"Font TOC confidence: {font_confidence:.2f}")
+    if font_confidence > confidence:
+        return font_toc, font_confidence, verified_fraction(doc, font_toc)
+
+    return toc, confidence, verified
+
+
+def with_document_root(toc: DocumentTOC, text: str) -> DocumentTOC:
+    """
+    The TOC with a "document" header on page 1 above all others, if it has more than one
+    top-level header (e.g. an outline of chapters), since the header tree needs a single root.
+    """
+    levels = {header_type: i for i, header_type in enumerate(toc.header_types)}
+    top_level = levels[toc.headers[0].type]
+    if all(levels[h.type] > top_level for h in toc.headers[1:]):
+        return toc
+    return DocumentTOC(
+        header_types=["document"] + toc.header_types,
+        headers=[Header(type="document", text=text, sub_text="", page=1)] + toc.headers,
+    )
+
+
+def is_usable(
+    toc: DocumentTOC | None,
+    confidence: float,
+    verified: float,
+    min_confidence: float,
+    min_verified_fraction: float = 0.9,
+) -> bool:
+    """
+    Whether a local TOC can be used instead of asking an LLM: it must be confident enough,
+    cover page 1 and have enough of its headers on their pages (`verified`, as returned by
+    `local_toc`).
+    """
+    if toc is None or len(toc.headers) == 0 or confidence < min_confidence:
+        return False
+    if toc.headers[0].page != 1:
+        logger.info(f"Local TOC starts on page {toc.headers[0].page}, not page 1.")
+        return False
+    if verified < min_verified_fraction:
+        logger.info(f"Only {verified:.0%} of the local TOC's headers are on their pages.")
+        return False
+    return True
@@ -0,0 +1,221 @@
+from pathlib import Path
+from typing import Annotated, Literal, Union
+
+from pydantic import BaseModel, Field, TypeAdapter
+
+from deep_statutes.pdf.header_array import HeaderArray
+from deep_statutes.pdf.toc import Header, HeaderTreeNode
+
+MANIFEST_NAME = "manifest.jsonl"
+
+
+class ManifestDocument(BaseModel):
+    kind: Literal["document"] = "document"
+    source: str | None  # path of the source PDF, if it was opened from disk
+    num_pages: int
+    # path of a clean (e.g. footer-stripped) token stream of the source, if there is one
+    token_stream: str | None = None
+
+
+class ManifestNode(BaseModel):
+    kind: Literal["node"] = "node"
+    id: int
+    parent_id: int | None
+    header: Header
+    page_range: tuple[int, int]  # 1-indexed and inclusive
+
+
+class ManifestSplit(BaseModel):
+    kind: Literal["split"] = "split"
+    node_id: int
+    file_name: str
+
+
+ManifestRecord = Annotated[
+    Union[ManifestDocument, ManifestNode, ManifestSplit], Field(discriminator="kind")
+]
+
+_record_adapter = TypeAdapter(ManifestRecord)
+
+
+class SplitManifest:
+    """
+    Everything we know about how a single source document was split.
+
+    The manifest is stored as JSON Lines: one document record, then one record per
+    header tree node (in pre-order, referring to its parent by id), then one record
+    per split file referring to the node it contains. Each node is written exactly once.
+    """
+
+    def __init__(
+        self,
+        document: ManifestDocument,
+        nodes: list[ManifestNode],
+        splits: list[ManifestSplit],
+    ):
+        self.document = document
+        self.nodes = nodes
+        self.splits = splits
+
+        self._children: dict[int, list[int]] = {n.id: [] for n in nodes}
+        for node in nodes:
+            if node.parent_id is not None:
+                self._children[node.parent_id].append(node.id)
+        self._by_id = {n.id: n for n in nodes}
+
+    @classmethod
+    def from_tree(
+        cls,
+        source: str | None,
+        num_pages: int,
+        root: HeaderTreeNode,
+        split_nodes: list[tuple[HeaderTreeNode, str]],
+        token_stream: str | None = None,
+    ) -> "SplitManifest":
+        """
+        Build a manifest from a header tree and the (node, file name) pairs it was split into.
+        """
+        nodes: list[ManifestNode] = []
+        ids: dict[int, int] = {}
+
+        frontier: list[tuple[HeaderTreeNode, int | None]] = [(root, None)]
+        while len(frontier) > 0:
+            node, parent_id = frontier.pop()
+            node_id = len(nodes)
+            ids[id(node)] = node_id
+            nodes.append(
+                ManifestNode(
+                    id=node_id,
+                    parent_id=parent_id,
+                    header=node.header,
+                    page_range=tuple(node.page_range),
+                )
+            )
+            frontier += [(child, node_id) for child in reversed(node.children)]
+
+        splits = [
+            ManifestSplit(node_id=ids[id(node)], file_name=file_name)
+            for node, file_name in split_nodes
+        ]
+
+        return cls(
+            document=ManifestDocument(
+                source=source, num_pages=num_pages, token_stream=token_stream
+            ),
+            nodes=nodes,
+            splits=splits,
+        )
+
+    @classmethod
+    def from_array(
+        cls,
+        source: str | None,
+        num_pages: int,
+        tree: HeaderArray,
+        split_nodes: list[tuple[int, str]],
+        token_stream: str | None = None,
+    ) -> "SplitManifest":
+        """
+        Like `from_tree`, with splits given by node index; the ids are the same as for the tree.
+        """
+        nodes = [
+            ManifestNode(
+                id=i,
+                parent_id=int(tree.parent[i]) if i > 0 else None,
+                header=tree.header(i),
+                page_range=tree.page_range(i),
+            )
+            for i in range(len(tree))
+        ]
+        splits = [
+            ManifestSplit(node_id=node_id, file_name=file_name)
+            for node_id, file_name in split_nodes
+        ]
+
+        return cls(
+            document=ManifestDocument(
+                source=source, num_pages=num_pages, token_stream=token_stream
+            ),
+            nodes=nodes,
+            splits=splits,
+        )
+
+    @classmethod
+    def read(cls, path: Path) -> "SplitManifest":
+        document = None
+        nodes = []
+        splits = []
+        with open(path, "r") as f:
+            for line in f:
+                if line.strip() == "":
+                    continue
+                record = _record_adapter.validate_json(line)
+                match record:
+                    case ManifestDocument():
+                        document = record
+                    case ManifestNode():
+                        nodes.append(record)
+                    case ManifestSplit():
+                        splits.append(record)
+
+        if document is None:
+            raise ValueError(f"Manifest {path} has no document record")
+
+        return cls(document=document, nodes=nodes, splits=splits)
+
+    def write(self, path: Path) -> None:
+        with open(path, "w") as f:
+            for record in [self.document, *self.nodes, *self.splits]:
+                f.write(record.model_dump_json())
+                f.write("\n")
+
+    def node(self, node_id: int) -> ManifestNode:
+        return self._by_id[node_id]
+
+    def path(self, node_id: int) -> list[Header]:
+        """
+        Get the headers from the root down to (and including) the given node.
+        """
+        path = []
+        node = self._by_id[node_id]
+        while node is not None:
+            path.append(node.header)
+            node = None if node.parent_id is None else self._by_id[node.parent_id]
+        path.reverse()
+        return path
+
+    def children(self, node_id: int) -> list[int]:
+        """Get the ids of the given node's children, in document order."""
+        return self._children[node_id]
+
+    def following(self, node_id: int) -> ManifestNode | None:
+        """
+        Get the first node after the given node's subtree in document order, if any.
+        """
+        # ids are assigned in pre-order, so the subtree ends at its last descendant
+        last_id = node_id
+        while len(self._children[last_id]) > 0:
+            last_id = self._children[last_id][-1]
+        return self._by_id.get(last_id + 1)
+
+    def subtree(self, node_id: int) -> HeaderTreeNode:
+        """
+        Rebuild the HeaderTreeNode subtree rooted at the given node.
+
+        Note that the returned root has no parent; use `path` to get its ancestors.
+        """
+        node = self._by_id[node_id]
+        root = HeaderTreeNode(header=node.header, page_range=node.page_range)
+
+        frontier = [(node_id, root)]
+        while len(frontier) > 0:
+            parent_id, parent = frontier.pop()
+            for child_id in self._children[parent_id]:
+                child = self._by_id[child_id]
+                child_node = HeaderTreeNode(
+                    header=child.header, parent=parent, page_range=child.page_range
+                )
+                parent.children.append(child_node)
+                frontier.append((child_id, child_node))
+
+        return root
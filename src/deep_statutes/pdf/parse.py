@@ -99,6 +99,20 @@ def find_headers(
         header_types (list[str]): The list of header types to find, in hierarchical order.
         token_stream_path (Path): The path to the token stream file.
     """
+    toc, _ = find_headers_with_ranges(header_grammar, header_types, token_stream_path)
+    return toc
+
+
+def find_headers_with_ranges(
+    header_grammar: str, header_types: list[str], token_stream_path: Path
+) -> tuple[DocumentTOC, list[tuple[int, int]]]:
+    """
+    Like `find_headers`, but also return where each header is in the token stream.
+
+    Returns:
+        - the headers
+        - the (start, end) character offsets of each header's text in the token stream
+    """
     lark = Lark(
         header_grammar,
         start="_header_start",
@@ -107,6 +121,7 @@ def find_headers(
     )
 
     headers = []
+    text_ranges = []
     text_idx = 0
     with open(token_stream_path, "r") as file:
         text = file.read()
@@ -130,7 +145,9 @@ def find_headers(
             # get longest possible parse
             parse = parses[-1]
             e = end_pos[-1]
-            header = _to_header(page, (text_idx, text_idx + e + 1), header_types, parse)
+            text_range = (text_idx, text_idx + e + 1)
+            header = _to_header(page, text_range, header_types, parse)
             headers.append(header)
+            text_ranges.append(text_range)
 
-    return DocumentTOC(header_types=header_types, headers=headers)
+    return DocumentTOC(header_types=header_types, headers=headers), text_ranges
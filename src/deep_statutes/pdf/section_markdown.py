@@ -0,0 +1,133 @@
+import logging
+import shutil
+from pathlib import Path
+from typing import TextIO
+
+from pydantic import BaseModel
+
+from deep_statutes.index.intervals import HeaderIntervals
+from deep_statutes.pdf.token_stream import token_stream_lines
+
+logger = logging.getLogger(__name__)
+
+SECTIONS_MANIFEST_NAME = "sections.jsonl"
+
+
+class SectionFile(BaseModel):
+    node: int  # in the header tree
+    section: str
+    file_name: str
+    path: str  # e.g. "TITLE 2--ARTICLE 2--PART 7--2-2-701"
+    char_range: tuple[int, int]  # in the token stream; the end is -1 for its end
+    num_chars: int  # of markdown
+
+
+def write_section_markdown(
+    token_stream_path: Path,
+    intervals: HeaderIntervals,
+    output_dir: Path,
+    section_type: str = "section",
+) -> list[SectionFile]:
+    """
+    Write each section's text (from its header to the next header) to its own markdown file.
+
+    The token stream is read in one pass, a line at a time, and each section is written as
+    it's read, so memory use doesn't depend on the size of the title. Any previous output in
+    the directory is removed first. Text between a non-section header and the next header
+    (e.g. an article's notes) isn't written.
+
+    Args:
+        token_stream_path: The token stream the header offsets refer to.
+        intervals: The header tree, with token stream offsets.
+        output_dir: Where to write "<header path>.md" per section and `SECTIONS_MANIFEST_NAME`.
+    Returns:
+        The files written, in document order.
+    """
+    if intervals.char_start is None:
+        raise ValueError("Sections can only be written with token stream offsets.")
+    tree = intervals.tree
+    starts = intervals.char_start
+
+    if output_dir.exists():
+        shutil.rmtree(output_dir)
+    output_dir.mkdir(parents=True)
+
+    section_type_id = (
+        tree.header_types.index(section_type)
+        if section_type in tree.header_types
+        else -1
+    )
+
+    files: list[SectionFile] = []
+    paths: set[str] = set()
+    out: TextIO | None = None
+    num_chars = 0
+    new_paragraph = False
+
+    def _close() -> None:
+        nonlocal out
+        if out is not None:
+            out.close()
+            files[-1].num_chars = num_chars
+        out = None
+
+    node = -1
+    with open(token_stream_path, "r") as f:
+        for line in token_stream_lines(f):
+            # the line belongs to the last header starting before it
+            new_node = node
+            while new_node + 1 < len(tree) and starts[new_node + 1] <= line.offset:
+                new_node += 1
+            if new_node != node:
+                node = new_node
+                _close()
+                if tree.type_id[node] == section_type_id:
+                    path = tree.path_text(node)
+                    # e.g. a section number that appears twice in an article
+                    file_name = (
+                        f"{path}.md" if path not in paths else f"{path}_{node}.md"
+                    )
+                    paths.add(path)
+                    files.append(
+                        SectionFile(
+                            node=node,
+                            section=tree.strings[tree.text_id[node]],
+                            file_name=file_name,
+                            path=path,
+                            char_range=(
+                                int(starts[node]),
+                                int(intervals.char_end[node]),
+                            ),
+                            num_chars=0,
+                        )
+                    )
+                    out = open(output_dir / files[-1].file_name, "w")
+                    heading = f"# {tree.path_text(node, sep=' > ')}\n"
+                    out.write(heading)
+                    num_chars = len(heading)
+                    new_paragraph = True
+
+            if out is None:
+                continue
+            # indented lines start paragraphs (e.g. subsections)
+            if line.indent > 0 or new_paragraph:
+                text = f"\n{line.text}\n"
+            else:
+                text = f"{line.text}\n"
+            new_paragraph = False
+            out.write(text)
+            num_chars += len(text)
+
+    _close()
+
+    with open(output_dir / SECTIONS_MANIFEST_NAME, "w") as f:
+        for section_file in files:
+            f.write(section_file.model_dump_json() + "\n")
+
+    logger.info(f"Wrote {len(files)} sections of {token_stream_path.name}.")
+    return files
+
+
+def read_section_files(output_dir: Path) -> list[SectionFile]:
+    with open(output_dir / SECTIONS_MANIFEST_NAME, "r") as f:
+        return [SectionFile.model_validate_json(line) for line in f if line.strip()]
@@ -1,12 +1,15 @@
 import argparse
 import io
-import json
 import logging
 from pathlib import Path
 
 import pymupdf
 
-from deep_statutes.pdf.toc import HeaderTreeNode
+from deep_statutes.config import LLM_TELEMETRY_PATH
+from deep_statutes.llm.telemetry import Telemetry
+from deep_statutes.pdf.local_toc import is_usable, local_toc, with_document_root
+from deep_statutes.pdf.manifest import MANIFEST_NAME, SplitManifest
+from deep_statutes.pdf.toc import DocumentTOC, HeaderTreeNode
 from deep_statutes.pdf.llm_extract.gemini_toc import parse_toc
 
 logging.basicConfig(level=logging.INFO)
@@ -46,6 +49,49 @@ def _choose_split_headers(
     return splits
 
 
+def split_header_path(node: HeaderTreeNode) -> str:
+    """
+    The name used for a split's output files, e.g. "TITLE 1--ARTICLE 2".
+    """
+    return "--".join([h.header.text for h in node.path()])
+
+
+def write_split(
+    doc: pymupdf.Document, page_range: tuple[int, int], output_path: Path
+) -> None:
+    """
+    Write the given (1-indexed, inclusive) page range of the document to a new PDF.
+    """
+    page_start, page_end = page_range
+    logger.info(f"Writing pages {page_start}-{page_end} {output_path}.")
+
+    output_doc = pymupdf.open()
+    output_doc.insert_pdf(doc, from_page=page_start - 1, to_page=page_end - 1, final=1)
+    output_doc.save(output_path)
+
+
+def write_split_manifest(
+    source: str | None,
+    num_pages: int,
+    header_tree: HeaderTreeNode,
+    split_headers_paths: list[tuple[HeaderTreeNode, str]],
+    output_dir: Path,
+    token_stream: str | None = None,
+) -> None:
+    # a single manifest for the whole document; each node is recorded once and
+    # splits refer to nodes by id
+    manifest = SplitManifest.from_tree(
+        source=source,
+        num_pages=num_pages,
+        root=header_tree,
+        split_nodes=[
+            (node, f"{header_path}.pdf") for node, header_path in split_headers_paths
+        ],
+        token_stream=token_stream,
+    )
+    manifest.write(output_dir / MANIFEST_NAME)
+
+
 def split_pdf(
     doc: pymupdf.Document,
     header_tree: HeaderTreeNode,
@@ -59,34 +105,41 @@ def split_pdf(
     split_headers_paths = []
 
     for node in split_headers:
-        header_path = "--".join([h.header.text for h in node.path()])
-        page_start, page_end = node.page_range
-
+        header_path = split_header_path(node)
         split_headers_paths.append((node, header_path))
 
-        output_path = output_dir / f"{header_path}.pdf"
-        logger.info(f"Writing pages {page_start}-{page_end} {output_path}.")
+        write_split(doc, node.page_range, output_dir / f"{header_path}.pdf")
 
-        output_doc = pymupdf.open()
-        output_doc.insert_pdf(
-            doc, from_page=page_start - 1, to_page=page_end - 1, final=1
-        )
-        output_doc.save(output_path)
+    write_split_manifest(
+        doc.name, len(doc), header_tree, split_headers_paths, output_dir
+    )
+
+    return split_headers_paths
 
-        root = node.model_dump()
-        path = [h.header for h in node.path()]
 
-        info = {
-            "root": root,
-            "path": [h.model_dump() for h in path],
-        }
+def find_toc(
+    doc: pymupdf.Document,
+    pdf_path: Path,
+    min_local_confidence: float = 0.9,
+    min_verified_fraction: float = 0.9,
+    **gemini_args,
+) -> DocumentTOC:
+    """
+    The TOC from the PDF outline or font statistics if it's usable, and otherwise from Gemini.
 
-        info_path = output_dir / f"{header_path}_info.json"
+    A local TOC with several top-level headers (e.g. chapters) gets a "document" header
+    above them, named after the PDF.
 
-        with open(info_path, "w") as f:
-            json.dump(info, f, indent=2)
+    Args:
+        gemini_args: Passed to `parse_toc`.
+    """
+    toc, confidence, verified = local_toc(doc)
+    if is_usable(toc, confidence, verified, min_local_confidence, min_verified_fraction):
+        logger.info(f"Using local TOC (confidence {confidence:.2f}).")
+        return with_document_root(toc, pdf_path.stem)
 
-    return split_headers_paths
+    logger.info(f"Local TOC (confidence {confidence:.2f}) isn't usable; using Gemini.")
+    return parse_toc(pdf_path, **gemini_args)
 
 
 def main():
@@ -104,6 +157,59 @@ def main():
         type=Path,
         help="Directory to save the split PDFs and ToC.",
     )
+    parser.add_argument(
+        "--no_cache",
+        action="store_true",
+        help="Don't reuse a cached Gemini TOC response for this PDF (a fresh response is still cached).",
+    )
+    parser.add_argument(
+        "--header_search_radius",
+        type=int,
+        default=0,
+        help="If a header isn't on the page Gemini reported, search this many pages on either side and correct the page number.",
+    )
+    parser.add_argument(
+        "--window_pages",
+        type=int,
+        default=0,
+        help="Query the TOC in overlapping windows of this many pages (in parallel) for longer documents. 0 sends the whole document at once.",
+    )
+    parser.add_argument(
+        "--window_overlap",
+        type=int,
+        default=4,
+        help="Number of pages shared by consecutive TOC windows.",
+    )
+    parser.add_argument(
+        "-j",
+        "--num_jobs",
+        type=int,
+        default=8,
+        help="Maximum number of TOC windows to query concurrently.",
+    )
+    parser.add_argument(
+        "--min_local_confidence",
+        type=float,
+        default=0.9,
+        help="Use the TOC from the PDF outline/font statistics if its confidence is at least this; otherwise ask Gemini. Set above 1 to always use Gemini.",
+    )
+    parser.add_argument(
+        "--min_local_verified",
+        type=float,
+        default=0.9,
+        help="The fraction of a local TOC's headers that must be found on their pages to use it.",
+    )
+    parser.add_argument(
+        "--telemetry",
+        type=Path,
+        default=LLM_TELEMETRY_PATH,
+        help="Where to log each Gemini call's latency, token use and errors (see llm-telemetry).",
+    )
+    parser.add_argument(
+        "--state",
+        default=None,
+        help="The state the statutes are from (e.g. 'co'), for the telemetry.",
+    )
     args = parser.parse_args()
 
     pdf_path = args.pdf_path
@@ -114,12 +220,25 @@ def main():
     if not args.output_dir.exists():
         args.output_dir.mkdir(parents=True, exist_ok=True)
 
-    toc = parse_toc(pdf_path)
+    doc = pymupdf.open(pdf_path)
+
+    # try to avoid the LLM call entirely
+    toc = find_toc(
+        doc,
+        pdf_path,
+        min_local_confidence=args.min_local_confidence,
+        min_verified_fraction=args.min_local_verified,
+        use_cache=not args.no_cache,
+        header_search_radius=args.header_search_radius,
+        window_pages=args.window_pages,
+        window_overlap=args.window_overlap,
+        max_workers=args.num_jobs,
+        telemetry=Telemetry(args.telemetry, state=args.state),
+    )
 
     if len(toc.headers) == 0:
         raise ValueError("No headers found in the TOC.")
 
-    doc = pymupdf.open(pdf_path)
     root = HeaderTreeNode.from_toc(toc, len(doc))
 
     header_type_level = {h: i + 1 for i, h in enumerate(toc.header_types)}
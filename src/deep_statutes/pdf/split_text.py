@@ -0,0 +1,99 @@
+from pathlib import Path
+
+from deep_statutes.pdf.manifest import SplitManifest
+from deep_statutes.pdf.toc import Header, HeaderTreeNode
+from deep_statutes.pdf.token_stream import token_stream_page_texts
+from deep_statutes.pdf.verify import normalize_text
+
+
+def read_page_texts(manifest: SplitManifest) -> dict[int, str] | None:
+    """
+    Read the (0-indexed) page texts of the manifest's token stream, or None if it has none.
+    """
+    if manifest.document.token_stream is None:
+        return None
+
+    path = Path(manifest.document.token_stream)
+    if not path.exists():
+        return None
+
+    with open(path, "r") as f:
+        return token_stream_page_texts(f)
+
+
+def _starts_with_header(line: str, header: Header) -> bool:
+    line = normalize_text(line)
+    text = normalize_text(header.text)
+    if not line.startswith(text):
+        return False
+    # "ARTICLE 1" shouldn't match "ARTICLE 10"
+    rest = line[len(text) :]
+    return rest == "" or not rest[0].isalnum()
+
+
+def split_markdown(
+    page_texts: dict[int, str],
+    header_tree: HeaderTreeNode,
+    next_header: Header | None = None,
+) -> str:
+    """
+    Render a split's text as light markdown, with its headers as markdown headings.
+
+    Splits share their boundary pages with their neighbours, so text on the first page
+    before the split's own header, and text on the last page from `next_header` (the
+    header following the split, if any) onwards, is left out.
+
+    Args:
+        page_texts: Page texts by 0-indexed page, e.g. from `read_page_texts`.
+        header_tree: The split's header subtree.
+        next_header: The header following the split in the document.
+    """
+    headings: list[tuple[int, Header]] = []
+    frontier = [(header_tree, 1)]
+    while len(frontier) > 0:
+        node, depth = frontier.pop()
+        headings.append((depth, node.header))
+        frontier += [(child, depth + 1) for child in reversed(node.children)]
+
+    first_page, last_page = header_tree.page_range
+
+    lines: list[str] = []
+    started = False
+    heading_idx = 0
+    for page in range(first_page, last_page + 1):
+        page_lines = page_texts.get(page - 1, "").split("\n")
+
+        # if the split's own header can't be found, keep the whole first page
+        if page == first_page and not any(
+            _starts_with_header(line, header_tree.header) for line in page_lines
+        ):
+            started = True
+
+        for line in page_lines:
+            if line.strip() == "":
+                continue
+
+            if (
+                next_header is not None
+                and page == next_header.page
+                and started
+                and _starts_with_header(line, next_header)
+            ):
+                return "\n".join(lines).strip() + "\n"
+
+            if heading_idx < len(headings):
+                depth, header = headings[heading_idx]
+                if page >= header.page and _starts_with_header(line, header):
+                    started = True
+                    heading_idx += 1
+                    lines.append("")
+                    lines.append(f"{'#' * depth} {normalize_text(line)}")
+                    lines.append("")
+                    continue
+
+            if started:
+                lines.append(line)
+
+        lines.append("")
+
+    return "\n".join(lines).strip() + "\n"
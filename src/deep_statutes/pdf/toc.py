@@ -45,6 +45,19 @@ class HeaderTreeNode(BaseModel):
         path.reverse()
         return path
 
+    def link_parents(self) -> None:
+        """
+        Restore parent pointers in this subtree.
+
+        Parents are excluded from serialization, so this is needed after validating a dumped tree.
+        """
+        frontier = [self]
+        while len(frontier) > 0:
+            node = frontier.pop()
+            for child in node.children:
+                child.parent = node
+            frontier += node.children
+
     @classmethod
     def from_toc(cls, toc: DocumentTOC, num_pages: int) -> "HeaderTreeNode":
         """
@@ -64,10 +77,13 @@ class HeaderTreeNode(BaseModel):
         root = HeaderTreeNode(
             header=toc.headers[0], parent=None, page_range=(1, num_pages)
         )
+        # hierarchy_level is a list search, so look the levels up once
+        levels = {header_type: i for i, header_type in enumerate(toc.header_types)}
         path: list[HeaderTreeNode] = [root]
+        path_levels = [levels[root.header.type]]
         for header in toc.headers[1:]:
-            level = toc.hierarchy_level(header.type)
-            while toc.hierarchy_level(path[-1].header.type) >= level:
+            level = levels[header.type]
+            while path_levels[-1] >= level:
                 # this could happen if there isn't a toc entry for "this entire document"
                 # we could deal with that if it occurs by always putting in a header at "document" level
                 # or something
@@ -75,9 +91,11 @@ class HeaderTreeNode(BaseModel):
 
                 path[-1].page_range = (path[-1].page_range[0], header.page)
                 path.pop()
+                path_levels.pop()
             node = HeaderTreeNode(
                 header=header, parent=path[-1], page_range=[header.page, num_pages]
             )
             path[-1].children.append(node)
             path.append(node)
+            path_levels.append(level)
         return root
@@ -1,6 +1,7 @@
+import re
 from pathlib import Path
 from dataclasses import dataclass
-from typing import Iterator, Literal
+from typing import Iterable, Iterator, Literal
 
 import pymupdf
 from deep_statutes.pdf.util import SpanDict
@@ -8,6 +9,8 @@ from deep_statutes.pdf.util import is_bbox_centered, get_bbox_indent_level
 
 MAGIC_TEMPLATE = "<<{}>>"
 
+_MAGIC_RE = re.compile(r"^<<([A-Z_]+)(?: ([^>]*))?>>$")
+
 
 def _to_magic(text: str) -> str:
     return MAGIC_TEMPLATE.format(text)
@@ -37,14 +40,25 @@ class PDFTokenConversionOptions:
 
 
 def pdf_to_token_stream(
-    doc: str | Path | pymupdf.Document, options: PDFTokenConversionOptions
+    doc: str | Path | pymupdf.Document,
+    options: PDFTokenConversionOptions,
+    page_range: tuple[int, int] | None = None,
 ) -> Iterator[str]:
+    """
+    Args:
+        page_range: Optional (start, end) 0-indexed page range, end exclusive. Page and line
+            tokens always use page indices within the whole document.
+    """
     global_line_idx = 0
 
     if not isinstance(doc, pymupdf.Document):
         doc = pymupdf.open(doc)
 
-    for page_idx, page in enumerate(doc):
+    if page_range is None:
+        page_range = (0, len(doc))
+
+    for page_idx in range(*page_range):
+        page = doc[page_idx]
         if options.page_delimiters:
             yield _to_magic(f"PAGE {page_idx}")
         d = page.get_text("dict")
@@ -89,6 +103,98 @@ def pdf_to_token_stream(
                 global_line_idx += 1
 
 
+def token_stream_page_texts(lines: Iterable[str]) -> dict[int, str]:
+    """
+    Recover plain text from the lines of a token stream, by (0-indexed) page.
+
+    The token stream must have been written with page delimiters. Each token-stream line
+    becomes a line of text, with indents rendered as spaces.
+    """
+    pages: dict[int, list[str]] = {}
+    page: list[str] | None = None
+    line: list[str] = []
+
+    def _end_line():
+        if page is not None and len(line) > 0:
+            page.append(" ".join(line))
+        line.clear()
+
+    for token in lines:
+        token = token.rstrip("\n")
+        if token == "":
+            continue
+
+        if (m := _MAGIC_RE.match(token)) is None:
+            line.append(token.strip())
+            continue
+
+        match m.group(1):
+            case "PAGE":
+                _end_line()
+                page = pages.setdefault(int(m.group(2)), [])
+            case "LINE":
+                _end_line()
+            case "INDENT":
+                line.append("")
+            case _:
+                pass
+
+    _end_line()
+
+    return {page_idx: "\n".join(page_lines) for page_idx, page_lines in pages.items()}
+
+
+@dataclass
+class TextLine:
+    offset: int  # of the line's first text token in the token stream
+    page: int | None  # 0-indexed, if the token stream has page delimiters
+    indent: int  # number of indents
+    text: str
+
+
+def token_stream_lines(lines: Iterable[str]) -> Iterator[TextLine]:
+    """
+    Stream the lines of text of a token stream, as in `token_stream_page_texts`.
+
+    Unlike that, this needs no page delimiters and keeps only one line in memory.
+    Offsets are in characters, so they match those of a token stream read as a whole.
+    """
+    offset = 0
+    page = None
+    indent = 0
+    line: list[str] = []
+    line_offset = 0
+
+    for token in lines:
+        token_offset = offset
+        offset += len(token)
+        token = token.rstrip("\n")
+        if token == "":
+            continue
+
+        if (m := _MAGIC_RE.match(token)) is None:
+            if len(line) == 0:
+                line_offset = token_offset
+            line.append(token.strip())
+            continue
+
+        match m.group(1):
+            case "PAGE" | "LINE":
+                if len(line) > 0:
+                    yield TextLine(line_offset, page, indent, " ".join(line))
+                line.clear()
+                indent = 0
+                if m.group(1) == "PAGE" and m.group(2) is not None:
+                    page = int(m.group(2))
+            case "INDENT":
+                indent += 1
+            case _:
+                pass
+
+    if len(line) > 0:
+        yield TextLine(line_offset, page, indent, " ".join(line))
+
+
 # def main():
 #    parser = argparse.ArgumentParser(description="Convert PDF to token stream")
 #    parser.add_argument("pdf_path", help="Path to the PDF file")
@@ -0,0 +1,120 @@
+import logging
+from pathlib import Path
+from typing import Mapping
+
+import pymupdf
+
+from deep_statutes.pdf.toc import DocumentTOC, Header
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+
+class PageText:
+    """
+    Lazily extracts (normalized) page text, at most once per page.
+
+    Uses the given page texts (e.g. from a token stream or corpus) if available, and otherwise pymupdf.
+    """
+
+    def __init__(
+        self,
+        pdf_path: Path | pymupdf.Document,
+        page_text: Mapping[int, str] | None = None,
+    ):
+        self.pdf_path = pdf_path
+        self.page_text = page_text
+        self._doc = pdf_path if isinstance(pdf_path, pymupdf.Document) else None
+        self._num_pages = None
+        self._cache: dict[int, str] = {}
+
+    def num_pages(self) -> int:
+        if self._num_pages is None:
+            if self.page_text is not None:
+                self._num_pages = max(self.page_text.keys(), default=-1) + 1
+            else:
+                self._num_pages = self._open().page_count
+        return self._num_pages
+
+    def _open(self) -> pymupdf.Document:
+        if self._doc is None:
+            self._doc = pymupdf.open(self.pdf_path)
+        return self._doc
+
+    def __getitem__(self, page_idx: int) -> str:
+        """page_idx is 0-indexed."""
+        if page_idx not in self._cache:
+            if self.page_text is not None:
+                text = self.page_text.get(page_idx, "")
+            elif not 0 <= page_idx < self.num_pages():
+                # the LLM may report pages that don't exist
+                text = ""
+            else:
+                text = self._open()[page_idx].get_text()
+            self._cache[page_idx] = normalize_text(text)
+        return self._cache[page_idx]
+
+
+def check_headers_present(
+    pdf_path: Path | pymupdf.Document,
+    toc: DocumentTOC,
+    search_radius: int = 0,
+    page_text: Mapping[int, str] | None = None,
+) -> list[str]:
+    """
+    Check if the headers in the TOC are present in the PDF.
+
+    Each page is extracted at most once, and all headers on a page are checked together.
+    If a header isn't on its page but is found within `search_radius` pages of it, the
+    header's page is corrected in place (nearest page first).
+
+    Args:
+        pdf_path (Path | pymupdf.Document): The PDF the TOC was extracted from.
+        toc (DocumentTOC): The TOC to check.
+        search_radius (int): How many pages on either side of a header's page to search.
+        page_text (Mapping[int, str] | None): Optional text of each 0-indexed page, e.g. from
+            the token stream; if not given, text is extracted with pymupdf.
+
+    Returns:
+        list[str]: A list of headers that were not found in the PDF.
+    """
+    pages = PageText(pdf_path, page_text)
+
+    headers_by_page: dict[int, list[Header]] = {}
+    for header in toc.headers:
+        headers_by_page.setdefault(header.page, []).append(header)
+
+    not_found = []
+    for page, headers in sorted(headers_by_page.items()):
+        text = pages[page - 1]  # page numbers are 1-indexed in the TOC
+        for header in headers:
+            header_text = normalize_text(header.text)
+            if header_text in text:
+                continue
+
+            # look for an off-by-N page number
+            candidates = [
+                page + sign * offset
+                for offset in range(1, search_radius + 1)
+                for sign in (-1, 1)
+            ]
+            candidates = [p for p in candidates if 1 <= p <= pages.num_pages()]
+            corrected = next(
+                (p for p in candidates if header_text in pages[p - 1]), None
+            )
+            if corrected is not None:
+                logger.info(
+                    f"Header '{header.text}' found on PDF page {corrected} instead of {page}; correcting."
+                )
+                header.page = corrected
+                continue
+
+            # this may not be an error, e.g. footer text could be mixed in with the header text,
+            # but generate a warning so we can investigate
+            logger.info(f"Header '{header.text}' not found on PDF page {header.page}.")
+            not_found.append(header.text)
+
+    return not_found
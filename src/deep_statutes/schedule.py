@@ -0,0 +1,122 @@
+import heapq
+import itertools
+import logging
+import time
+from concurrent import futures
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Task:
+    """
+    A unit of work for the scheduler.
+
+    `fn` must be picklable (i.e. a module-level function) since it may run in another process.
+    `then` always runs in the scheduling process with the task's result, and returns any
+    follow-up tasks that became ready (e.g. the next stage once all chunks of a stage are done).
+    """
+
+    key: str
+    fn: Callable[..., Any]
+    args: tuple = ()
+    num_pages: int = 0  # used both for largest-first ordering and for progress
+    then: Callable[[Any], list["Task"]] | None = None
+
+
+@dataclass
+class Progress:
+    """
+    Pages/sec and ETA reporting.
+
+    Every task's pages are added to the total when it is queued. Callers that know about
+    work that will only be queued later (e.g. the next stage of a title) can `reserve`
+    those pages up front and `release` them when the follow-up tasks are queued or skipped.
+    """
+
+    total_pages: int = 0
+    done_pages: int = 0
+    start_time: float = field(default_factory=time.monotonic)
+    log_interval: float = 10.0
+    _last_log: float = 0.0
+
+    def reserve(self, num_pages: int) -> None:
+        self.total_pages += num_pages
+
+    def release(self, num_pages: int) -> None:
+        self.total_pages -= num_pages
+
+    def update(self, num_pages: int, force: bool = False) -> None:
+        self.done_pages += num_pages
+
+        now = time.monotonic()
+        if not force and now - self._last_log < self.log_interval:
+            return
+        self._last_log = now
+
+        elapsed = now - self.start_time
+        rate = self.done_pages / elapsed if elapsed > 0 else 0.0
+        remaining = max(self.total_pages - self.done_pages, 0)
+        eta = f"{remaining / rate:.0f}s" if rate > 0 else "?"
+        logger.info(
+            f"Progress: {self.done_pages}/{self.total_pages} pages ({rate:.1f} pages/sec, ETA {eta})"
+        )
+
+
+def run_tasks(
+    tasks: list[Task], num_jobs: int, progress: Progress | None = None
+) -> dict[str, Any]:
+    """
+    Run tasks (and any follow-up tasks they produce) on a process pool.
+
+    Ready tasks are kept in a single queue ordered largest-first, and at most `num_jobs`
+    tasks are handed to the pool at a time, so whichever worker becomes idle next always
+    takes the largest remaining piece of work. Callers should break large inputs into
+    several tasks so that the tail of a run doesn't wait on one big task.
+
+    Returns:
+        dict[str, Any]: The result of every task that ran, by key.
+    """
+    results = {}
+    if progress is None:
+        progress = Progress()
+    counter = itertools.count()  # tie-breaker so the heap never compares tasks
+
+    ready: list[tuple[int, int, Task]] = []
+
+    def _push(new_tasks: list[Task]) -> None:
+        for task in new_tasks:
+            progress.total_pages += task.num_pages
+            heapq.heappush(ready, (-task.num_pages, next(counter), task))
+
+    def _finish(task: Task, result: Any) -> None:
+        results[task.key] = result
+        if task.then is not None:
+            _push(task.then(result))
+        progress.update(task.num_pages)
+
+    _push(tasks)
+
+    if num_jobs == 1:
+        while len(ready) > 0:
+            _, _, task = heapq.heappop(ready)
+            logger.info(f"Running {task.key}")
+            _finish(task, task.fn(*task.args))
+    else:
+        with futures.ProcessPoolExecutor(max_workers=num_jobs) as executor:
+            in_flight: dict[futures.Future, Task] = {}
+            while len(ready) > 0 or len(in_flight) > 0:
+                while len(ready) > 0 and len(in_flight) < num_jobs:
+                    _, _, task = heapq.heappop(ready)
+                    in_flight[executor.submit(task.fn, *task.args)] = task
+
+                done, _ = futures.wait(in_flight, return_when=futures.FIRST_COMPLETED)
+                for f in done:
+                    task = in_flight.pop(f)
+                    _finish(task, f.result())
+
+    progress.update(0, force=True)
+
+    return results
@@ -1,19 +1,74 @@
 import argparse
 import io
 import logging
-from concurrent import futures
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Callable
 
 import pymupdf
 
 from deep_statutes import config
-from deep_statutes.pdf.split import split_pdf
-from deep_statutes.pdf.toc import DocumentTOC, HeaderTreeNode
-from deep_statutes.states.co.token_stream import write_clean_token_stream
-from deep_statutes.pdf.parse import find_headers
+from deep_statutes.build import (
+    BuildManifest,
+    TargetRecord,
+    code_version,
+    file_hash,
+    json_hash,
+    stage_record,
+    text_hash,
+)
+from deep_statutes.index.intervals import HeaderIntervals
+from deep_statutes.index.sections import SectionIndex, sections_from_intervals
+from deep_statutes.pdf.header_array import HeaderArray
+from deep_statutes.pdf.manifest import MANIFEST_NAME, SplitManifest
+from deep_statutes.pdf.section_markdown import (
+    SECTIONS_MANIFEST_NAME,
+    write_section_markdown,
+)
+from deep_statutes.pdf.split import write_split
+from deep_statutes.pdf.toc import DocumentTOC
+from deep_statutes.schedule import Progress, Task, run_tasks
+from deep_statutes.states.co.token_stream import (
+    DEFAULT_OPTIONS,
+    concat_token_streams,
+    footer_grammar,
+    write_clean_token_stream,
+)
+from deep_statutes.pdf.parse import find_headers_with_ranges
 
 logger = logging.getLogger(__name__)
 
+# the modules whose code each stage runs, so that changing them rebuilds the stage
+_STAGE_CODE = {
+    "token_stream": (
+        "deep_statutes.lark.util",
+        "deep_statutes.pdf.token_stream",
+        "deep_statutes.pdf.util",
+        "deep_statutes.states.co.token_stream",
+    ),
+    "toc": (
+        "deep_statutes.index.intervals",
+        "deep_statutes.lark.util",
+        "deep_statutes.pdf.header_array",
+        "deep_statutes.pdf.parse",
+        "deep_statutes.pdf.toc",
+        "deep_statutes.pdf.token_stream",
+        "deep_statutes.states.co.split",
+    ),
+    "split": (
+        "deep_statutes.pdf.header_array",
+        "deep_statutes.pdf.manifest",
+        "deep_statutes.pdf.split",
+        "deep_statutes.states.co.split",
+    ),
+    "sections": (
+        "deep_statutes.index.intervals",
+        "deep_statutes.pdf.section_markdown",
+        "deep_statutes.pdf.token_stream",
+        "deep_statutes.states.co.split",
+    ),
+}
+
 HEADER_GRAMMAR = r"""
 _header_start: title_start | article_start | part_start | section_start
 
@@ -67,20 +122,24 @@ EOL: /\n/
 
 HEADER_TYPES = ["title", "article", "part", "section"]
 
+BUILD_MANIFEST_NAME = "build_manifest.json"
+
+# the edition of the statutes in the section index
+EDITION = "2024"
+
 
-def parse_toc(token_stream_path: Path) -> DocumentTOC:
-    toc = find_headers(
+def parse_toc(token_stream_path: Path) -> tuple[DocumentTOC, list[tuple[int, int]]]:
+    """The headers of a title and their offsets in the token stream."""
+    return find_headers_with_ranges(
         header_grammar=HEADER_GRAMMAR,
         header_types=HEADER_TYPES,
         token_stream_path=token_stream_path,
     )
 
-    return toc
-
 
 def _write_toc_md(
-    header_tree: HeaderTreeNode,
-    split_headers_paths: list[tuple[HeaderTreeNode, str]],
+    header_tree: HeaderArray,
+    split_headers_paths: list[tuple[int, str]],
     out_md_path: Path,
 ) -> None:
     md = io.StringIO()
@@ -88,13 +147,10 @@ def _write_toc_md(
     # write the header tree to markdown
     # note that the hierarchy level here is determined by the position in the tree
     # and not by the header type
-    frontier = [(1, header_tree)]
-    while len(frontier) > 0:
-        level, node = frontier.pop()
-        frontier += [(level + 1, child) for child in reversed(node.children)]
-
-        text = node.header.text
-        sub_text = node.header.sub_text
+    for i in range(len(header_tree)):
+        level = int(header_tree.depth[i]) + 1
+        text = header_tree.strings[header_tree.text_id[i]]
+        sub_text = header_tree.strings[header_tree.sub_text_id[i]]
 
         md.write(f"{'#' * level} {text} ({sub_text})\n")
         md.write("\n")
@@ -103,45 +159,430 @@ def _write_toc_md(
         f.write(md.getvalue())
 
 
-def _process_pdf(
+def _is_current(
+    record: TargetRecord, stage: str, inputs: dict[str, str], build_root: Path
+) -> bool:
+    return stage in record and record[stage].is_current(inputs, build_root)
+
+
+def _token_stream_chunk(
+    pdf_path: Path, out_path: Path, page_range: tuple[int, int]
+) -> None:
+    doc = pymupdf.open(pdf_path)
+    write_clean_token_stream(doc, out_path, page_range=page_range)
+
+
+@dataclass
+class SplitBudget:
+    """
+    How large splits should be: by default at most `max_num_pages_hint` pages (a hint, since
+    sections can be longer), or, if `target_tokens` is set, about that many tokens of text
+    and at most `max_tokens` (twice the target if not set) unless a section is longer.
+    """
+
+    max_num_pages_hint: int = 16
+    target_tokens: int | None = None
+    max_tokens: int | None = None
+
+    def choose(self, intervals: HeaderIntervals) -> list[int]:
+        """The nodes to split on."""
+        tree = intervals.tree
+        if self.target_tokens is None:
+            return tree.choose_splits(self.max_num_pages_hint)
+
+        return tree.choose_splits_by_tokens(
+            intervals.estimated_tokens(), self.target_tokens, self.token_cap()
+        )
+
+    def token_cap(self) -> int | None:
+        if self.target_tokens is None:
+            return None
+        return self.max_tokens or 2 * self.target_tokens
+
+    def inputs(self) -> dict[str, str]:
+        """The build inputs of the split stage that depend on the budget."""
+        if self.target_tokens is None:
+            return {"max_num_pages_hint": str(self.max_num_pages_hint)}
+        return {"token_budget": json_hash(self)}
+
+
+def _toc_stage(
     pdf_path: Path,
+    num_pages: int,
     token_stream_path: Path,
     split_pdf_dir: Path,
-    max_num_pages_hint: int = 16,
-) -> None:
+    budget: SplitBudget,
+    build_root: Path,
+    record: TargetRecord,
+    token_stream_chunks: list[Path],
+    token_stream_inputs: dict[str, str],
+) -> tuple[TargetRecord, dict[str, str], list[tuple[int, str, tuple[int, int]]], bool]:
+    """
+    Finish the token stream, build the TOC (unless it is up to date) and choose the splits.
+
+    Returns:
+        - the updated build record
+        - the inputs of the split stage
+        - the (node, header path, page range) of each split
+        - whether the splits are up to date
+    """
     filename = pdf_path.stem
-    # skip constitution for now
-    if filename.endswith("-00"):
-        return
 
+    if len(token_stream_chunks) > 0:
+        concat_token_streams(token_stream_chunks, token_stream_path)
+        for chunk_path in token_stream_chunks:
+            chunk_path.unlink()
+    record["token_stream"] = stage_record(
+        token_stream_inputs, [token_stream_path], build_root
+    )
+
+    # the TOC depends only on the token stream contents and the header grammar
+    headers_json_path = split_pdf_dir / f"{filename}_headers.json"
+    intervals_path = split_pdf_dir / f"{filename}_intervals.parquet"
+    toc_inputs = {
+        "token_stream": file_hash(token_stream_path),
+        "header_grammar": text_hash(HEADER_GRAMMAR),
+        "header_types": json_hash(HEADER_TYPES),
+        "code_version": code_version(*_STAGE_CODE["toc"]),
+    }
+    intervals = None
+    if _is_current(record, "toc", toc_inputs, build_root):
+        intervals = HeaderIntervals.read(intervals_path)
+        # built before the text of each header was counted, which sizing by tokens needs
+        if budget.target_tokens is not None and intervals.text_chars is None:
+            intervals = None
+    if intervals is not None:
+        logger.info(f"TOC for {filename} is up to date.")
+    else:
+        toc, text_ranges = parse_toc(token_stream_path)
+        header_tree = HeaderArray.from_toc(toc, num_pages=num_pages)
+
+        # the JSON tree is for people and other tools; the intervals are what we read back
+        with open(
+            headers_json_path,
+            "w",
+        ) as f:
+            f.write(header_tree.to_tree().model_dump_json(indent=2))
+        intervals = HeaderIntervals.build(header_tree, text_ranges, token_stream_path)
+        intervals.write(intervals_path)
+
+        record["toc"] = stage_record(
+            toc_inputs, [headers_json_path, intervals_path], build_root
+        )
+
+    # a grammar change that doesn't change the TOC doesn't redo the splits
+    split_inputs = {
+        "pdf": token_stream_inputs["pdf"],
+        "headers": file_hash(headers_json_path),
+        **budget.inputs(),
+        "code_version": code_version(*_STAGE_CODE["split"]),
+    }
+    if budget.target_tokens is not None:
+        # the token estimates come from the text sizes, which the headers JSON lacks
+        split_inputs["intervals"] = file_hash(intervals_path)
+
+    header_tree = intervals.tree
+    split_nodes = budget.choose(intervals)
+    splits = [
+        (i, header_tree.path_text(i), header_tree.page_range(i)) for i in split_nodes
+    ]
+    if _is_current(record, "split", split_inputs, build_root):
+        logger.info(f"Splits for {filename} are up to date.")
+        return record, split_inputs, splits, True
+
+    # the split points may have moved, so don't leave stale splits around
+    if "split" in record:
+        record.pop("split").remove_outputs(build_root)
+
+    if budget.target_tokens is not None:
+        max_tokens = budget.token_cap()
+        num_over = (intervals.estimated_tokens()[split_nodes] > max_tokens).sum()
+        if num_over > 0:
+            # e.g. a long section, which can't be split on headers
+            logger.warning(
+                f"{num_over} splits of {filename} are over {max_tokens} tokens."
+            )
+
+    return record, split_inputs, splits, False
+
+
+def _split_chunk(
+    pdf_path: Path,
+    split_pdf_dir: Path,
+    splits: list[tuple[int, str, tuple[int, int]]],
+) -> None:
     doc = pymupdf.open(pdf_path)
+    for _, header_path, page_range in splits:
+        write_split(doc, page_range, split_pdf_dir / f"{header_path}.pdf")
 
-    write_clean_token_stream(
-        doc,
-        token_stream_path,
+
+def _sections_stage(
+    token_stream_path: Path, intervals_path: Path, sections_dir: Path
+) -> list[str]:
+    """The file names of the sections written."""
+    section_files = write_section_markdown(
+        token_stream_path, HeaderIntervals.read(intervals_path), sections_dir
     )
+    return [section_file.file_name for section_file in section_files]
+
+
+def _chunk_page_ranges(num_pages: int, chunk_pages: int) -> list[tuple[int, int]]:
+    """0-indexed, end exclusive."""
+    return [
+        (start, min(start + chunk_pages, num_pages))
+        for start in range(0, num_pages, chunk_pages)
+    ]
+
+
+class _TitleBuild:
+    """
+    Scheduling-process state for building one title.
+
+    A title is built in stages (token stream, TOC, then splits and section markdown). The
+    token stream and split stages are broken into page-range chunks that can run on any
+    worker; each stage's tasks are created as soon as the stage before it finishes.
+    Stages that are up to date according to the build record are skipped.
+    """
+
+    def __init__(
+        self,
+        pdf_path: Path,
+        token_stream_path: Path,
+        split_pdf_dir: Path,
+        budget: SplitBudget,
+        build_root: Path,
+        record: TargetRecord,
+        chunk_pages: int,
+        on_update: Callable[["_TitleBuild"], None],
+        progress: Progress,
+        section_index: SectionIndex | None = None,
+        sections_dir: Path | None = None,
+    ):
+        self.pdf_path = pdf_path
+        self.token_stream_path = token_stream_path
+        self.split_pdf_dir = split_pdf_dir
+        self.budget = budget
+        self.build_root = build_root
+        self.record = dict(record)
+        self.chunk_pages = chunk_pages
+        self.on_update = on_update
+        self.progress = progress
+        self.section_index = section_index
+        self.sections_dir = sections_dir
+
+        self.name = pdf_path.stem
+        self.num_pages = pymupdf.open(pdf_path).page_count
+
+        self._token_stream_inputs: dict[str, str] = {}
+        self._token_stream_chunks: list[Path] = []
+        self._split_inputs: dict[str, str] = {}
+        self._splits: list[tuple[int, str, tuple[int, int]]] = []
+        self._sections_inputs: dict[str, str] = {}
+        self._num_pending = 0
+
+    def start(self) -> list[Task]:
+        # the TOC, split and sections stages each cover all pages again
+        self.progress.reserve(3 * self.num_pages)
+
+        self._token_stream_inputs = {
+            "pdf": file_hash(self.pdf_path),
+            "options": json_hash(DEFAULT_OPTIONS),
+            "footer_grammar": text_hash(footer_grammar),
+            "code_version": code_version(*_STAGE_CODE["token_stream"]),
+        }
+        if _is_current(
+            self.record, "token_stream", self._token_stream_inputs, self.build_root
+        ):
+            logger.info(f"Token stream for {self.name} is up to date.")
+            return [self._toc_task()]
+
+        page_ranges = _chunk_page_ranges(self.num_pages, self.chunk_pages)
+        if len(page_ranges) == 1:
+            chunk_paths = [self.token_stream_path]
+        else:
+            chunk_paths = [
+                self.token_stream_path.with_name(f"{self.name}.part{i}.txt")
+                for i in range(len(page_ranges))
+            ]
+            self._token_stream_chunks = chunk_paths
+
+        self._num_pending = len(page_ranges)
+        return [
+            Task(
+                key=f"{self.name}:token_stream:{start}-{end}",
+                fn=_token_stream_chunk,
+                args=(self.pdf_path, chunk_path, (start, end)),
+                num_pages=end - start,
+                then=self._token_stream_chunk_done,
+            )
+            for (start, end), chunk_path in zip(page_ranges, chunk_paths)
+        ]
+
+    def _token_stream_chunk_done(self, _) -> list[Task]:
+        self._num_pending -= 1
+        if self._num_pending > 0:
+            return []
+        return [self._toc_task()]
+
+    def _toc_task(self) -> Task:
+        self.progress.release(self.num_pages)
+        return Task(
+            key=f"{self.name}:toc",
+            fn=_toc_stage,
+            args=(
+                self.pdf_path,
+                self.num_pages,
+                self.token_stream_path,
+                self.split_pdf_dir,
+                self.budget,
+                self.build_root,
+                self.record,
+                self._token_stream_chunks,
+                self._token_stream_inputs,
+            ),
+            num_pages=self.num_pages,
+            then=self._toc_done,
+        )
+
+    def _toc_done(self, result) -> list[Task]:
+        self.record, self._split_inputs, self._splits, splits_current = result
+        self.on_update(self)
+
+        # the sections are written from the TOC, independently of the splits
+        return self._sections_tasks() + self._split_tasks(splits_current)
+
+    def _sections_tasks(self) -> list[Task]:
+        self.progress.release(self.num_pages)
+        if self.sections_dir is None:
+            return []
+
+        intervals_path = self.split_pdf_dir / f"{self.name}_intervals.parquet"
+        self._sections_inputs = {
+            "token_stream": self.record["toc"].inputs["token_stream"],
+            "intervals": file_hash(intervals_path),
+            "code_version": code_version(*_STAGE_CODE["sections"]),
+        }
+        if _is_current(self.record, "sections", self._sections_inputs, self.build_root):
+            logger.info(f"Sections of {self.name} are up to date.")
+            return []
+
+        return [
+            Task(
+                key=f"{self.name}:sections",
+                fn=_sections_stage,
+                args=(self.token_stream_path, intervals_path, self.sections_dir),
+                num_pages=self.num_pages,
+                then=self._sections_done,
+            )
+        ]
+
+    def _sections_done(self, file_names: list[str]) -> list[Task]:
+        self.record["sections"] = stage_record(
+            self._sections_inputs,
+            [self.sections_dir / SECTIONS_MANIFEST_NAME]
+            + [self.sections_dir / file_name for file_name in file_names],
+            self.build_root,
+        )
+        self.on_update(self)
+        return []
+
+    def _split_tasks(self, splits_current: bool) -> list[Task]:
+        self.progress.release(self.num_pages)
+        if splits_current:
+            self._index_sections()
+            return []
+
+        # group consecutive splits into chunks of roughly chunk_pages pages
+        chunks: list[list[tuple[int, str, tuple[int, int]]]] = [[]]
+        chunk_num_pages = 0
+        for split in self._splits:
+            if chunk_num_pages >= self.chunk_pages:
+                chunks.append([])
+                chunk_num_pages = 0
+            chunks[-1].append(split)
+            page_start, page_end = split[2]
+            chunk_num_pages += page_end - page_start + 1
+
+        self._num_pending = len(chunks)
+        return [
+            Task(
+                key=f"{self.name}:split:{i}",
+                fn=_split_chunk,
+                args=(self.pdf_path, self.split_pdf_dir, chunk),
+                num_pages=sum(end - start + 1 for _, _, (start, end) in chunk),
+                then=self._split_chunk_done,
+            )
+            for i, chunk in enumerate(chunks)
+        ]
+
+    def _split_chunk_done(self, _) -> list[Task]:
+        self._num_pending -= 1
+        if self._num_pending > 0:
+            return []
+
+        # the manifest and markdown are cheap, so write them here rather than as another task
+        header_tree = HeaderIntervals.read(
+            self.split_pdf_dir / f"{self.name}_intervals.parquet"
+        ).tree
+        header_to_path = [(i, header_path) for i, header_path, _ in self._splits]
+
+        manifest = SplitManifest.from_array(
+            source=str(self.pdf_path),
+            num_pages=self.num_pages,
+            tree=header_tree,
+            split_nodes=[(i, f"{header_path}.pdf") for i, header_path in header_to_path],
+            token_stream=str(self.token_stream_path),
+        )
+        manifest.write(self.split_pdf_dir / MANIFEST_NAME)
 
-    toc = parse_toc(token_stream_path)
-    header_tree = HeaderTreeNode.from_toc(toc, num_pages=len(doc))
+        md_path = self.split_pdf_dir / f"{self.name}.md"
+        _write_toc_md(
+            header_tree,
+            header_to_path,
+            md_path,
+        )
 
-    header_to_path = split_pdf(
-        doc,
-        header_tree,
-        split_pdf_dir,
-        max_num_pages_hint=max_num_pages_hint,
-    )
+        split_outputs = [self.split_pdf_dir / MANIFEST_NAME, md_path] + [
+            self.split_pdf_dir / f"{header_path}.pdf"
+            for _, header_path, _ in self._splits
+        ]
+        self.record["split"] = stage_record(
+            self._split_inputs, split_outputs, self.build_root
+        )
+        self.on_update(self)
+        self._index_sections()
 
-    _write_toc_md(
-        header_tree,
-        header_to_path,
-        split_pdf_dir / f"{filename}.md",
-    )
+        return []
+
+    def _index_sections(self) -> None:
+        """Update the title's entries in the section index, unless they're up to date."""
+        if self.section_index is None:
+            return
 
-    with open(
-        split_pdf_dir / f"{filename}_headers.json",
-        "w",
-    ) as f:
-        f.write(header_tree.model_dump_json(indent=2))
+        intervals_path = self.split_pdf_dir / f"{self.name}_intervals.parquet"
+        if not intervals_path.exists():
+            logger.warning(
+                f"No header intervals for {self.name}; rebuild with --force to index its sections."
+            )
+            return
+
+        split_nodes = [(i, f"{header_path}.pdf") for i, header_path, _ in self._splits]
+        source = str(self.pdf_path)
+        input_hash = json_hash(
+            [file_hash(intervals_path), split_nodes, str(self.token_stream_path)]
+        )
+        if self.section_index.is_current("co", source, input_hash):
+            return
+
+        entries = sections_from_intervals(
+            HeaderIntervals.read(intervals_path),
+            state="co",
+            edition=EDITION,
+            source=source,
+            token_stream=str(self.token_stream_path),
+            split_nodes=split_nodes,
+        )
+        self.section_index.replace_source("co", source, EDITION, input_hash, entries)
 
 
 def main():
@@ -168,6 +609,35 @@ def main():
         default=16,
         help="Maximum number of pages to include in each split PDF. Note that this is a hint and may be ignored if the split header is too large.",
     )
+    parser.add_argument(
+        "--target_tokens",
+        type=int,
+        default=None,
+        help="Size splits by their estimated number of tokens of text instead of pages, aiming for this many.",
+    )
+    parser.add_argument(
+        "--max_tokens",
+        type=int,
+        default=None,
+        help="With --target_tokens, split any header over this many tokens (twice the target by default) unless it has no subheaders.",
+    )
+    parser.add_argument(
+        "--chunk_pages",
+        type=int,
+        default=64,
+        help="Number of pages per token stream/split task. Large titles are broken into several tasks so that idle workers can share them.",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Rebuild every title, even if the build manifest says its outputs are up to date.",
+    )
+    parser.add_argument(
+        "--section_index",
+        type=Path,
+        default=config.SECTION_INDEX_PATH,
+        help="The section index to add the titles' sections to (see section-lookup).",
+    )
     args = parser.parse_args()
 
     input_dir = Path(config.STATUTES_DATA_DIR / "co" / "pdf")
@@ -180,36 +650,52 @@ def main():
     split_pdf_root_dir = Path(output_dir / "split")
     split_pdf_root_dir.mkdir(parents=True, exist_ok=True)
 
+    sections_root_dir = Path(output_dir / "sections")
+
+    build_manifest_path = output_dir / BUILD_MANIFEST_NAME
+    if args.force:
+        build_manifest = BuildManifest()
+    else:
+        build_manifest = BuildManifest.load(build_manifest_path)
+
     input_paths = sorted(
         input_dir.glob("crs2024-title-*.pdf"),
         key=lambda x: x.stem,
     )
 
-    process_pdf_args = []
+    def _record(title_build: _TitleBuild) -> None:
+        # save after every stage so that an interrupted run keeps its progress
+        build_manifest.targets[title_build.name] = title_build.record
+        build_manifest.save(build_manifest_path)
+
+    section_index = SectionIndex(args.section_index)
+    progress = Progress()
+    tasks = []
     for pdf_path in input_paths:
+        # skip constitution for now
+        if pdf_path.stem.endswith("-00"):
+            continue
+
         split_pdf_dir = split_pdf_root_dir / pdf_path.stem
         split_pdf_dir.mkdir(parents=True, exist_ok=True)
 
-        process_pdf_args.append(
-            (
-                pdf_path,
-                pdf_token_stream_dir / f"{pdf_path.stem}.txt",
-                split_pdf_dir,
-                args.max_num_pages_hint,
-            )
+        title_build = _TitleBuild(
+            pdf_path,
+            pdf_token_stream_dir / f"{pdf_path.stem}.txt",
+            split_pdf_dir,
+            budget=SplitBudget(
+                args.max_num_pages_hint, args.target_tokens, args.max_tokens
+            ),
+            build_root=output_dir,
+            record=build_manifest.targets.get(pdf_path.stem, {}),
+            chunk_pages=args.chunk_pages,
+            on_update=_record,
+            progress=progress,
+            section_index=section_index,
+            sections_dir=sections_root_dir / pdf_path.stem,
         )
+        tasks += title_build.start()
 
-    if args.num_jobs == 1:
-        for proc_args in process_pdf_args:
-            logger.info(f"Processing {proc_args[0]}")
-            _process_pdf(*proc_args)
-    else:
-        with futures.ProcessPoolExecutor(max_workers=args.num_jobs) as executor:
-            res = executor.map(
-                _process_pdf,
-                *zip(*process_pdf_args),
-            )
-
-        # we iterate through res to force the execution of the futures
-        for _ in res:
-            pass
+    # the scheduler runs the largest pieces of work first
+    run_tasks(tasks, num_jobs=args.num_jobs, progress=progress)
+    section_index.close()
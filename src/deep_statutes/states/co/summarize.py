@@ -1,16 +1,39 @@
 import argparse
-from concurrent.futures import ThreadPoolExecutor
+import asyncio
+from dataclasses import dataclass
+import datetime
+import functools
 import io
-import json
 import logging
 from pathlib import Path
+import re
+import threading
+import time
+from typing import Awaitable, Callable, Literal
 
-from google import genai
-from google.genai import types
+from google.genai import errors, types
 import numpy as np
-from pydantic import TypeAdapter
 
-from deep_statutes.config import GEMINI_API_KEY
+from deep_statutes.build import file_hash, text_hash
+from deep_statutes.config import (
+    GEMINI_API_KEY,
+    LLM_BACKEND,
+    LLM_RECORDING_DIR,
+    LLM_REPLAY_OPTIONS,
+    LLM_TELEMETRY_PATH,
+    STATUTES_CACHE_DIR,
+)
+from deep_statutes.llm.batch import BatchRunner
+from deep_statutes.llm.cache import ResponseCache
+from deep_statutes.llm.client import LLMBackend, make_client
+from deep_statutes.llm.context_cache import ContextCache
+from deep_statutes.llm.engine import RateLimitedEngine
+from deep_statutes.llm.journal import Journal
+from deep_statutes.llm.replay import ReplayOptions
+from deep_statutes.llm.telemetry import LLMCall, Telemetry
+from deep_statutes.llm.uploads import UploadRegistry
+from deep_statutes.pdf.manifest import MANIFEST_NAME, SplitManifest
+from deep_statutes.pdf.split_text import read_page_texts, split_markdown
 from deep_statutes.pdf.toc import Header, HeaderTreeNode
 
 logging.basicConfig(level=logging.INFO)
@@ -18,105 +41,548 @@ logger = logging.getLogger(__name__)
 
 SUMMARIZE_MODEL = "gemini-2.5-flash-preview-04-17"
 
+UPLOAD_REGISTRY_PATH = STATUTES_CACHE_DIR / "gemini_uploads.json"
 
-def _read_info(info_path: Path) -> tuple[HeaderTreeNode, list[Header]]:
-    """Read the info file and return the data."""
-    with open(info_path, "r") as f:
-        data = json.load(f)
+JOURNAL_NAME = "summary_journal.jsonl"
 
-    header_tree_node = HeaderTreeNode.model_validate(data["root"])
+BATCH_STATE_NAME = "batch_jobs.json"
 
-    ta = TypeAdapter(list[Header])
-    header_path = ta.validate_python(data["path"])
+
+def _read_info(
+    manifest: SplitManifest, node_id: int
+) -> tuple[HeaderTreeNode, list[Header]]:
+    """Look up a split's header subtree and header path in the document manifest."""
+    header_tree_node = manifest.subtree(node_id)
+    header_path = manifest.path(node_id)
 
     return header_tree_node, header_path
 
 
+# Gemini counts each PDF page image as a fixed number of tokens
+PDF_PAGE_TOKENS = 258
+# a rough allowance for each candidate's output (including thinking)
+CANDIDATE_TOKENS = 2048
+# roughly, for English text
+CHARS_PER_TOKEN = 4
+# splits with less extracted text than this per page are probably scanned or mostly
+# figures, so "auto" mode sends the PDF
+MIN_TEXT_CHARS_PER_PAGE = 100
+
+# Gemini won't cache less than this (the minimum depends on the model)
+MIN_CACHE_TOKENS = 4096
+
+InputMode = Literal["pdf", "text", "auto"]
+
+CACHED_SYSTEM_INSTRUCTION = """
+You are a legal assistant. You will be provided with a portion of the Colorado Revised Statutes.
+
+You will be asked to summarize parts of it, identified by their headers.
+"""
+
+
+def _build_prompt(
+    header_tree: HeaderTreeNode, header_path: list[Header], input_kind: str = "PDF"
+) -> str:
+    prompt = io.StringIO()
+
+    header_desc = f"{header_tree.header.text} ({header_tree.header.sub_text})"
+
+    prompt.write(f"This {input_kind} is a portion of the Colorado Revised Statutes.\n")
+    prompt.write(f"It contains the text of {header_tree.header.text}.\n")
+    if len(header_path) > 1:
+        prompt.write("This section is nested under the following headers:\n")
+        for header in header_path[:-1]:
+            prompt.write(f"- {header.text} ({header.sub_text})\n")
+    prompt.write("\n")
+    prompt.write(
+        f"Please summarize the text of {header_desc}. Just go straight into the summary in your response.\n"
+    )
+
+    return prompt.getvalue()
+
+
+def _build_cached_prompt(
+    header_tree: HeaderTreeNode, header_path: list[Header], pdf: bool
+) -> str:
+    prompt = io.StringIO()
+
+    header_desc = f"{header_tree.header.text} ({header_tree.header.sub_text})"
+
+    prompt.write(f"Please summarize the text of {header_desc}.\n")
+    if pdf:
+        first_page, last_page = header_tree.page_range
+        prompt.write(f"It is on pages {first_page} to {last_page} of the PDF.\n")
+    if len(header_path) > 1:
+        prompt.write("It is nested under the following headers:\n")
+        for header in header_path[:-1]:
+            prompt.write(f"- {header.text} ({header.sub_text})\n")
+    prompt.write("\n")
+    prompt.write(
+        f"Only summarize {header_tree.header.text}, not the rest of the document. Just go straight into the summary in your response.\n"
+    )
+
+    return prompt.getvalue()
+
+
+def _build_parent_prompt(
+    header_path: list[Header], child_summaries: list[tuple[Header, str]]
+) -> str:
+    prompt = io.StringIO()
+
+    header = header_path[-1]
+    header_desc = f"{header.text} ({header.sub_text})"
+
+    prompt.write(
+        f"Below are summaries of the parts of {header_desc}, a portion of the Colorado Revised Statutes.\n"
+    )
+    if len(header_path) > 1:
+        prompt.write(f"{header.text} is nested under the following headers:\n")
+        for h in header_path[:-1]:
+            prompt.write(f"- {h.text} ({h.sub_text})\n")
+    prompt.write("\n")
+    prompt.write(
+        f"Please summarize {header_desc} as a whole, based on these summaries. Just go straight into the summary in your response.\n"
+    )
+
+    for child, summary in child_summaries:
+        prompt.write(f"\n## {child.text} ({child.sub_text})\n\n{summary}\n")
+
+    return prompt.getvalue()
+
+
+def _log_token_use(response: types.GenerateContentResponse) -> None:
+    cached_tokens = response.usage_metadata.cached_content_token_count
+    prompt_tokens = response.usage_metadata.prompt_token_count
+    cand_tokens = response.usage_metadata.candidates_token_count
+    thinking_tokens = response.usage_metadata.thoughts_token_count
+    total_tokens = response.usage_metadata.total_token_count
+
+    logger.info(
+        f"Token use: {cached_tokens} cached, {prompt_tokens} prompt, {cand_tokens} candidate, {thinking_tokens} thinking, {total_tokens} total"
+    )
+
+
+def _total_tokens(response: types.GenerateContentResponse) -> int | None:
+    if response.usage_metadata is None:
+        return None
+    return response.usage_metadata.total_token_count
+
+
+@dataclass
+class TitleContext:
+    """A title's whole document, cached once and shared by its splits' requests."""
+
+    key: str  # hash of the content
+    pdf_path: Path | None
+    text: str | None
+    estimated_tokens: int
+
+
+@dataclass
+class SummaryRequest:
+    """
+    Everything that goes into summarizing one split, decided before anything is sent.
+    """
+
+    pdf_path: Path
+    mode: Literal["pdf", "text"]
+    prompt: str
+    text: str | None  # the split's text, in text mode
+    num_candidates: int
+    estimated_tokens: int
+    # if set, the split is summarized with `cached_prompt` against the cached title
+    context: TitleContext | None = None
+    cached_prompt: str | None = None
+
+    def key(self) -> str:
+        """Key the summary by the content, prompt, model and number of candidates."""
+        if self.context is not None:
+            return ResponseCache.key(
+                self.context.key,
+                self.cached_prompt,
+                SUMMARIZE_MODEL,
+                str(self.num_candidates),
+            )
+        if self.mode == "text":
+            content_hash = text_hash(self.text)
+        else:
+            content_hash = file_hash(self.pdf_path)
+        return ResponseCache.key(
+            content_hash, self.prompt, SUMMARIZE_MODEL, str(self.num_candidates)
+        )
+
+
 class Summarizer:
-    def __init__(self, api_key: str):
+    def __init__(
+        self,
+        api_key: str,
+        upload_registry_path: Path = UPLOAD_REGISTRY_PATH,
+        engine: RateLimitedEngine | None = None,
+        base_url: str | None = None,
+        input_mode: InputMode = "auto",
+        context_cache: bool = False,
+        cache_ttl: datetime.timedelta = datetime.timedelta(hours=1),
+        backend: LLMBackend | None = None,
+        telemetry: Telemetry | None = None,
+    ):
         self.api_key = api_key
-        self.client = genai.Client(api_key=api_key)
+        self.telemetry = telemetry if telemetry is not None else Telemetry(None)
+        if backend is None:
+            backend = LLMBackend.from_env()
+        self.client = make_client(api_key, base_url=base_url, backend=backend)
+        # split PDFs are reused across retries and runs, so only upload each one once;
+        # recordings and replays keep their own uploads, so recordings include them
+        namespace = api_key if backend.mode == "live" else f"{backend.mode}:{api_key}"
+        self.uploads = UploadRegistry(upload_registry_path, namespace=namespace)
+        self.engine = engine if engine is not None else RateLimitedEngine()
+        self.input_mode = input_mode
+        # with context caching, each title's document is sent once rather than per split
+        self.caches = None
+        if context_cache:
+            self.caches = ContextCache(
+                self.client, self.engine, SUMMARIZE_MODEL, ttl=cache_ttl
+            )
+
+        # page texts by token stream path and title contexts by source, shared by all
+        # splits of a document
+        self._page_texts: dict[str, dict[int, str] | None] = {}
+        self._contexts: dict[str | None, TitleContext | None] = {}
+        self._page_texts_lock = threading.Lock()
 
-    def summarize_pdf(
+    def _read_page_texts(self, manifest: SplitManifest) -> dict[int, str] | None:
+        key = manifest.document.token_stream
+        if key is None:
+            return None
+        with self._page_texts_lock:
+            if key not in self._page_texts:
+                self._page_texts[key] = read_page_texts(manifest)
+            return self._page_texts[key]
+
+    def prepare(
         self,
-        info_path: Path,
+        manifest: SplitManifest,
+        node_id: int,
         pdf_path: Path,
         num_candidates: int = 3,
+    ) -> SummaryRequest:
+        """
+        Decide how to summarize a split. In "auto" mode the split's token stream text is
+        sent instead of the PDF if it's available, looks complete and is estimated to be
+        cheaper.
+        """
+        if not pdf_path.suffix == ".pdf":
+            raise ValueError(f"File {pdf_path} is not a PDF")
+
+        header_tree, header_path = _read_info(manifest, node_id)
+        first_page, last_page = header_tree.page_range
+        num_pages = last_page - first_page + 1
+        output_tokens = num_candidates * CANDIDATE_TOKENS
+
+        text = None
+        if self.input_mode != "pdf":
+            page_texts = self._read_page_texts(manifest)
+            if page_texts is not None:
+                following = manifest.following(node_id)
+                text = split_markdown(
+                    page_texts,
+                    header_tree,
+                    None if following is None else following.header,
+                )
+            elif self.input_mode == "text":
+                raise ValueError(
+                    f"No token stream to take the text of {pdf_path} from"
+                )
+
+        pdf_prompt = _build_prompt(header_tree, header_path, "PDF")
+        pdf_tokens = num_pages * PDF_PAGE_TOKENS + len(pdf_prompt) // CHARS_PER_TOKEN
+        if text is not None:
+            # the text Gemini extracts from the PDF is billed on top of the page images
+            pdf_tokens += len(text) // CHARS_PER_TOKEN
+
+        request = None
+        if text is not None:
+            text_prompt = _build_prompt(header_tree, header_path, "text")
+            text_tokens = (len(text) + len(text_prompt)) // CHARS_PER_TOKEN
+            if self._use_text(text, text_tokens, pdf_tokens, num_pages):
+                logger.info(
+                    f"Sending text for {pdf_path} (~{text_tokens} tokens rather than ~{pdf_tokens})"
+                )
+                request = SummaryRequest(
+                    pdf_path=pdf_path,
+                    mode="text",
+                    prompt=text_prompt,
+                    text=text,
+                    num_candidates=num_candidates,
+                    estimated_tokens=text_tokens + output_tokens,
+                )
+
+        if request is None:
+            request = SummaryRequest(
+                pdf_path=pdf_path,
+                mode="pdf",
+                prompt=pdf_prompt,
+                text=None,
+                num_candidates=num_candidates,
+                estimated_tokens=pdf_tokens + output_tokens,
+            )
+
+        if self.caches is not None:
+            context = self._title_context(manifest)
+            if context is not None:
+                request.context = context
+                request.cached_prompt = _build_cached_prompt(
+                    header_tree, header_path, pdf=context.pdf_path is not None
+                )
+
+        return request
+
+    def _use_text(
+        self, text: str, text_tokens: int, pdf_tokens: int, num_pages: int
+    ) -> bool:
+        return self.input_mode == "text" or (
+            text_tokens < pdf_tokens
+            and len(text) >= MIN_TEXT_CHARS_PER_PAGE * num_pages
+        )
+
+    def _title_context(self, manifest: SplitManifest) -> TitleContext | None:
+        """
+        The whole document the manifest was split from, to cache once for all of its
+        splits, or None if it's too small to be worth caching.
+        """
+        source = manifest.document.source
+        with self._page_texts_lock:
+            if source in self._contexts:
+                return self._contexts[source]
+
+        root = manifest.subtree(0)
+        first_page, last_page = root.page_range
+        num_pages = last_page - first_page + 1
+        pdf_tokens = num_pages * PDF_PAGE_TOKENS
+
+        context = None
+        page_texts = None
+        if self.input_mode != "pdf":
+            page_texts = self._read_page_texts(manifest)
+        if page_texts is not None:
+            text = split_markdown(page_texts, root)
+            text_tokens = len(text) // CHARS_PER_TOKEN
+            pdf_tokens += text_tokens
+            if self._use_text(text, text_tokens, pdf_tokens, num_pages):
+                context = TitleContext(
+                    key=text_hash(text),
+                    pdf_path=None,
+                    text=text,
+                    estimated_tokens=text_tokens,
+                )
+        if context is None and source is not None and self.input_mode != "text":
+            pdf_path = Path(source)
+            if pdf_path.exists():
+                context = TitleContext(
+                    key=file_hash(pdf_path),
+                    pdf_path=pdf_path,
+                    text=None,
+                    estimated_tokens=pdf_tokens,
+                )
+
+        if context is not None and context.estimated_tokens < MIN_CACHE_TOKENS:
+            context = None
+
+        with self._page_texts_lock:
+            self._contexts[source] = context
+        return context
+
+    async def _cache_config(
+        self, context: TitleContext
+    ) -> types.CreateCachedContentConfig:
+        if context.pdf_path is not None:
+            file = await asyncio.to_thread(
+                self.uploads.upload, self.client, context.pdf_path
+            )
+            contents = [file]
+        else:
+            contents = [context.text]
+        return types.CreateCachedContentConfig(
+            system_instruction=CACHED_SYSTEM_INSTRUCTION,
+            contents=contents,
+        )
+
+    async def _generate(
+        self,
+        contents: list,
+        config: types.GenerateContentConfig,
+        estimated_tokens: int,
+        call: LLMCall | None = None,
     ) -> types.GenerateContentResponse:
-        """Summarize the PDF using Gemini."""
-        logger.info(f"Summarizing PDF: {pdf_path}")
+        return await self.engine.run(
+            lambda: self.client.aio.models.generate_content(
+                model=SUMMARIZE_MODEL,
+                contents=contents,
+                config=config,
+            ),
+            estimated_tokens=estimated_tokens,
+            actual_tokens=_total_tokens,
+            on_retry=None if call is None else call.retry,
+        )
 
-        header_tree, header_path = _read_info(info_path)
+    async def summarize(
+        self, request: SummaryRequest
+    ) -> types.GenerateContentResponse:
+        """Summarize a split using Gemini."""
+        logger.info(f"Summarizing PDF: {request.pdf_path}")
+        logger.info(f"Using prompt:\n```{request.prompt}```")
 
-        prompt = io.StringIO()
+        cached = request.context is not None and self.caches is not None
+        stage = "summarize-cached" if cached else f"summarize-{request.mode}"
+        input_hash = await asyncio.to_thread(request.key)
+        with self.telemetry.track(stage, SUMMARIZE_MODEL, input_hash) as call:
+            response = await self._summarize(request, call)
+            call.set_usage(response)
 
-        header_desc = f"{header_tree.header.text} ({header_tree.header.sub_text})"
+        _log_token_use(response)
+        return response
 
-        prompt.write("This PDF is a portion of the Colorado Revised Statutes.\n")
-        prompt.write(f"It contains the text of {header_tree.header.text}.\n")
-        if len(header_path) > 1:
-            prompt.write("This section is nested under the following headers:\n")
-            for header in header_path[:-1]:
-                prompt.write(f"- {header.text} ({header.sub_text})\n")
-        prompt.write("\n")
-        prompt.write(
-            f"Please summarize the text of {header_desc}. Just go straight into the summary in your response.\n"
+    async def _summarize(
+        self, request: SummaryRequest, call: LLMCall
+    ) -> types.GenerateContentResponse:
+        pdf_path = request.pdf_path
+        config = types.GenerateContentConfig(
+            temperature=0.5,
+            candidate_count=request.num_candidates,
         )
 
-        logger.info(f"Using prompt:\n```{prompt.getvalue()}```")
+        if request.context is not None and self.caches is not None:
+            try:
+                return await self._summarize_cached(request, config, call)
+            finally:
+                await self.caches.release(request.context.key)
 
-        if not pdf_path.suffix == ".pdf":
-            raise ValueError(f"File {pdf_path} is not a PDF")
+        if request.mode == "text":
+            return await self._generate(
+                [request.text, request.prompt], config, request.estimated_tokens, call
+            )
 
-        file = self.client.files.upload(file=pdf_path)
+        start = time.monotonic()
+        file = await asyncio.to_thread(self.uploads.upload, self.client, pdf_path)
+        call.upload_time = time.monotonic() - start
 
         assert file.mime_type == "application/pdf", f"File {pdf_path} is not a PDF"
 
+        try:
+            return await self._generate(
+                [file, request.prompt], config, request.estimated_tokens, call
+            )
+        except errors.ClientError as e:
+            # the registry can't know if a reused file was deleted before it expired
+            if e.code not in (403, 404):
+                raise
+            logger.warning(
+                f"Uploaded file {file.name} is no longer available; re-uploading."
+            )
+            await asyncio.to_thread(self.uploads.invalidate, pdf_path)
+            start = time.monotonic()
+            file = await asyncio.to_thread(self.uploads.upload, self.client, pdf_path)
+            call.upload_time += time.monotonic() - start
+            return await self._generate(
+                [file, request.prompt], config, request.estimated_tokens, call
+            )
+
+    async def _summarize_cached(
+        self,
+        request: SummaryRequest,
+        config: types.GenerateContentConfig,
+        call: LLMCall,
+    ) -> types.GenerateContentResponse:
+        context = request.context
+        estimated_tokens = (
+            context.estimated_tokens
+            + len(request.cached_prompt) // CHARS_PER_TOKEN
+            + request.num_candidates * CANDIDATE_TOKENS
+        )
+
+        for attempt in range(2):
+            cache_name = await self.caches.get(
+                context.key,
+                lambda: self._cache_config(context),
+                estimated_tokens=context.estimated_tokens,
+            )
+            config.cached_content = cache_name
+            try:
+                return await self._generate(
+                    [request.cached_prompt], config, estimated_tokens, call
+                )
+            except errors.ClientError as e:
+                # the cached content may have expired or been deleted in the meantime
+                if e.code not in (403, 404) or attempt > 0:
+                    raise
+                logger.warning(f"Cached content {cache_name} is no longer available.")
+                self.caches.invalidate(context.key)
+
+    async def inlined_request(
+        self, request: SummaryRequest, key: str
+    ) -> types.InlinedRequest:
+        """Package a split's summary request for the Batch API (uploading the PDF if needed)."""
         config = types.GenerateContentConfig(
             temperature=0.5,
-            candidate_count=num_candidates,
+            candidate_count=request.num_candidates,
         )
-
-        response = self.client.models.generate_content(
+        if request.mode == "text":
+            contents = [request.text, request.prompt]
+        else:
+            file = await asyncio.to_thread(
+                self.uploads.upload, self.client, request.pdf_path
+            )
+            contents = [file, request.prompt]
+        return types.InlinedRequest(
             model=SUMMARIZE_MODEL,
-            contents=[file, prompt.getvalue()],
+            contents=contents,
             config=config,
+            metadata={"key": key},
         )
 
-        # print out token use info
-        cached_tokens = response.usage_metadata.cached_content_token_count
-        prompt_tokens = response.usage_metadata.prompt_token_count
-        cand_tokens = response.usage_metadata.candidates_token_count
-        thinking_tokens = response.usage_metadata.thoughts_token_count
-        total_tokens = response.usage_metadata.total_token_count
-
-        logger.info(
-            f"Token use: {cached_tokens} cached, {prompt_tokens} prompt, {cand_tokens} candidate, {thinking_tokens} thinking, {total_tokens} total"
+    async def summarize_parent(
+        self, prompt: str, num_candidates: int = 3
+    ) -> types.GenerateContentResponse:
+        """Summarize a node from its children's summaries (included in the prompt)."""
+        config = types.GenerateContentConfig(
+            temperature=0.5,
+            candidate_count=num_candidates,
         )
-
+        estimated_tokens = (
+            len(prompt) // CHARS_PER_TOKEN + num_candidates * CANDIDATE_TOKENS
+        )
+        with self.telemetry.track(
+            "summarize-parent", SUMMARIZE_MODEL, text_hash(prompt)
+        ) as call:
+            response = await self._generate([prompt], config, estimated_tokens, call)
+            call.set_usage(response)
+        _log_token_use(response)
         return response
 
+    async def summarize_pdf(
+        self,
+        manifest: SplitManifest,
+        node_id: int,
+        pdf_path: Path,
+        num_candidates: int = 3,
+    ) -> types.GenerateContentResponse:
+        """Summarize a split PDF (or its text, depending on the input mode)."""
+        request = await asyncio.to_thread(
+            self.prepare, manifest, node_id, pdf_path, num_candidates
+        )
+        return await self.summarize(request)
 
-def _process_pdf(
-    summarizer: Summarizer,
-    pdf_path: Path,
-    summary_dir: Path,
-):
-    logger.info(f"Summarizing PDF: {pdf_path}")
-
-    info_path = pdf_path.parent / f"{pdf_path.stem}_info.json"
-
-    summary = summarizer.summarize_pdf(
-        info_path=info_path,
-        pdf_path=pdf_path,
-    )
 
-    with open(summary_dir / f"{pdf_path.stem}_summary.json", "w") as f:
+def _write_summary(
+    summary: types.GenerateContentResponse, summary_dir: Path, stem: str
+) -> list[Path]:
+    json_path = summary_dir / f"{stem}_summary.json"
+    outputs = [json_path]
+    with open(json_path, "w") as f:
         s = summary.model_dump_json(indent=2)
         f.write(s)
 
     for i, candidate in enumerate(summary.candidates):
-        output_path = summary_dir / f"{pdf_path.stem}_summary_{i + 1}.txt"
+        output_path = summary_dir / f"{stem}_summary_{i + 1}.txt"
 
         if candidate.content is None:
             # NOTE EDF I have no idea why this happens, but it does
@@ -131,6 +597,319 @@ def _process_pdf(
                     f.write(f"# Thought\n\n{part.text}\n")
                 else:
                     f.write(f"# Summary\n\n{part.text}\n")
+        outputs.append(output_path)
+
+    return outputs
+
+
+def _first_summary(outputs: list[Path] | list[str], stem: str) -> Path:
+    """The first `_summary_N.txt` candidate written, since candidates can be empty."""
+    for output in outputs:
+        if re.fullmatch(rf"{re.escape(stem)}_summary_\d+\.txt", Path(output).name):
+            return Path(output)
+    raise ValueError(f"No summary candidate of {stem} has any content.")
+
+
+def _read_summary_text(path: Path) -> str:
+    """Read the summary, without any thoughts, from a `_summary_N.txt` file."""
+    with open(path, "r") as f:
+        text = f.read()
+
+    sections = re.split(r"^# (Thought|Summary)\n\n", text, flags=re.MULTILINE)
+    return "\n".join(
+        body.strip()
+        for kind, body in zip(sections[1::2], sections[2::2])
+        if kind == "Summary"
+    )
+
+
+async def _journaled(
+    journal: Journal,
+    key: str,
+    source: Path,
+    summary_dir: Path,
+    stem: str,
+    get_summary: Callable[[], Awaitable[types.GenerateContentResponse]],
+) -> Path:
+    """
+    Get a summary, write it out, and record the outcome in the journal.
+
+    Returns:
+        The first summary candidate written.
+    """
+    try:
+        summary = await get_summary()
+        outputs = _write_summary(summary, summary_dir, stem)
+        summary_path = _first_summary(outputs, stem)
+    except Exception as e:
+        journal.record(key, "failed", source, error=repr(e))
+        raise
+
+    usage = None
+    if summary.usage_metadata is not None:
+        usage = summary.usage_metadata.model_dump(mode="json", exclude_none=True)
+    journal.record(key, "done", source, outputs=outputs, usage=usage)
+    return summary_path
+
+
+async def _batch_summaries(
+    batch: BatchRunner, jobs: list[tuple[Summarizer, SummaryRequest, str]]
+) -> dict[str, types.GenerateContentResponse | Exception]:
+    submitted = datetime.datetime.now(datetime.timezone.utc)
+    start = time.monotonic()
+    inlined = await asyncio.gather(
+        *(summarizer.inlined_request(request, key) for summarizer, request, key in jobs)
+    )
+    results = await batch.run({key: r for (_, _, key), r in zip(jobs, inlined)})
+
+    # the latency of a batched request is that of the whole batch
+    latency = time.monotonic() - start
+    for summarizer, request, key in jobs:
+        call = LLMCall(
+            time=submitted,
+            state=summarizer.telemetry.state,
+            stage=f"summarize-{request.mode}",
+            model=SUMMARIZE_MODEL,
+            input_hash=key,
+            batch=True,
+            latency=latency,
+        )
+        result = results.get(key)
+        if isinstance(result, types.GenerateContentResponse):
+            call.set_usage(result)
+        else:
+            call.status = "error"
+            call.error = repr(result)
+        summarizer.telemetry.record(call)
+
+    return results
+
+
+async def _batch_summary(
+    batch_results: asyncio.Task, key: str
+) -> types.GenerateContentResponse:
+    result = (await batch_results)[key]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+async def _summarize_split(
+    journal: Journal,
+    summarizer: Summarizer,
+    request: SummaryRequest,
+    key: str,
+    summary_dir: Path,
+    skip: bool = False,
+    batch_results: asyncio.Task | None = None,
+) -> Path:
+    stem = request.pdf_path.stem
+    if skip:
+        return _first_summary(journal.get(key).outputs, stem)
+
+    logger.info(f"Summarizing PDF: {request.pdf_path}")
+    if batch_results is not None:
+        get_summary = functools.partial(_batch_summary, batch_results, key)
+    else:
+        get_summary = functools.partial(summarizer.summarize, request)
+    return await _journaled(
+        journal, key, request.pdf_path, summary_dir, stem, get_summary
+    )
+
+
+def _summary_stem(manifest: SplitManifest, node_id: int) -> str:
+    # the same naming as split files, e.g. "TITLE 1--ARTICLE 2"
+    return "--".join(h.text for h in manifest.path(node_id))
+
+
+async def _summarize_parent_node(
+    journal: Journal,
+    resume: bool,
+    summarizer: Summarizer,
+    manifest: SplitManifest,
+    node_id: int,
+    children: list[tuple[int, asyncio.Task]],
+    summary_dir: Path,
+    num_candidates: int,
+) -> Path:
+    """Summarize a node from its children's summaries, once they're done."""
+    child_paths = await asyncio.gather(*(task for _, task in children))
+
+    stem = _summary_stem(manifest, node_id)
+    child_summaries = [
+        (manifest.node(child_id).header, _read_summary_text(path))
+        for (child_id, _), path in zip(children, child_paths)
+    ]
+    prompt = _build_parent_prompt(manifest.path(node_id), child_summaries)
+    key = ResponseCache.key(prompt, SUMMARIZE_MODEL, str(num_candidates))
+
+    if resume and journal.is_done(key):
+        logger.info(f"Skipping {stem}: already summarized.")
+        return _first_summary(journal.get(key).outputs, stem)
+
+    return await _journaled(
+        journal,
+        key,
+        summary_dir / stem,
+        summary_dir,
+        stem,
+        lambda: summarizer.summarize_parent(prompt, num_candidates),
+    )
+
+
+def _parent_tasks(
+    journal: Journal,
+    resume: bool,
+    summarizer: Summarizer,
+    manifest: SplitManifest,
+    split_tasks: dict[int, asyncio.Task],
+    summary_dir: Path,
+    num_candidates: int,
+) -> dict[int, asyncio.Task]:
+    """
+    Start a task for each ancestor of the splits, which summarizes it from its children's
+    summaries as soon as they're done.
+    """
+    parent_ids = set()
+    for node_id in split_tasks:
+        parent_id = manifest.node(node_id).parent_id
+        while parent_id is not None and parent_id not in parent_ids:
+            parent_ids.add(parent_id)
+            parent_id = manifest.node(parent_id).parent_id
+
+    tasks = dict(split_tasks)
+    # ids are in pre-order, so children's tasks are started before their parents'
+    for node_id in sorted(parent_ids, reverse=True):
+        children = [(c, tasks[c]) for c in manifest.children(node_id) if c in tasks]
+        if len(children) < len(manifest.children(node_id)):
+            logger.warning(
+                f"Some parts of {_summary_stem(manifest, node_id)} weren't summarized; "
+                "summarizing it from the rest."
+            )
+        tasks[node_id] = asyncio.create_task(
+            _summarize_parent_node(
+                journal,
+                resume,
+                summarizer,
+                manifest,
+                node_id,
+                children,
+                summary_dir,
+                num_candidates,
+            )
+        )
+
+    return {node_id: tasks[node_id] for node_id in parent_ids}
+
+
+async def _process_all(
+    p_args: list[tuple],
+    num_candidates: int,
+    journal: Journal,
+    resume: bool = False,
+    hierarchical: bool = False,
+    batch: BatchRunner | None = None,
+) -> None:
+    start = time.monotonic()
+    requests = await asyncio.gather(
+        *(
+            asyncio.to_thread(summarizer.prepare, manifest, node_id, p, num_candidates)
+            for summarizer, manifest, node_id, p, _ in p_args
+        )
+    )
+
+    # a title's cached document only pays off if more than one of its splits uses it.
+    # This is decided before resuming so that journal keys don't depend on what's done.
+    users: dict[str, list[SummaryRequest]] = {}
+    for request in requests:
+        if request.context is not None:
+            users.setdefault(request.context.key, []).append(request)
+    for context_requests in users.values():
+        if len(context_requests) == 1 or batch is not None:
+            for request in context_requests:
+                request.context = None
+
+    keys = await asyncio.gather(
+        *(asyncio.to_thread(request.key) for request in requests)
+    )
+
+    skip = [resume and journal.is_done(key) for key in keys]
+    skipped = sum(skip)
+
+    # in batch mode all pending splits go into batch jobs, and each split's task waits
+    # for its result
+    batch_results = None
+    if batch is not None:
+        batch_jobs = [
+            (summarizer, request, key)
+            for (summarizer, *_), request, key, s in zip(p_args, requests, keys, skip)
+            if not s
+        ]
+        batch_results = asyncio.create_task(_batch_summaries(batch, batch_jobs))
+
+    # each task yields the path of its node's first summary candidate
+    labels: list[str] = []
+    tasks: list[asyncio.Task] = []
+    split_tasks: dict[int, dict[int, asyncio.Task]] = {}
+    for (summarizer, manifest, node_id, _, summary_dir), request, key, s in zip(
+        p_args, requests, keys, skip
+    ):
+        if s:
+            logger.info(f"Skipping {request.pdf_path}: already summarized.")
+        elif request.context is not None:
+            summarizer.caches.expect(request.context.key, 1)
+
+        task = asyncio.create_task(
+            _summarize_split(
+                journal, summarizer, request, key, summary_dir, s, batch_results
+            )
+        )
+        labels.append(str(request.pdf_path))
+        tasks.append(task)
+        split_tasks.setdefault(id(manifest), {})[node_id] = task
+
+    if hierarchical:
+        seen = set()
+        for summarizer, manifest, _, _, summary_dir in p_args:
+            if id(manifest) in seen:
+                continue
+            seen.add(id(manifest))
+            for node_id, task in _parent_tasks(
+                journal,
+                resume,
+                summarizer,
+                manifest,
+                split_tasks[id(manifest)],
+                summary_dir,
+                num_candidates,
+            ).items():
+                labels.append(_summary_stem(manifest, node_id))
+                tasks.append(task)
+
+    # the engine limits how many requests are actually in flight
+    try:
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        for summarizer in {id(a[0]): a[0] for a in p_args}.values():
+            if summarizer.caches is not None:
+                await summarizer.caches.close()
+
+    failed = 0
+    for label, result in zip(labels, results):
+        if isinstance(result, BaseException):
+            failed += 1
+            logger.error(f"Failed to summarize {label}", exc_info=result)
+
+    # the throughput is what replayed runs are for
+    done = len(tasks) - failed - skipped
+    elapsed = time.monotonic() - start
+    logger.info(
+        f"Summarized {done} nodes, skipped {skipped}, failed {failed} in {elapsed:.1f}s ({done / max(elapsed, 1e-9):.2f} nodes/s)."
+    )
+    if failed > 0:
+        raise RuntimeError(
+            f"Failed to summarize {failed} of {len(tasks)} nodes. Rerun with --resume to retry them."
+        )
 
 
 def main():
@@ -147,8 +926,36 @@ def main():
         "-j",
         "--num_jobs",
         type=int,
-        default=1,
-        help="Number of jobs to run in parallel.",
+        default=8,
+        help="Maximum number of requests in flight. The actual concurrency adapts to latency and errors.",
+    )
+
+    parser.add_argument(
+        "--rpm",
+        type=float,
+        default=0,
+        help="Requests per minute limit. 0 means unlimited.",
+    )
+
+    parser.add_argument(
+        "--tpm",
+        type=float,
+        default=0,
+        help="Tokens per minute limit. 0 means unlimited.",
+    )
+
+    parser.add_argument(
+        "--max_retries",
+        type=int,
+        default=6,
+        help="Number of times to retry a request after quota, server or network errors.",
+    )
+
+    parser.add_argument(
+        "--base_url",
+        type=str,
+        default=None,
+        help="Override the Gemini API endpoint (e.g. a local test server).",
     )
 
     parser.add_argument(
@@ -158,6 +965,86 @@ def main():
         help="Number of summary candidates to generate.",
     )
 
+    parser.add_argument(
+        "--input_mode",
+        choices=["pdf", "text", "auto"],
+        default="auto",
+        help="Send each split as its PDF, as text from the token stream, or whichever is estimated to be cheaper (auto).",
+    )
+
+    parser.add_argument(
+        "--context_cache",
+        action="store_true",
+        help="Cache each title's whole document with Gemini once and summarize its splits against the cache.",
+    )
+
+    parser.add_argument(
+        "--cache_ttl_minutes",
+        type=float,
+        default=60,
+        help="Lifetime of cached title documents. It is extended while the title's splits are still being summarized.",
+    )
+
+    parser.add_argument(
+        "--llm_backend",
+        choices=["live", "record", "replay"],
+        default=LLM_BACKEND,
+        help="Send requests to Gemini (live), to Gemini while recording them (record), or serve recorded responses offline (replay), e.g. to load-test concurrency settings.",
+    )
+
+    parser.add_argument(
+        "--recording_dir",
+        type=Path,
+        default=LLM_RECORDING_DIR,
+        help="Where requests are recorded to and replayed from.",
+    )
+
+    parser.add_argument(
+        "--replay_options",
+        type=ReplayOptions.parse,
+        default=LLM_REPLAY_OPTIONS,
+        help="How replayed responses deviate from the recording, e.g. 'latency_median=2,error_rate=0.01,rate_limit_rate=0.05,seed=1'. See ReplayOptions.",
+    )
+
+    parser.add_argument(
+        "--hierarchical",
+        action="store_true",
+        help="Also summarize every header above the splits, bottom-up from the summaries of its children.",
+    )
+
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Submit the splits' requests as Gemini batch jobs and wait for them, for cheaper bulk runs. Not combined with --context_cache.",
+    )
+
+    parser.add_argument(
+        "--batch_poll_seconds",
+        type=float,
+        default=60,
+        help="How often to check on batch jobs.",
+    )
+
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Only summarize splits that the journal doesn't record as done (missing or failed ones).",
+    )
+
+    parser.add_argument(
+        "--journal",
+        type=Path,
+        default=None,
+        help=f"Path of the run journal. Defaults to {JOURNAL_NAME} in the output directory.",
+    )
+
+    parser.add_argument(
+        "--telemetry",
+        type=Path,
+        default=LLM_TELEMETRY_PATH,
+        help="Where to log each Gemini call's latency, token use and errors (see llm-telemetry).",
+    )
+
     parser.add_argument(
         "--subsample_count",
         type=int,
@@ -179,13 +1066,37 @@ def main():
     output_dir = args.output_dir
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    summarizer = Summarizer(api_key=GEMINI_API_KEY)
+    engine = RateLimitedEngine(
+        rpm=args.rpm,
+        tpm=args.tpm,
+        max_concurrency=args.num_jobs,
+        max_retries=args.max_retries,
+    )
+    summarizer = Summarizer(
+        api_key=GEMINI_API_KEY,
+        engine=engine,
+        base_url=args.base_url,
+        input_mode=args.input_mode,
+        context_cache=args.context_cache,
+        cache_ttl=datetime.timedelta(minutes=args.cache_ttl_minutes),
+        backend=LLMBackend(
+            mode=args.llm_backend,
+            recording_dir=args.recording_dir,
+            replay_options=args.replay_options,
+        ),
+        telemetry=Telemetry(args.telemetry, state="co"),
+    )
 
     p_args = []
-    for p in input_dir.glob("**/*.pdf"):
-        summary_dir = output_dir / p.relative_to(input_dir).parent
+    for manifest_path in sorted(input_dir.glob(f"**/{MANIFEST_NAME}")):
+        manifest = SplitManifest.read(manifest_path)
+
+        summary_dir = output_dir / manifest_path.relative_to(input_dir).parent
         summary_dir.mkdir(parents=True, exist_ok=True)
-        p_args.append((summarizer, p, summary_dir))
+
+        for split in manifest.splits:
+            p = manifest_path.parent / split.file_name
+            p_args.append((summarizer, manifest, split.node_id, p, summary_dir))
 
     if args.subsample_count > 0:
         gen = np.random.default_rng(args.subsample_seed)
@@ -194,16 +1105,28 @@ def main():
 
     logger.info(f"Summarizing {len(p_args)} PDFs.")
 
-    if args.num_jobs == 1:
-        for a in p_args:
-            _process_pdf(*a)
-    else:
-        with ThreadPoolExecutor(max_workers=args.num_jobs) as executor:
-            res = executor.map(
-                _process_pdf,
-                *zip(*p_args),
-            )
+    journal_path = args.journal
+    if journal_path is None:
+        journal_path = output_dir / JOURNAL_NAME
+    journal = Journal(journal_path)
+
+    batch = None
+    if args.batch:
+        batch = BatchRunner(
+            summarizer.client,
+            SUMMARIZE_MODEL,
+            output_dir / BATCH_STATE_NAME,
+            poll_interval=args.batch_poll_seconds,
+        )
+
+    asyncio.run(
+        _process_all(
+            p_args,
+            args.num_candidates,
+            journal,
+            resume=args.resume,
+            hierarchical=args.hierarchical,
+            batch=batch,
+        )
+    )
 
-            # Wait for all tasks to complete
-            for _ in res:
-                pass
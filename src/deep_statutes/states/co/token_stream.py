@@ -71,18 +71,42 @@ def _clean_token_stream(in_path: Path, out_path: Path) -> None:
                 text_idx = next_text_idx
 
 
-def _write_raw_token_stream(doc: pymupdf.Document, out_path: Path) -> None:
+def _write_raw_token_stream(
+    doc: pymupdf.Document, out_path: Path, page_range: tuple[int, int] | None = None
+) -> None:
     with open(out_path, "w") as file:
-        for token in pdf_to_token_stream(doc, DEFAULT_OPTIONS):
+        for token in pdf_to_token_stream(doc, DEFAULT_OPTIONS, page_range=page_range):
             file.write(token)
             file.write("\n")
 
 
-def write_clean_token_stream(doc: pymupdf.Document, out_path: Path) -> None:
+def write_clean_token_stream(
+    doc: pymupdf.Document, out_path: Path, page_range: tuple[int, int] | None = None
+) -> None:
     """
     Write the token stream with headers and footers removed to the specified output path.
+
+    If `page_range` (0-indexed, end exclusive) is given, only those pages are written; see
+    `concat_token_streams` for joining the pieces back together.
     """
     with tempfile.NamedTemporaryFile(mode="w", suffix=".txt") as temp_file:
         temp_path = Path(temp_file.name)
-        _write_raw_token_stream(doc, temp_path)
+        _write_raw_token_stream(doc, temp_path, page_range=page_range)
         _clean_token_stream(in_path=temp_path, out_path=out_path)
+
+
+def concat_token_streams(in_paths: list[Path], out_path: Path) -> None:
+    """
+    Join clean token streams written for consecutive page ranges into one token stream.
+
+    Footers never straddle pages, so this gives the same result as cleaning the whole
+    document at once.
+    """
+    with open(out_path, "w") as out:
+        for i, in_path in enumerate(in_paths):
+            # clean token streams have no trailing newline
+            if i > 0:
+                out.write("\n")
+            with open(in_path, "r") as f:
+                while chunk := f.read(1 << 20):
+                    out.write(chunk)
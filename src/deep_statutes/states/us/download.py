@@ -1,14 +1,13 @@
+import argparse
 import logging
-import tempfile
-import os
 from pathlib import Path
-import zipfile
 
 import requests
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse
 
 from deep_statutes.config import STATUTES_DATA_DIR
+from deep_statutes.download import Download, Downloader, extract_zip
 
 
 logging.basicConfig(
@@ -44,21 +43,62 @@ logger = logging.getLogger(__name__)
 #             f.write(pdf_response.content)
 
 
-def download_pdfs_from_all_zip(output_dir: Path):
-    url = "https://uscode.house.gov/download/releasepoints/us/pl/119/4/pdf_uscAll@119-4.zip"
+RELEASE_URL = "https://uscode.house.gov/download/releasepoints/us/pl/119/4/pdf_uscAll@119-4.zip"
 
-    # download the zip file
-    response = requests.get(url)
-    response.raise_for_status()  # Raise an error for bad responses
 
+def download_pdfs_from_all_zip(
+    output_dir: Path,
+    url: str = RELEASE_URL,
+    include: list[str] | None = None,
+    max_workers: int = 8,
+) -> list[Path]:
+    """
+    Download a release point's zip of all titles and extract (some of) their PDFs.
 
-    with tempfile.NamedTemporaryFile() as temp_file:
-        temp_file.write(response.content)
+    The zip is streamed to disk next to the PDFs, so memory use doesn't depend on its
+    size and an unchanged release isn't downloaded again. PDFs that were already
+    extracted (same size and CRC) are skipped.
 
-        with zipfile.ZipFile(temp_file.name, "r") as zip_ref:
-            zip_ref.extractall(output_dir)
+    Args:
+        output_dir: Where to put the zip and the PDFs.
+        url: The release point's zip.
+        include: Glob patterns of the member file names to extract (e.g. "usc26*");
+            None extracts all of them.
+        max_workers: Maximum number of PDFs to extract at once.
+    """
+    zip_path = output_dir / Path(urlparse(url).path).name
+    result = Downloader(output_dir).download(Download(url, zip_path))
+    if result.status not in ("downloaded", "unchanged"):
+        raise RuntimeError(f"Failed to download {url}: {result.error}")
+
+    return extract_zip(zip_path, output_dir, include=include, max_workers=max_workers)
 
 
 def main():
+    parser = argparse.ArgumentParser(
+        description="Download the US Code PDFs of a release point."
+    )
+    parser.add_argument(
+        "--url",
+        default=RELEASE_URL,
+        help="URL of the release point's zip of all titles.",
+    )
+    parser.add_argument(
+        "--include",
+        action="append",
+        default=None,
+        help="Only extract PDFs whose file name matches this glob pattern (e.g. 'usc26*'). Can be given several times.",
+    )
+    parser.add_argument(
+        "-j",
+        "--num_jobs",
+        type=int,
+        default=8,
+        help="Maximum number of PDFs to extract at once.",
+    )
+    args = parser.parse_args()
+
     output_dir = Path(STATUTES_DATA_DIR) / "us" / "pdf"
-    download_pdfs_from_all_zip(output_dir)
+    download_pdfs_from_all_zip(
+        output_dir, url=args.url, include=args.include, max_workers=args.num_jobs
+    )
@@ -1,15 +1,53 @@
+import argparse
 import dataclasses
 import json
+import logging
+import os
+import time
 from pathlib import Path
+from typing import Callable
 
 import pymupdf
 
+from deep_statutes.build import (
+    BuildManifest,
+    TargetRecord,
+    code_version,
+    file_hash,
+    json_hash,
+    stage_record,
+    text_hash,
+)
 from deep_statutes.pdf.token_stream import (
     pdf_to_token_stream,
     PDFTokenConversionOptions,
 )
 from deep_statutes import config
-from .parse_pdf import find_headers
+from deep_statutes.index.sections import SectionEntry, SectionIndex
+from deep_statutes.schedule import Task, run_tasks
+from .parse_pdf import Header, HeaderType, find_headers, header_grammar
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BUILD_MANIFEST_NAME = "build_manifest.json"
+
+# the legislature only publishes the current statutes, without an edition to go by
+EDITION = None
+
+# the modules whose code each stage runs, so that changing them rebuilds the stage
+_STAGE_CODE = {
+    "token_stream": (
+        "deep_statutes.pdf.token_stream",
+        "deep_statutes.pdf.util",
+        "deep_statutes.states.wy.convert",
+    ),
+    "toc": (
+        "deep_statutes.lark.util",
+        "deep_statutes.states.wy.convert",
+        "deep_statutes.states.wy.parse_pdf",
+    ),
+}
 
 
 DEFAULT_OPTIONS = PDFTokenConversionOptions(
@@ -30,7 +68,7 @@ def write_token_stream(doc: pymupdf.Document, out_path: Path) -> None:
             file.write("\n")
 
 
-def write_toc(token_stream_path: Path, out_path: Path) -> None:
+def write_toc(token_stream_path: Path, out_path: Path) -> list[Header]:
     headers = find_headers(token_stream_path)
 
     with open(out_path, "w") as out:
@@ -44,31 +82,181 @@ def write_toc(token_stream_path: Path, out_path: Path) -> None:
             out.write(f" ({header.text_range[0]}-{header.text_range[1]})")
             out.write("\n")
 
+    return headers
 
-def main():
-    input_dir = Path(config.STATUTES_DATA_DIR / "wy" / "pdf")
 
-    pdf_token_stream_dir = Path(
-        config.STATUTES_DATA_DIR / "wy" / "pdf" / "token_stream"
+def section_entries(
+    headers: list[Header], source: str, token_stream: str
+) -> list[SectionEntry]:
+    """The section index entries of a title's headers."""
+    entries = []
+    path: list[Header] = []
+    for header in headers:
+        while len(path) > 0 and path[-1].type.value >= header.type.value:
+            path.pop()
+        path.append(header)
+
+        if header.type == HeaderType.Section:
+            entries.append(
+                SectionEntry(
+                    state="wy",
+                    edition=EDITION,
+                    section=header.text,
+                    source=source,
+                    token_stream=token_stream,
+                    char_offset=header.text_range[0],
+                    heading=header.sub_text.strip(),
+                    path="--".join(h.text for h in path),
+                )
+            )
+    return entries
+
+
+def _is_current(
+    record: TargetRecord, stage: str, inputs: dict[str, str], build_root: Path
+) -> bool:
+    return stage in record and record[stage].is_current(inputs, build_root)
+
+
+def convert_title(
+    pdf_path: Path,
+    token_stream_path: Path,
+    toc_path: Path,
+    build_root: Path,
+    record: TargetRecord,
+    section_index_path: Path | None = None,
+) -> tuple[TargetRecord, dict[str, float]]:
+    """
+    Write a title's token stream and TOC and index its sections, skipping whichever is up to date.
+
+    Returns:
+        The updated build record, and the seconds each stage that ran took.
+    """
+    record = dict(record)
+    timings = {}
+
+    token_stream_inputs = {
+        "pdf": file_hash(pdf_path),
+        "options": json_hash(DEFAULT_OPTIONS),
+        "code_version": code_version(*_STAGE_CODE["token_stream"]),
+    }
+    if not _is_current(record, "token_stream", token_stream_inputs, build_root):
+        start = time.monotonic()
+        write_token_stream(pymupdf.open(pdf_path), token_stream_path)
+        timings["token_stream"] = time.monotonic() - start
+        record["token_stream"] = stage_record(
+            token_stream_inputs, [token_stream_path], build_root
+        )
+
+    toc_inputs = {
+        "token_stream": file_hash(token_stream_path),
+        "header_grammar": text_hash(header_grammar),
+        "code_version": code_version(*_STAGE_CODE["toc"]),
+    }
+    headers = None
+    if not _is_current(record, "toc", toc_inputs, build_root):
+        start = time.monotonic()
+        headers = write_toc(token_stream_path, toc_path)
+        timings["toc"] = time.monotonic() - start
+        record["toc"] = stage_record(toc_inputs, [toc_path], build_root)
+
+    if section_index_path is not None:
+        # the index is shared by all titles, so it keeps track of what's current itself
+        source = str(pdf_path)
+        input_hash = json_hash([toc_inputs, str(token_stream_path)])
+        with SectionIndex(section_index_path) as index:
+            if not index.is_current("wy", source, input_hash):
+                start = time.monotonic()
+                if headers is None:
+                    headers = find_headers(token_stream_path)
+                entries = section_entries(headers, source, str(token_stream_path))
+                index.replace_source("wy", source, EDITION, input_hash, entries)
+                timings["sections"] = time.monotonic() - start
+
+    return record, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert the Wyoming statutes PDFs to token streams and TOCs."
+    )
+    parser.add_argument(
+        "-j",
+        "--num_jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of titles to convert in parallel.",
     )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Convert every title, even if the build manifest says its outputs are up to date.",
+    )
+    parser.add_argument(
+        "--section_index",
+        type=Path,
+        default=config.SECTION_INDEX_PATH,
+        help="The section index to add the titles' sections to (see section-lookup).",
+    )
+    args = parser.parse_args()
 
-    toc_dir = Path(config.STATUTES_DATA_DIR / "wy" / "toc" / "from_token_stream")
+    build_root = Path(config.STATUTES_DATA_DIR / "wy")
+    input_dir = build_root / "pdf"
+
+    pdf_token_stream_dir = input_dir / "token_stream"
+    pdf_token_stream_dir.mkdir(parents=True, exist_ok=True)
+
+    toc_dir = build_root / "toc" / "from_token_stream"
     toc_dir.mkdir(parents=True, exist_ok=True)
 
     # write token stream config
-    pdf_token_stream_dir.mkdir(parents=True, exist_ok=True)
     with open(pdf_token_stream_dir / "config.json", "w") as file:
         file.write(json.dumps(dataclasses.asdict(DEFAULT_OPTIONS), indent=4))
 
-    for filename in input_dir.iterdir():
-        if filename.suffix == ".pdf":
-            pdf_path = input_dir / filename
-            token_stream_path = pdf_token_stream_dir / f"{filename.stem}.txt"
-            toc_path = toc_dir / f"{filename.stem}.md"
-            print(f"{pdf_path} ->\n\t{token_stream_path}\n\t{toc_path}")
+    build_manifest_path = pdf_token_stream_dir / BUILD_MANIFEST_NAME
+    if args.force:
+        build_manifest = BuildManifest()
+    else:
+        build_manifest = BuildManifest.load(build_manifest_path)
+
+    def _done(name: str) -> Callable:
+        def _record(result: tuple[TargetRecord, dict[str, float]]) -> list[Task]:
+            record, timings = result
+            if len(timings) == 0:
+                logger.info(f"{name} is up to date.")
+            else:
+                logger.info(
+                    f"Converted {name}: "
+                    + ", ".join(f"{stage} {t:.1f}s" for stage, t in timings.items())
+                )
+            # save after every title so that an interrupted run keeps its progress
+            build_manifest.targets[name] = record
+            build_manifest.save(build_manifest_path)
+            return []
 
-            doc = pymupdf.open(pdf_path)
+        return _record
 
-            write_token_stream(doc, token_stream_path)
+    tasks = []
+    for pdf_path in sorted(input_dir.glob("*.pdf")):
+        name = pdf_path.stem
+        tasks.append(
+            Task(
+                key=name,
+                fn=convert_title,
+                args=(
+                    pdf_path,
+                    pdf_token_stream_dir / f"{name}.txt",
+                    toc_dir / f"{name}.md",
+                    build_root,
+                    build_manifest.targets.get(name, {}),
+                    args.section_index,
+                ),
+                num_pages=pymupdf.open(pdf_path).page_count,
+                then=_done(name),
+            )
+        )
 
-            write_toc(token_stream_path, toc_path)
+    # the scheduler runs the largest titles first
+    start = time.monotonic()
+    run_tasks(tasks, num_jobs=args.num_jobs)
+    logger.info(f"Converted {len(tasks)} titles in {time.monotonic() - start:.1f}s.")
@@ -0,0 +1,323 @@
+import datetime
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+class FakeGemini:
+    """
+    A local stand-in for the parts of the Gemini API we use: resumable file uploads,
+    cached contents, generateContent and batch jobs (which finish on their second
+    poll). Status codes queued in `fail_next` are returned (one per generateContent or
+    batch request) instead of a response, to simulate quota and server errors.
+    """
+
+    def __init__(self):
+        self.fail_next: list[int] = []
+        self.uploads: list[bytes] = []
+        self.generate_requests: list[dict] = []
+        self.caches: dict[str, dict] = {}
+        self.num_caches_created = 0
+        self.batches: dict[str, dict] = {}
+        self.max_in_flight = 0
+        self.delay = 0.0
+        self.empty_candidates: set[int] = set()
+
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.base_url = f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self) -> None:
+        threading.Thread(
+            target=self._server.serve_forever, args=(0.05,), daemon=True
+        ).start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    @staticmethod
+    def _expire_time(body: dict) -> str:
+        ttl = float(body.get("ttl", "3600s").removesuffix("s"))
+        expiration = datetime.datetime.now(
+            datetime.timezone.utc
+        ) + datetime.timedelta(seconds=ttl)
+        return expiration.isoformat().replace("+00:00", "Z")
+
+    def _create_cache(self, body: dict) -> dict:
+        self.num_caches_created += 1
+        name = f"cachedContents/{self.num_caches_created}"
+        self.caches[name] = body
+        return {
+            "name": name,
+            "model": body.get("model"),
+            "displayName": body.get("displayName"),
+            "expireTime": self._expire_time(body),
+        }
+
+    def _generate(self, model: str, body: dict) -> dict:
+        self.generate_requests.append(body)
+        return self._response(model, body)
+
+    def _response(self, model: str, body: dict) -> dict:
+        num_candidates = body.get("generationConfig", {}).get("candidateCount", 1)
+        return {
+            "candidates": [
+                (
+                    {"index": i, "finishReason": "OTHER"}
+                    if i in self.empty_candidates
+                    else {
+                        "content": {
+                            "role": "model",
+                            "parts": [{"text": f"Summary {i + 1} from {model}"}],
+                        },
+                        "index": i,
+                    }
+                )
+                for i in range(num_candidates)
+            ],
+            "usageMetadata": {
+                "promptTokenCount": 100,
+                "candidatesTokenCount": 10 * num_candidates,
+                "totalTokenCount": 100 + 10 * num_candidates,
+            },
+        }
+
+    def _create_batch(self, model: str, body: dict) -> dict:
+        name = f"batches/{len(self.batches) + 1}"
+        self.batches[name] = {"model": model, "body": body, "polls": 0}
+        return {"name": name, "metadata": {"state": "BATCH_STATE_PENDING"}}
+
+    def _get_batch(self, name: str) -> dict:
+        batch = self.batches[name]
+        batch["polls"] += 1
+        if batch["polls"] < 2:
+            return {"name": name, "metadata": {"state": "BATCH_STATE_RUNNING"}}
+
+        requests = batch["body"]["batch"]["inputConfig"]["requests"]["requests"]
+        responses = [
+            {
+                "response": self._response(batch["model"], r["request"]),
+                "metadata": r.get("metadata", {}),
+            }
+            for r in requests
+        ]
+        return {
+            "name": name,
+            "metadata": {
+                "state": "BATCH_STATE_SUCCEEDED",
+                "output": {"inlinedResponses": {"inlinedResponses": responses}},
+            },
+        }
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, body: dict, headers: dict = {}):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_error(self, status: int, message: str):
+                self._send_json(status, {"error": {"code": status, "message": message}})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length)
+                path = self.path.split("?")[0]
+
+                if path == "/upload/v1beta/files":
+                    upload_url = f"{fake.base_url}/upload-session"
+                    self._send_json(200, {}, {"x-goog-upload-url": upload_url})
+                elif path == "/upload-session":
+                    with fake._lock:
+                        fake.uploads.append(body)
+                        n = len(fake.uploads)
+                    expiration = datetime.datetime.now(
+                        datetime.timezone.utc
+                    ) + datetime.timedelta(hours=48)
+                    file = {
+                        "name": f"files/{n}",
+                        "uri": f"{fake.base_url}/v1beta/files/{n}",
+                        "mimeType": "application/pdf",
+                        "sizeBytes": str(len(body)),
+                        "expirationTime": expiration.isoformat().replace("+00:00", "Z"),
+                        "state": "ACTIVE",
+                    }
+                    self._send_json(
+                        200, {"file": file}, {"x-goog-upload-status": "final"}
+                    )
+                elif path == "/v1beta/cachedContents":
+                    with fake._lock:
+                        response = fake._create_cache(json.loads(body))
+                    self._send_json(200, response)
+                elif path.endswith(":batchGenerateContent"):
+                    model = path.split("/models/")[1].split(":")[0]
+                    with fake._lock:
+                        status = fake.fail_next.pop(0) if fake.fail_next else None
+                        if status is None:
+                            response = fake._create_batch(model, json.loads(body))
+                    if status is not None:
+                        self._send_error(status, "injected error")
+                    else:
+                        self._send_json(200, response)
+                elif path.endswith(":generateContent"):
+                    model = path.split("/models/")[1].removesuffix(":generateContent")
+                    with fake._lock:
+                        status = fake.fail_next.pop(0) if fake.fail_next else None
+                        fake._in_flight += 1
+                        fake.max_in_flight = max(fake.max_in_flight, fake._in_flight)
+                    try:
+                        if fake.delay > 0:
+                            threading.Event().wait(fake.delay)
+                        cache_name = json.loads(body).get("cachedContent")
+                        if status is None and cache_name is not None:
+                            if cache_name not in fake.caches:
+                                status = 404
+                        if status is not None:
+                            self._send_error(status, "injected error")
+                        else:
+                            with fake._lock:
+                                response = fake._generate(model, json.loads(body))
+                            self._send_json(200, response)
+                    finally:
+                        with fake._lock:
+                            fake._in_flight -= 1
+                else:
+                    self._send_error(404, "not found")
+
+            def do_GET(self):
+                name = self.path.split("?")[0].removeprefix("/v1beta/")
+                if name not in fake.batches:
+                    self._send_error(404, "not found")
+                    return
+                with fake._lock:
+                    status = fake.fail_next.pop(0) if fake.fail_next else None
+                    if status is None:
+                        response = fake._get_batch(name)
+                if status is not None:
+                    self._send_error(status, "injected error")
+                else:
+                    self._send_json(200, response)
+
+            def do_PATCH(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                name = self.path.split("?")[0].removeprefix("/v1beta/")
+                if name not in fake.caches:
+                    self._send_error(404, "not found")
+                    return
+                with fake._lock:
+                    fake.caches[name].update(body)
+                self._send_json(
+                    200, {"name": name, "expireTime": fake._expire_time(body)}
+                )
+
+            def do_DELETE(self):
+                name = self.path.split("?")[0].removeprefix("/v1beta/")
+                with fake._lock:
+                    fake.caches.pop(name, None)
+                self._send_json(200, {})
+
+        return Handler
+
+
+@pytest.fixture
+def fake_gemini():
+    fake = FakeGemini()
+    fake.start()
+    yield fake
+    fake.stop()
+
+
+class FileServer:
+    """
+    A local HTTP server for download tests. Serves `files` (path -> bytes) with strong
+    ETags and supports conditional and range requests. Paths in `truncate_next` are
+    cut off halfway through their next response, as if the connection dropped.
+    """
+
+    def __init__(self):
+        self.files: dict[str, bytes] = {}
+        self.truncate_next: set[str] = set()
+        self.requests: list[tuple[str, dict[str, str]]] = []
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.base_url = f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self) -> None:
+        threading.Thread(
+            target=self._server.serve_forever, args=(0.05,), daemon=True
+        ).start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                server.requests.append((self.path, dict(self.headers)))
+                data = server.files.get(self.path)
+                if data is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                etag = f'"{hashlib.sha256(data).hexdigest()[:16]}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+
+                start = 0
+                range_header = self.headers.get("Range")
+                if_range = self.headers.get("If-Range")
+                if range_header is not None and if_range in (None, etag):
+                    start = int(range_header.removeprefix("bytes=").split("-")[0])
+                    self.send_response(206)
+                    self.send_header(
+                        "Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}"
+                    )
+                else:
+                    self.send_response(200)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(data) - start))
+                self.end_headers()
+
+                body = data[start:]
+                if self.path in server.truncate_next:
+                    server.truncate_next.discard(self.path)
+                    body = body[: len(body) // 2]
+                    self.close_connection = True
+                self.wfile.write(body)
+
+        return Handler
+
+
+@pytest.fixture
+def file_server():
+    server = FileServer()
+    server.start()
+    yield server
+    server.stop()
@@ -0,0 +1,72 @@
+import numpy as np
+
+from deep_statutes.index.citations import CitationGraph, build_graph
+from deep_statutes.index.sections import SectionEntry, SectionIndex
+
+TOKEN_STREAM = """<<PAGE 0>>
+<<LINE (0, 0, 0)>>
+<<SPAN_M_B>>
+2-2-701.  Bills.
+<<LINE (0, 1, 0)>>
+<<SPAN_M>>
+As defined in section 2-2-702 and subject to 2-2-
+<<LINE (0, 1, 1)>>
+<<SPAN_M>>
+703.5 and 2-2-702, call 1-800-555-0100.
+<<LINE (0, 2, 0)>>
+<<SPAN_M_B>>
+2-2-702.  Definitions.
+<<LINE (0, 3, 0)>>
+<<SPAN_M>>
+See 2-2-703.5; compare section 9-9-999, which is not in this title.
+<<LINE (0, 4, 0)>>
+<<SPAN_M_B>>
+2-2-703.5.  Fiscal notes.
+<<LINE (0, 5, 0)>>
+<<SPAN_M>>
+Text of 2-2-703.5 only.
+"""
+
+
+def test_build_and_query(tmp_path):
+    token_stream = tmp_path / "title02.txt"
+    token_stream.write_text(TOKEN_STREAM)
+
+    with SectionIndex(tmp_path / "sections.sqlite") as index:
+        entries = [
+            SectionEntry(
+                state="co",
+                edition="2024",
+                section=section,
+                source="title02.pdf",
+                token_stream=str(token_stream),
+                char_offset=TOKEN_STREAM.index(f"{section}.  "),
+                heading="",
+                path=section,
+            )
+            for section in ["2-2-701", "2-2-702", "2-2-703.5"]
+        ]
+        index.replace_source("co", "title02.pdf", "2024", "a", entries)
+        graph = build_graph(index)
+
+    graph.save(tmp_path / "citations.npz")
+    graph = CitationGraph.load(tmp_path / "citations.npz")
+
+    (s701,) = graph.find("C.R.S. 2-2-701")
+    (s702,) = graph.find("2-2-702", state="co")
+    (s703,) = graph.find("2-2-703.5")
+    assert graph.label(s701) == "co 2024 2-2-701"
+
+    # the citation split across lines is rejoined; the phone number, the unknown section
+    # and self-citations are left out
+    assert graph.num_edges() == 3
+    assert graph.cites(s701).tolist() == sorted([s702, s703])
+    assert graph.cites(s702).tolist() == [s703]
+    assert graph.cited_by(s703).tolist() == sorted([s701, s702])
+    assert graph.cited_by(s701).tolist() == []
+
+    assert graph.k_hop([s702], 1, direction="cites").tolist() == sorted([s702, s703])
+    cited_by = graph.k_hop([s703], 1, direction="cited_by")
+    assert cited_by.tolist() == sorted([s701, s702, s703])
+    assert graph.k_hop([s703], 2, direction="cites").tolist() == [s703]
+    assert np.array_equal(graph.k_hop([s703], 5), np.arange(3))
@@ -0,0 +1,93 @@
+import numpy as np
+
+from deep_statutes.index.intervals import HeaderIntervals
+from deep_statutes.pdf.header_array import HeaderArray
+from deep_statutes.pdf.toc import DocumentTOC, Header
+
+TOC = DocumentTOC(
+    header_types=["title", "article", "part", "section"],
+    headers=[
+        Header(type="title", text="TITLE 1", sub_text="GENERAL", page=1),
+        Header(type="article", text="ARTICLE 1", sub_text="First", page=1),
+        Header(type="section", text="1-1-101", sub_text="Definitions", page=2),
+        Header(type="section", text="1-1-102", sub_text="Scope", page=9),
+        Header(type="article", text="ARTICLE 2", sub_text="Second", page=20),
+        Header(type="part", text="PART 1", sub_text="General", page=21),
+        Header(type="section", text="1-2-101", sub_text="Definitions", page=22),
+        Header(type="article", text="ARTICLE 3", sub_text="Third", page=30),
+    ],
+)
+
+TEXT_RANGES = [
+    (0, 10),
+    (10, 20),
+    (100, 110),
+    (500, 510),
+    (900, 910),
+    (950, 960),
+    (1000, 1010),
+    (1500, 1510),
+]
+
+
+def _intervals() -> HeaderIntervals:
+    tree = HeaderArray.from_toc(TOC.model_copy(deep=True), num_pages=40)
+    return HeaderIntervals.build(tree, TEXT_RANGES)
+
+
+def test_point_and_range_queries():
+    intervals = _intervals()
+    tree = intervals.tree
+
+    pages = [1, 2, 8, 9, 19, 20, 25, 40]
+    assert intervals.at_pages(pages).tolist() == [1, 2, 2, 3, 3, 4, 6, 7]
+    assert intervals.paths(intervals.at_pages([22, 25])) == [
+        "TITLE 1--ARTICLE 2--PART 1--1-2-101"
+    ] * 2
+    assert intervals.char_end.tolist() == [-1, 900, 500, 900, 1500, 1500, 1500, -1]
+    assert intervals.at_offsets([5, 499, 500, 2000]).tolist() == [0, 2, 3, 7]
+
+    # same as checking every node
+    for first, last in [(1, 1), (9, 9), (10, 19), (20, 21), (25, 40), (41, 50)]:
+        expected = np.flatnonzero((tree.page_start <= last) & (tree.page_end >= first))
+        assert intervals.in_pages(first, last).tolist() == expected.tolist()
+
+    char_end = np.where(intervals.char_end < 0, 2000, intervals.char_end)
+    for start, end in [(0, 1), (499, 501), (600, 1000), (1400, 1600)]:
+        expected = np.flatnonzero((intervals.char_start < end) & (char_end > start))
+        assert intervals.in_offsets(start, end).tolist() == expected.tolist()
+
+
+def test_read_write(tmp_path):
+    intervals = _intervals()
+    intervals.write(tmp_path / "intervals.parquet")
+    loaded = HeaderIntervals.read(tmp_path / "intervals.parquet")
+
+    assert loaded.tree.header(6) == intervals.tree.header(6)
+    # sections come before the first part, but parts are above them
+    assert loaded.tree.header_types == TOC.header_types
+    assert loaded.char_end.tolist() == intervals.char_end.tolist()
+    assert loaded.in_pages(20, 21).tolist() == intervals.in_pages(20, 21).tolist()
+
+
+def test_text_chars(tmp_path):
+    tree = HeaderArray.from_toc(TOC.model_copy(deep=True), num_pages=40)
+    token_stream = ""
+    text_ranges = []
+    for i, header in enumerate(TOC.headers):
+        token_stream += "<<LINE>>\n"
+        text_ranges.append((len(token_stream), len(token_stream) + len(header.text)))
+        token_stream += f"{header.text}\n"
+        # a body line of 10 characters per level
+        token_stream += "<<LINE>>\n" + "x" * (10 * tree.depth[i] - 1) + "\n"
+    (tmp_path / "title.txt").write_text(token_stream)
+
+    intervals = HeaderIntervals.build(tree, text_ranges, tmp_path / "title.txt")
+    own = [len(h.text) + 1 + 10 * d for h, d in zip(TOC.headers, tree.depth)]
+    assert intervals.text_chars.tolist() == [
+        sum(own[i : tree.subtree_end[i]]) for i in range(len(tree))
+    ]
+
+    intervals.write(tmp_path / "intervals.parquet")
+    loaded = HeaderIntervals.read(tmp_path / "intervals.parquet")
+    assert loaded.estimated_tokens().tolist() == (intervals.text_chars // 4).tolist()
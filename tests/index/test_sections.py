@@ -0,0 +1,60 @@
+from deep_statutes.index.intervals import HeaderIntervals
+from deep_statutes.index.sections import (
+    SectionIndex,
+    section_number,
+    sections_from_intervals,
+)
+from deep_statutes.pdf.header_array import HeaderArray
+from deep_statutes.pdf.toc import DocumentTOC, Header
+
+TOC = DocumentTOC(
+    header_types=["title", "article", "section"],
+    headers=[
+        Header(type="title", text="TITLE 2", sub_text="GENERAL ASSEMBLY", page=1),
+        Header(type="article", text="ARTICLE 2", sub_text="Legislation", page=1),
+        Header(type="section", text="2-2-701", sub_text="Bills.", page=2),
+        Header(type="section", text="2-2-701.5", sub_text="Fiscal notes.", page=10),
+        Header(type="article", text="ARTICLE 3", sub_text="Audits", page=40),
+    ],
+)
+
+
+def test_index_and_lookup(tmp_path):
+    tree = HeaderArray.from_toc(TOC.model_copy(deep=True), num_pages=50)
+    intervals = HeaderIntervals.build(
+        tree, [(0, 5), (5, 10), (100, 110), (2000, 2010), (3000, 3010)]
+    )
+    split_nodes = [(i, f"{tree.path_text(i)}.pdf") for i in tree.choose_splits(16)]
+    entries = sections_from_intervals(
+        intervals, "co", "2024", "title02.pdf", "title02.txt", split_nodes
+    )
+
+    with SectionIndex(tmp_path / "sections.sqlite") as index:
+        assert not index.is_current("co", "title02.pdf", "a")
+        index.replace_source("co", "title02.pdf", "2024", "a", entries)
+        assert index.is_current("co", "title02.pdf", "a")
+
+        (entry,) = index.lookup("C.R.S. § 2-2-701(3)", state="co")
+        assert entry.page == 2
+        assert entry.char_offset == 100
+        assert entry.heading == "Bills."
+        assert entry.path == "TITLE 2--ARTICLE 2--2-2-701"
+        # the article is too long to split on, so the section is split on its own
+        assert entry.split_file == "TITLE 2--ARTICLE 2--2-2-701.pdf"
+
+        (entry,) = index.lookup("2-2-701.5")
+        assert entry.split_file is None
+
+        assert index.lookup("2-2-701", state="wy") == []
+        assert index.lookup("2-2-701", edition="2023") == []
+
+        # reindexing a source replaces its entries
+        index.replace_source("co", "title02.pdf", "2024", "b", entries[:1])
+        assert index.lookup("2-2-701.5") == []
+        assert len(index.lookup("2-2-701")) == 1
+
+
+def test_section_number():
+    assert section_number("W.S. 6-2-101(a)") == "6-2-101"
+    assert section_number("24-1-136.5") == "24-1-136.5"
+    assert section_number(" 1-1 ") == "1-1"
@@ -0,0 +1,60 @@
+import asyncio
+import json
+
+from google import genai
+from google.genai import types
+
+from deep_statutes.llm.batch import BatchRunner
+from deep_statutes.llm.engine import RateLimitedEngine
+
+
+def _request(key: str) -> types.InlinedRequest:
+    return types.InlinedRequest(
+        contents=[f"Summarize {key}"],
+        config=types.GenerateContentConfig(candidate_count=2),
+        metadata={"key": key},
+    )
+
+
+def test_batch_runner_resumes_submitted_jobs(tmp_path, fake_gemini):
+    client = genai.Client(
+        api_key="test-key",
+        http_options=types.HttpOptions(base_url=fake_gemini.base_url),
+    )
+    state_path = tmp_path / "batch_jobs.json"
+    runner = BatchRunner(
+        client, "test-model", state_path, max_requests_per_job=2, poll_interval=0.01
+    )
+
+    # a job submitted by an earlier run that didn't get to collect it
+    job = client.batches.create(model="test-model", src=[_request("a")])
+    state_path.write_text(json.dumps({job.name: ["a"]}))
+
+    results = asyncio.run(runner.run({k: _request(k) for k in ["a", "b", "c"]}))
+
+    # "a" came from the old job; "b" and "c" were submitted together
+    assert len(fake_gemini.batches) == 2
+    assert sorted(results) == ["a", "b", "c"]
+    assert all(len(r.candidates) == 2 for r in results.values())
+    assert json.loads(state_path.read_text()) == {}
+
+
+def test_batch_runner_retries_transient_errors(tmp_path, fake_gemini):
+    client = genai.Client(
+        api_key="test-key",
+        http_options=types.HttpOptions(base_url=fake_gemini.base_url),
+    )
+    runner = BatchRunner(
+        client,
+        "test-model",
+        tmp_path / "batch_jobs.json",
+        poll_interval=0.01,
+        engine=RateLimitedEngine(base_delay=0.01),
+    )
+
+    # one error submitting the job, then one while polling it
+    fake_gemini.fail_next = [503, 429]
+    results = asyncio.run(runner.run({k: _request(k) for k in ["a", "b"]}))
+
+    assert len(fake_gemini.batches) == 1
+    assert all(isinstance(r, types.GenerateContentResponse) for r in results.values())
@@ -0,0 +1,53 @@
+import os
+
+from google.genai import types
+
+from deep_statutes.llm.cache import ResponseCache
+from deep_statutes.pdf.llm_extract import gemini_toc
+from deep_statutes.pdf.toc import DocumentTOC, Header
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(tmp_path, max_bytes=350)
+
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.put(key, {"value": "x" * 100})
+        # make the access order deterministic regardless of filesystem timestamp resolution
+        os.utime(tmp_path / f"{key}.json", (i, i))
+
+    assert cache.get("a") is not None  # touches "a", so "b" is now the oldest
+    cache.put("d", {"value": "x" * 100})
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("d") is not None
+
+
+def test_query_toc_uses_cache(tmp_path, monkeypatch):
+    pdf_path = tmp_path / "doc.pdf"
+    pdf_path.write_bytes(b"%PDF-1.4 not really a pdf")
+
+    toc = DocumentTOC(
+        header_types=["title"],
+        headers=[Header(type="title", text="TITLE 1", sub_text="", page=1)],
+    )
+    calls = []
+
+    def _fake_query(path):
+        calls.append(path)
+        return types.GenerateContentResponse(
+            parsed=toc,
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=10
+            ),
+        )
+
+    monkeypatch.setattr(gemini_toc, "_query_toc_from_gemini", _fake_query)
+    cache = ResponseCache(tmp_path / "cache")
+
+    assert gemini_toc._query_toc(pdf_path, cache, use_cache=True) == toc
+    assert gemini_toc._query_toc(pdf_path, cache, use_cache=True) == toc
+    assert len(calls) == 1
+
+    gemini_toc._query_toc(pdf_path, cache, use_cache=False)
+    assert len(calls) == 2
@@ -0,0 +1,138 @@
+import asyncio
+
+from google import genai
+from google.genai import errors, types
+import pytest
+
+from deep_statutes.llm.engine import AdaptiveConcurrency, RateLimitedEngine, TokenBucket
+
+
+def _client(fake_gemini) -> genai.Client:
+    return genai.Client(
+        api_key="test-key", http_options=types.HttpOptions(base_url=fake_gemini.base_url)
+    )
+
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(per_minute=6000)
+
+    async def _run():
+        loop = asyncio.get_running_loop()
+        await bucket.acquire(6000)
+        start = loop.time()
+        await bucket.acquire(10)  # 100 tokens per second, so about 0.1s
+        elapsed = loop.time() - start
+        bucket.adjust(-5)  # the request used fewer tokens than reserved
+        return elapsed
+
+    elapsed = asyncio.run(_run())
+    assert 0.05 < elapsed < 1.0
+    assert bucket._tokens == pytest.approx(5.0, abs=1.0)
+
+
+def test_concurrency_backs_off_on_overload_and_recovers():
+    limiter = AdaptiveConcurrency(max_limit=8, initial_limit=8)
+
+    async def _run():
+        await limiter.acquire()
+        await limiter.release(None, overloaded=True)
+        assert int(limiter.limit) == 4
+
+        for _ in range(40):
+            await limiter.acquire()
+            await limiter.release(0.01)
+
+    asyncio.run(_run())
+    assert int(limiter.limit) == 8
+
+
+def test_concurrency_baseline_follows_latency():
+    limiter = AdaptiveConcurrency(max_limit=8, initial_limit=8)
+
+    async def _run():
+        # one unusually fast request doesn't make the threshold permanently strict
+        await limiter.acquire()
+        await limiter.release(0.01)
+        for _ in range(200):
+            await limiter.acquire()
+            await limiter.release(1.0)
+        assert int(limiter.limit) == 8
+
+        # a sustained slowdown still backs off
+        await limiter.acquire()
+        await limiter.release(5.0)
+        assert int(limiter.limit) == 4
+
+    asyncio.run(_run())
+    assert limiter.baseline_latency == pytest.approx(1.4, abs=0.01)
+
+
+def test_engine_refunds_tokens_of_failed_attempts():
+    engine = RateLimitedEngine(tpm=6000)
+
+    async def _fail():
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        asyncio.run(engine.run(_fail, estimated_tokens=1000))
+    assert engine.tokens._tokens == pytest.approx(6000, abs=1.0)
+
+
+def test_engine_retries_rate_limits(fake_gemini):
+    fake_gemini.fail_next = [429, 503, 429]
+    client = _client(fake_gemini)
+    engine = RateLimitedEngine(rpm=600, tpm=100_000, max_concurrency=4, base_delay=0.01)
+
+    async def _run():
+        return await asyncio.gather(
+            *(
+                engine.run(
+                    lambda: client.aio.models.generate_content(
+                        model="fake-model", contents="hi"
+                    ),
+                    estimated_tokens=1000,
+                    actual_tokens=lambda r: r.usage_metadata.total_token_count,
+                )
+                for _ in range(5)
+            )
+        )
+
+    responses = asyncio.run(_run())
+
+    assert [r.text for r in responses] == ["Summary 1 from fake-model"] * 5
+    assert len(fake_gemini.generate_requests) == 5
+    assert fake_gemini.max_in_flight <= 4
+    assert engine.concurrency.limit < 4
+
+
+def test_engine_does_not_retry_client_errors(fake_gemini):
+    fake_gemini.fail_next = [400]
+    client = _client(fake_gemini)
+    engine = RateLimitedEngine(base_delay=0.01)
+
+    with pytest.raises(errors.ClientError):
+        asyncio.run(
+            engine.run(
+                lambda: client.aio.models.generate_content(
+                    model="fake-model", contents="hi"
+                )
+            )
+        )
+
+
+def test_engine_reused_across_event_loops():
+    engine = RateLimitedEngine(rpm=6000, max_concurrency=2)
+
+    async def _request(i: int) -> int:
+        await asyncio.sleep(0.01)
+        return i
+
+    async def _run():
+        # more requests than the limit, so they wait on the limiter and the bucket
+        return await asyncio.gather(
+            *(engine.run(lambda i=i: _request(i), estimated_tokens=1) for i in range(4))
+        )
+
+    assert asyncio.run(_run()) == [0, 1, 2, 3]
+    assert asyncio.run(_run()) == [0, 1, 2, 3]
+    assert engine.concurrency.in_flight == 0
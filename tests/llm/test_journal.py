@@ -0,0 +1,19 @@
+from deep_statutes.llm.journal import Journal
+
+
+def test_resume_after_partial_line(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = Journal(path)
+    journal.record("a", "done", tmp_path / "a.pdf")
+    # a crash in the middle of writing an entry
+    with open(path, "a") as f:
+        f.write('{"key": "b", "status": "do')
+
+    journal = Journal(path)
+    assert journal.get("b") is None
+    journal.record("c", "failed", tmp_path / "c.pdf", error="boom")
+
+    journal = Journal(path)
+    assert journal.is_done("a")
+    assert journal.get("c").status == "failed"
+    assert journal.get("c").outputs == []
@@ -0,0 +1,65 @@
+import time
+
+import pytest
+from google.genai import errors
+
+from deep_statutes.llm.client import LLMBackend, make_client
+from deep_statutes.llm.replay import ReplayOptions
+
+
+def test_replay_serves_recorded_responses_offline(tmp_path, fake_gemini):
+    recorder = make_client(
+        "test-key",
+        base_url=fake_gemini.base_url,
+        backend=LLMBackend(mode="record", recording_dir=tmp_path),
+    )
+    recorded = recorder.models.generate_content(model="test-model", contents="Hi")
+    assert len(list(tmp_path.glob("*.json"))) == 1
+
+    # nothing listens on this port, so any request that isn't replayed fails
+    replayer = make_client(
+        None,
+        base_url="http://127.0.0.1:9",
+        backend=LLMBackend(
+            mode="replay",
+            recording_dir=tmp_path,
+            replay_options=ReplayOptions(latency_median=0.05, latency_sigma=0.0),
+        ),
+    )
+    start = time.monotonic()
+    replayed = replayer.models.generate_content(model="test-model", contents="Hi")
+    assert time.monotonic() - start >= 0.05
+    assert replayed.text == recorded.text
+    assert len(fake_gemini.generate_requests) == 1
+
+    with pytest.raises(errors.ClientError) as e:
+        replayer.models.generate_content(model="test-model", contents="Unrecorded")
+    assert e.value.code == 404
+
+
+def test_replay_injects_rate_limits_and_errors(tmp_path, fake_gemini):
+    recorder = make_client(
+        "test-key",
+        base_url=fake_gemini.base_url,
+        backend=LLMBackend(mode="record", recording_dir=tmp_path),
+    )
+    recorder.models.generate_content(model="test-model", contents="Hi")
+
+    options = ReplayOptions.parse(
+        "latency_scale=0,rate_limit_rate=0.3,error_rate=0.2,seed=1"
+    )
+    replayer = make_client(
+        None,
+        backend=LLMBackend("replay", recording_dir=tmp_path, replay_options=options),
+    )
+    codes = []
+    for _ in range(200):
+        try:
+            replayer.models.generate_content(model="test-model", contents="Hi")
+            codes.append(200)
+        except errors.APIError as e:
+            codes.append(e.code)
+
+    assert 40 < codes.count(429) < 80
+    assert 20 < codes.count(500) < 60
+    assert codes.count(200) > 60
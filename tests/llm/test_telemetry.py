@@ -0,0 +1,47 @@
+import datetime
+
+import pytest
+
+from deep_statutes.llm.telemetry import (
+    LLMCall,
+    Telemetry,
+    read_calls,
+    summarize_calls,
+)
+
+
+def test_telemetry_summary_by_state_and_stage(tmp_path):
+    path = tmp_path / "calls.jsonl"
+    telemetry = Telemetry(path, state="co")
+
+    for latency in [1.0, 2.0, 3.0, 4.0]:
+        call = LLMCall(
+            time=datetime.datetime.now(datetime.timezone.utc),
+            state="co",
+            stage="summarize-pdf",
+            model="gemini-2.5-flash",
+            latency=latency,
+            prompt_tokens=1_000_000,
+            cached_tokens=0,
+            candidate_tokens=100_000,
+            total_tokens=1_100_000,
+        )
+        telemetry.record(call)
+
+    with pytest.raises(RuntimeError):
+        with telemetry.track("toc", "unpriced-model") as call:
+            call.retry(RuntimeError("429"))
+            raise RuntimeError("boom")
+
+    summary = summarize_calls(read_calls(path))
+    rows = {row["stage"]: row for row in summary.iter_rows(named=True)}
+
+    assert rows["summarize-pdf"]["calls"] == 4
+    assert rows["summarize-pdf"]["p50_latency"] == pytest.approx(3.0)
+    assert rows["summarize-pdf"]["tokens_per_sec"] == pytest.approx(440_000)
+    # $0.30 per million input tokens and $2.50 per million output tokens
+    assert rows["summarize-pdf"]["cost_usd"] == pytest.approx(4 * (0.30 + 0.25))
+
+    assert rows["toc"]["errors"] == 1
+    assert rows["toc"]["retries"] == 1
+    assert rows["toc"]["cost_usd"] == 0
@@ -0,0 +1,71 @@
+import datetime
+import threading
+import time
+
+from google.genai import types
+
+from deep_statutes.llm.uploads import UploadRegistry
+
+
+class _FakeFiles:
+    def __init__(self, lifetime: datetime.timedelta):
+        self.lifetime = lifetime
+        self.uploads = []
+        self._lock = threading.Lock()
+
+    def upload(self, file):
+        time.sleep(0.05)
+        with self._lock:
+            self.uploads.append(file)
+            n = len(self.uploads)
+        return types.File(
+            name=f"files/{n}",
+            uri=f"https://example.com/files/{n}",
+            mime_type="application/pdf",
+            expiration_time=datetime.datetime.now(datetime.timezone.utc) + self.lifetime,
+        )
+
+
+class _FakeClient:
+    def __init__(self, lifetime=datetime.timedelta(hours=48)):
+        self.files = _FakeFiles(lifetime)
+
+
+def test_upload_registry_reuses_files_across_runs(tmp_path):
+    pdf_path = tmp_path / "a.pdf"
+    pdf_path.write_bytes(b"pdf bytes")
+    client = _FakeClient()
+
+    registry = UploadRegistry(tmp_path / "uploads.json")
+    threads = [
+        threading.Thread(target=registry.upload, args=(client, pdf_path))
+        for _ in range(4)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # concurrent uploads of the same content are deduplicated
+    assert len(client.files.uploads) == 1
+
+    # a new run reuses the upload
+    file = UploadRegistry(tmp_path / "uploads.json").upload(client, pdf_path)
+    assert file.name == "files/1"
+    assert len(client.files.uploads) == 1
+
+    # but not under a different namespace (API key)
+    UploadRegistry(tmp_path / "uploads.json", namespace="other").upload(client, pdf_path)
+    assert len(client.files.uploads) == 2
+
+
+def test_upload_registry_reuploads_near_expiry(tmp_path):
+    pdf_path = tmp_path / "a.pdf"
+    pdf_path.write_bytes(b"pdf bytes")
+    client = _FakeClient(lifetime=datetime.timedelta(minutes=5))
+
+    registry = UploadRegistry(tmp_path / "uploads.json")
+    registry.upload(client, pdf_path)
+    registry.upload(client, pdf_path)
+
+    assert len(client.files.uploads) == 2
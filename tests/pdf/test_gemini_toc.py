@@ -0,0 +1,56 @@
+from google.genai import types
+import pymupdf
+
+from deep_statutes.llm.cache import ResponseCache
+from deep_statutes.pdf.llm_extract import gemini_toc
+from deep_statutes.pdf.toc import DocumentTOC, Header
+
+
+def _fake_query_toc_from_gemini(pdf_path):
+    """Reports an article header for every page that has one, like a perfect LLM would."""
+    doc = pymupdf.open(pdf_path)
+    headers = []
+    for page_idx, page in enumerate(doc):
+        text = page.get_text().strip()
+        if text.startswith("ARTICLE"):
+            headers.append(
+                Header(type="article", text=text, sub_text="", page=page_idx + 1)
+            )
+
+    header_types = ["article"]
+    if len(headers) > 0 and headers[0].page == 1 and headers[0].text == "ARTICLE 1":
+        header_types = ["title", "article"]
+
+    return types.GenerateContentResponse(
+        parsed=DocumentTOC(header_types=header_types, headers=headers)
+    )
+
+
+def test_windowed_toc_matches_whole_document(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        gemini_toc, "_query_toc_from_gemini", _fake_query_toc_from_gemini
+    )
+
+    pdf_path = tmp_path / "doc.pdf"
+    doc = pymupdf.open()
+    for i in range(23):
+        page = doc.new_page()
+        if i % 3 == 0:
+            page.insert_text((72, 72), f"ARTICLE {i // 3 + 1}")
+    doc.save(pdf_path)
+
+    cache = ResponseCache(tmp_path / "cache")
+    whole = gemini_toc._query_toc(pdf_path, cache, use_cache=False)
+    windowed = gemini_toc._query_toc_windowed(
+        pdf_path,
+        cache,
+        use_cache=False,
+        window_pages=7,
+        window_overlap=3,
+        max_workers=4,
+    )
+
+    assert windowed.header_types == ["title", "article"]
+    assert [(h.text, h.page) for h in windowed.headers] == [
+        (h.text, h.page) for h in whole.headers
+    ]
@@ -0,0 +1,81 @@
+import numpy as np
+
+from deep_statutes.pdf.header_array import HeaderArray
+from deep_statutes.pdf.manifest import SplitManifest
+from deep_statutes.pdf.split import _choose_split_headers, split_header_path
+from deep_statutes.pdf.toc import DocumentTOC, Header, HeaderTreeNode
+
+TOC = DocumentTOC(
+    header_types=["title", "article", "part", "section"],
+    headers=[
+        Header(type="title", text="TITLE 1", sub_text="GENERAL", page=1),
+        Header(type="article", text="ARTICLE 1", sub_text="First", page=1),
+        Header(type="section", text="1-1-101", sub_text="Definitions", page=2),
+        Header(type="section", text="1-1-102", sub_text="Scope", page=9),
+        Header(type="article", text="ARTICLE 2", sub_text="Second", page=20),
+        Header(type="part", text="PART 1", sub_text="General", page=21),
+        Header(type="section", text="1-2-101", sub_text="Definitions", page=22),
+        Header(type="article", text="ARTICLE 3", sub_text="Third", page=30),
+    ],
+)
+
+
+def test_matches_header_tree():
+    tree = HeaderArray.from_toc(TOC.model_copy(deep=True), num_pages=40)
+    root = HeaderTreeNode.from_toc(TOC.model_copy(deep=True), num_pages=40)
+
+    assert tree.to_tree().model_dump() == root.model_dump()
+    from_tree = HeaderArray.from_tree(root)
+    assert from_tree.header_types == TOC.header_types
+    for name in [
+        "parent",
+        "depth",
+        "type_id",
+        "page_start",
+        "page_end",
+        "subtree_end",
+    ]:
+        assert (getattr(from_tree, name) == getattr(tree, name)).all(), name
+
+    assert tree.parent.tolist() == [-1, 0, 1, 1, 0, 4, 5, 0]
+    assert tree.subtree_end.tolist() == [8, 4, 3, 4, 7, 7, 7, 8]
+    assert tree.children(0).tolist() == [1, 4, 7]
+    assert tree.path_text(6) == "TITLE 1--ARTICLE 2--PART 1--1-2-101"
+    assert tree.overlapping(21, 21).tolist() == [0, 4, 5]
+
+    # the same splits, in the same order, as the pydantic tree gives
+    for hint in [1, 8, 12, 40]:
+        nodes = _choose_split_headers(root, hint)
+        splits = tree.choose_splits(hint)
+        assert [tree.path_text(i) for i in splits] == [
+            split_header_path(node) for node in nodes
+        ]
+
+        split_nodes = [(i, tree.path_text(i)) for i in splits]
+        assert SplitManifest.from_array(
+            "a.pdf", 40, tree, split_nodes
+        ).nodes == SplitManifest.from_tree(
+            "a.pdf", 40, root, [(n, split_header_path(n)) for n in nodes]
+        ).nodes
+
+
+def test_save_load(tmp_path):
+    tree = HeaderArray.from_toc(TOC.model_copy(deep=True), num_pages=40)
+    tree.save(tmp_path / "headers.npz")
+    loaded = HeaderArray.load(tmp_path / "headers.npz")
+
+    assert loaded.strings == tree.strings
+    assert loaded.header(6) == tree.header(6)
+    assert loaded.to_tree().model_dump() == tree.to_tree().model_dump()
+
+
+def test_choose_splits_by_tokens():
+    tree = HeaderArray.from_toc(TOC.model_copy(deep=True), num_pages=40)
+    tokens = np.array([1000, 500, 100, 400, 450, 450, 440, 50])
+
+    # the title is over the cap; article 1's sections are closer to the target than it is
+    assert tree.choose_splits_by_tokens(tokens, 300, 600) == [7, 4, 3, 2]
+    # article 2 is over the cap, down to its section, which has no subheaders
+    assert tree.choose_splits_by_tokens(tokens, 300, 400) == [7, 6, 3, 2]
+    # article 1 is just over the target, so isn't broken up
+    assert tree.choose_splits_by_tokens(tokens, 450, 900) == [7, 4, 1]
@@ -0,0 +1,100 @@
+import pymupdf
+
+from deep_statutes.pdf import split
+from deep_statutes.pdf.local_toc import local_toc, toc_from_fonts, toc_from_outline
+from deep_statutes.pdf.toc import DocumentTOC, Header, HeaderTreeNode
+
+
+def _make_doc() -> pymupdf.Document:
+    doc = pymupdf.open()
+    for chapter in range(1, 4):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"CHAPTER {chapter} - THINGS {chapter}", fontsize=16)
+        for i in range(30):
+            page.insert_text((72, 100 + 20 * i), "Lorem ipsum dolor sit amet " * 3)
+        page = doc.new_page()
+        for i in range(30):
+            page.insert_text((72, 100 + 20 * i), "consectetur adipiscing elit " * 3)
+    return doc
+
+
+def test_toc_from_outline():
+    doc = _make_doc()
+    doc.set_toc(
+        [[1, f"CHAPTER {c}—THINGS {c}", 2 * c - 1] for c in range(1, 4)]
+        + [[2, "§ 101. Definitions", 1]]
+    )
+
+    toc, confidence = toc_from_outline(doc)
+
+    assert confidence == 1.0
+    assert toc.header_types == ["chapter"]
+    assert [(h.text, h.sub_text, h.page) for h in toc.headers] == [
+        ("CHAPTER 1", "THINGS 1", 1),
+        ("CHAPTER 2", "THINGS 2", 3),
+        ("CHAPTER 3", "THINGS 3", 5),
+    ]
+
+
+def test_toc_from_fonts():
+    doc = _make_doc()
+
+    assert toc_from_outline(doc) == (None, 0.0)
+
+    toc, confidence = toc_from_fonts(doc)
+    assert confidence == 1.0
+    assert [(h.text, h.page) for h in toc.headers] == [
+        ("CHAPTER 1", 1),
+        ("CHAPTER 2", 3),
+        ("CHAPTER 3", 5),
+    ]
+
+    assert local_toc(doc) == (toc, confidence, 1.0)
+
+
+def test_low_coverage_outline_falls_back_to_gemini(tmp_path, monkeypatch):
+    gemini_toc = DocumentTOC(
+        header_types=["chapter"],
+        headers=[Header(type="chapter", text="CHAPTER 1", sub_text="", page=1)],
+    )
+    calls = []
+
+    def _parse_toc(pdf_path, **kwargs):
+        calls.append(pdf_path)
+        return gemini_toc
+
+    monkeypatch.setattr(split, "parse_toc", _parse_toc)
+
+    # headers in the body font, so only the outline finds them
+    doc = pymupdf.open()
+    for i in range(6):
+        page = doc.new_page()
+        if i in (2, 4):
+            page.insert_text((72, 72), f"CHAPTER {i // 2} - THINGS")
+        page.insert_text((72, 100), "Lorem ipsum dolor sit amet " * 3)
+    # doesn't cover page 1, and chapter 3 isn't on its page
+    doc.set_toc([[1, "CHAPTER 1", 3], [1, "CHAPTER 2", 5], [1, "CHAPTER 3", 6]])
+
+    toc, confidence, verified = local_toc(doc)
+    assert toc is not None and 0.5 < confidence < 0.9 and verified < 0.9
+
+    assert split.find_toc(doc, tmp_path / "doc.pdf", min_local_confidence=0.5) is gemini_toc
+    assert calls == [tmp_path / "doc.pdf"]
+
+
+
+def test_multi_chapter_outline_builds_a_tree(tmp_path, monkeypatch):
+    monkeypatch.setattr(split, "parse_toc", None)  # must not be called
+
+    doc = _make_doc()
+    doc.set_toc([[1, f"CHAPTER {c}—THINGS {c}", 2 * c - 1] for c in range(1, 4)])
+    toc = split.find_toc(doc, tmp_path / "title.pdf")
+
+    # the chapters are all top-level, so they get a document header above them
+    root = HeaderTreeNode.from_toc(toc, len(doc))
+    assert root.header.text == "title"
+    assert [(c.header.text, c.page_range) for c in root.children] == [
+        ("CHAPTER 1", (1, 3)),
+        ("CHAPTER 2", (3, 5)),
+        ("CHAPTER 3", (5, 6)),
+    ]
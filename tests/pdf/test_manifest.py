@@ -0,0 +1,48 @@
+import pymupdf
+
+from deep_statutes.pdf.manifest import MANIFEST_NAME, SplitManifest
+from deep_statutes.pdf.split import split_pdf
+from deep_statutes.pdf.toc import DocumentTOC, Header, HeaderTreeNode
+
+TOC = DocumentTOC(
+    header_types=["title", "article"],
+    headers=[
+        Header(type="title", text="TITLE 1", sub_text="GENERAL", page=1),
+        Header(type="article", text="ARTICLE 1", sub_text="First", page=1),
+        Header(type="article", text="ARTICLE 2", sub_text="Second", page=4),
+    ],
+)
+
+
+def _make_doc(num_pages: int) -> pymupdf.Document:
+    doc = pymupdf.open()
+    for i in range(num_pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Page {i + 1}")
+    return doc
+
+
+def test_split_writes_single_manifest(tmp_path):
+    doc = _make_doc(6)
+    root = HeaderTreeNode.from_toc(TOC.model_copy(deep=True), num_pages=len(doc))
+
+    split_pdf(doc, root, tmp_path, max_num_pages_hint=4)
+
+    assert not list(tmp_path.glob("*_info.json"))
+
+    manifest = SplitManifest.read(tmp_path / MANIFEST_NAME)
+    assert manifest.document.num_pages == 6
+    assert len(manifest.nodes) == 3
+    assert [n.parent_id for n in manifest.nodes] == [None, 0, 0]
+
+    split_files = sorted(s.file_name for s in manifest.splits)
+    assert split_files == ["TITLE 1--ARTICLE 1.pdf", "TITLE 1--ARTICLE 2.pdf"]
+    for split in manifest.splits:
+        assert (tmp_path / split.file_name).exists()
+
+    split = next(s for s in manifest.splits if s.file_name.endswith("2.pdf"))
+    assert [h.text for h in manifest.path(split.node_id)] == ["TITLE 1", "ARTICLE 2"]
+
+    subtree = manifest.subtree(0)
+    assert [c.header.text for c in subtree.children] == ["ARTICLE 1", "ARTICLE 2"]
+    assert subtree.children[1].parent is subtree
@@ -0,0 +1,103 @@
+from deep_statutes.index.intervals import HeaderIntervals
+from deep_statutes.pdf.header_array import HeaderArray
+from deep_statutes.pdf.section_markdown import (
+    read_section_files,
+    write_section_markdown,
+)
+from deep_statutes.pdf.toc import DocumentTOC, Header
+from deep_statutes.pdf.token_stream import token_stream_lines
+
+TOKEN_STREAM = """<<PAGE 0>>
+<<LINE (0, 0, 0)>>
+<<SPAN_L>>
+TITLE 2
+<<LINE (0, 1, 0)>>
+<<SPAN_M_B>>
+ARTICLE 2
+<<LINE (0, 2, 0)>>
+<<SPAN_M>>
+Editor's note: not a section.
+<<LINE (0, 3, 0)>>
+<<INDENT>>
+<<SPAN_M_B>>
+2-2-701.
+<<SPAN_M>>
+Bills.
+<<LINE (0, 4, 0)>>
+<<INDENT>>
+<<SPAN_M>>
+(1) First
+<<LINE (0, 4, 1)>>
+<<SPAN_M>>
+continued.
+<<PAGE 1>>
+<<LINE (1, 0, 0)>>
+<<INDENT>>
+<<SPAN_M>>
+(2) Second.
+<<LINE (1, 1, 0)>>
+<<INDENT>>
+<<SPAN_M_B>>
+2-2-702.
+<<SPAN_M>>
+Definitions.
+"""
+
+TOC = DocumentTOC(
+    header_types=["title", "article", "section"],
+    headers=[
+        Header(type="title", text="TITLE 2", sub_text="", page=1),
+        Header(type="article", text="ARTICLE 2", sub_text="", page=1),
+        Header(type="section", text="2-2-701", sub_text="Bills.", page=1),
+        Header(type="section", text="2-2-702", sub_text="Definitions.", page=2),
+    ],
+)
+
+
+def test_token_stream_lines():
+    lines = list(token_stream_lines(TOKEN_STREAM.splitlines(keepends=True)))
+
+    assert [line.text for line in lines[2:4]] == [
+        "Editor's note: not a section.",
+        "2-2-701. Bills.",
+    ]
+    assert lines[3].indent == 1 and lines[3].page == 0
+    assert lines[6].page == 1
+    for line in lines:
+        assert TOKEN_STREAM[line.offset :].startswith(line.text.split(" ")[0])
+
+
+def test_write_section_markdown(tmp_path):
+    token_stream_path = tmp_path / "title02.txt"
+    token_stream_path.write_text(TOKEN_STREAM)
+
+    starts = [
+        TOKEN_STREAM.index("<<SPAN_L>>"),
+        TOKEN_STREAM.index("<<SPAN_M_B>>\nARTICLE"),
+        TOKEN_STREAM.index("<<INDENT>>\n<<SPAN_M_B>>\n2-2-701"),
+        TOKEN_STREAM.index("<<INDENT>>\n<<SPAN_M_B>>\n2-2-702"),
+    ]
+    tree = HeaderArray.from_toc(TOC.model_copy(deep=True), num_pages=2)
+    intervals = HeaderIntervals.build(tree, [(start, start + 1) for start in starts])
+
+    output_dir = tmp_path / "sections"
+    (output_dir / "stale").mkdir(parents=True)
+    files = write_section_markdown(token_stream_path, intervals, output_dir)
+
+    assert [f.file_name for f in files] == [
+        "TITLE 2--ARTICLE 2--2-2-701.md",
+        "TITLE 2--ARTICLE 2--2-2-702.md",
+    ]
+    assert read_section_files(output_dir) == files
+    assert not (output_dir / "stale").exists()
+
+    markdown = (output_dir / files[0].file_name).read_text()
+    assert markdown == (
+        "# TITLE 2 > ARTICLE 2 > 2-2-701\n"
+        "\n2-2-701. Bills.\n"
+        "\n(1) First\n"
+        "continued.\n"
+        "\n(2) Second.\n"
+    )
+    assert files[0].num_chars == len(markdown)
+    assert files[1].char_range == (starts[3], -1)
@@ -0,0 +1,34 @@
+from deep_statutes.pdf.split_text import split_markdown
+from deep_statutes.pdf.toc import DocumentTOC, Header, HeaderTreeNode
+
+TOC = DocumentTOC(
+    header_types=["title", "article"],
+    headers=[
+        Header(type="title", text="TITLE 1", sub_text="GENERAL", page=1),
+        Header(type="article", text="ARTICLE 1", sub_text="First", page=1),
+        Header(type="article", text="ARTICLE 2", sub_text="Second", page=2),
+        Header(type="article", text="ARTICLE 10", sub_text="Tenth", page=3),
+    ],
+)
+
+PAGE_TEXTS = {
+    0: "TITLE 1\nGENERAL\nARTICLE 1\nFirst\n1-1-101. Text a.",
+    1: "more a.\nARTICLE 2\nSecond\n1-2-101. Text b.",
+    2: "ARTICLE 10\nTenth\n1-10-101. Text c.",
+}
+
+
+def test_split_markdown_trims_shared_pages():
+    root = HeaderTreeNode.from_toc(TOC, num_pages=3)
+    article_1, article_2, article_10 = root.children
+
+    assert split_markdown(PAGE_TEXTS, article_1, article_2.header) == (
+        "# ARTICLE 1\n\nFirst\n1-1-101. Text a.\n\nmore a.\n"
+    )
+    assert split_markdown(PAGE_TEXTS, article_2, article_10.header) == (
+        "# ARTICLE 2\n\nSecond\n1-2-101. Text b.\n"
+    )
+
+    title = split_markdown(PAGE_TEXTS, root)
+    assert title.startswith("# TITLE 1\n\nGENERAL\n\n## ARTICLE 1\n\nFirst\n")
+    assert "## ARTICLE 10\n\nTenth\n1-10-101. Text c.\n" in title
@@ -1,6 +1,6 @@
 import tempfile
 
-from deep_statutes.pdf.parse import find_headers
+from deep_statutes.pdf.parse import find_headers, find_headers_with_ranges
 from deep_statutes.states.co.split import HEADER_GRAMMAR, HEADER_TYPES
 
 PART_7_FRAGMENT = """
@@ -59,3 +59,18 @@ def test_parse_part_7_with_newline():
     assert toc.headers[0].sub_text == "ENACTMENT OF LAWS REGARDING SENTENCING OF CRIMINAL OFFENDERS"
     assert toc.headers[1].text == "2-2-701"
     assert toc.headers[1].sub_text == "General assembly - bills regarding the sentencing of criminal offenders - legislative intent - definition."
+
+
+def test_header_ranges():
+    with tempfile.NamedTemporaryFile('w') as temp_file:
+        temp_file.write(PART_7_FRAGMENT)
+        temp_file.flush()
+
+        _, text_ranges = find_headers_with_ranges(
+            HEADER_GRAMMAR, HEADER_TYPES, temp_file.name
+        )
+
+    assert len(text_ranges) == 2
+    assert text_ranges[0][1] <= text_ranges[1][0]
+    assert "PART 7" in PART_7_FRAGMENT[slice(*text_ranges[0])]
+    assert "2-2-701" in PART_7_FRAGMENT[slice(*text_ranges[1])]
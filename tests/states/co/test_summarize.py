@@ -0,0 +1,308 @@
+import asyncio
+from pathlib import Path
+
+import pymupdf
+import pytest
+
+from deep_statutes.llm.batch import BatchRunner
+from deep_statutes.llm.client import LLMBackend
+from deep_statutes.llm.engine import RateLimitedEngine
+from deep_statutes.llm.journal import Journal
+from deep_statutes.llm.replay import ReplayOptions
+from deep_statutes.llm.telemetry import Telemetry, read_calls
+from deep_statutes.pdf.manifest import MANIFEST_NAME, SplitManifest
+from deep_statutes.pdf.split import split_pdf
+from deep_statutes.pdf.toc import DocumentTOC, Header, HeaderTreeNode
+from deep_statutes.states.co.summarize import (
+    SUMMARIZE_MODEL,
+    InputMode,
+    Summarizer,
+    _process_all,
+)
+from deep_statutes.states.co.token_stream import write_clean_token_stream
+
+TOC = DocumentTOC(
+    header_types=["title", "article"],
+    headers=[
+        Header(type="title", text="TITLE 1", sub_text="GENERAL", page=1),
+        Header(type="article", text="ARTICLE 1", sub_text="First", page=1),
+        Header(type="article", text="ARTICLE 2", sub_text="Second", page=4),
+    ],
+)
+
+
+def _split_args(
+    tmp_path: Path,
+    fake_gemini,
+    summary_dir: Path,
+    engine: RateLimitedEngine | None = None,
+    input_mode: InputMode = "auto",
+    **options,
+) -> list[tuple]:
+    """
+    The `_process_all` arguments to summarize a 6-page title's two articles into
+    `summary_dir`. The title is split into `tmp_path / "split"` the first time.
+    """
+    split_dir = tmp_path / "split"
+    if not split_dir.exists():
+        doc = pymupdf.open()
+        for i in range(6):
+            doc.new_page().insert_text((72, 72), f"Page {i + 1}")
+        split_dir.mkdir()
+        root = HeaderTreeNode.from_toc(TOC, num_pages=len(doc))
+        split_pdf(doc, root, split_dir, max_num_pages_hint=4)
+    manifest = SplitManifest.read(split_dir / MANIFEST_NAME)
+
+    summary_dir.mkdir(exist_ok=True)
+    summarizer = Summarizer(
+        api_key="test-key",
+        upload_registry_path=tmp_path / "uploads.json",
+        engine=engine,
+        base_url=fake_gemini.base_url,
+        input_mode=input_mode,
+        **options,
+    )
+    return [
+        (summarizer, manifest, s.node_id, split_dir / s.file_name, summary_dir)
+        for s in manifest.splits
+    ]
+
+
+def test_summarize_against_fake_endpoint(tmp_path, fake_gemini):
+    summary_dir = tmp_path / "summaries"
+    p_args = _split_args(
+        tmp_path,
+        fake_gemini,
+        summary_dir,
+        engine=RateLimitedEngine(max_concurrency=2, base_delay=0.01),
+        telemetry=Telemetry(tmp_path / "calls.jsonl", state="co"),
+    )
+    fake_gemini.fail_next = [429]
+    journal = Journal(tmp_path / "journal.jsonl")
+    asyncio.run(_process_all(p_args, num_candidates=2, journal=journal))
+
+    assert len(fake_gemini.uploads) == 2
+    assert len(fake_gemini.generate_requests) == 2
+
+    calls = read_calls(tmp_path / "calls.jsonl")
+    assert calls["stage"].to_list() == ["summarize-pdf"] * 2
+    assert calls["retries"].sum() == 1
+    assert calls["total_tokens"].to_list() == [120, 120]
+    assert sorted(p.name for p in summary_dir.glob("*.txt")) == [
+        "TITLE 1--ARTICLE 1_summary_1.txt",
+        "TITLE 1--ARTICLE 1_summary_2.txt",
+        "TITLE 1--ARTICLE 2_summary_1.txt",
+        "TITLE 1--ARTICLE 2_summary_2.txt",
+    ]
+
+    # resuming skips everything already done, even with a fresh journal object
+    journal = Journal(tmp_path / "journal.jsonl")
+    asyncio.run(_process_all(p_args, num_candidates=2, journal=journal, resume=True))
+    assert len(fake_gemini.generate_requests) == 2
+
+    # a deleted output or a changed request makes the split due again
+    (summary_dir / "TITLE 1--ARTICLE 1_summary_2.txt").unlink()
+    asyncio.run(_process_all(p_args, num_candidates=2, journal=journal, resume=True))
+    assert len(fake_gemini.generate_requests) == 3
+
+    asyncio.run(_process_all(p_args, num_candidates=1, journal=journal, resume=True))
+    assert len(fake_gemini.generate_requests) == 5
+
+
+def test_resume_retries_failed_splits(tmp_path, fake_gemini):
+    p_args = _split_args(
+        tmp_path,
+        fake_gemini,
+        tmp_path,
+        engine=RateLimitedEngine(max_concurrency=1, max_retries=0),
+    )
+    journal = Journal(tmp_path / "journal.jsonl")
+
+    fake_gemini.fail_next = [500]
+    with pytest.raises(RuntimeError):
+        asyncio.run(_process_all(p_args, num_candidates=1, journal=journal))
+    assert len(fake_gemini.generate_requests) == 1
+
+    asyncio.run(_process_all(p_args, num_candidates=1, journal=journal, resume=True))
+    assert len(fake_gemini.generate_requests) == 2
+    reloaded = Journal(tmp_path / "journal.jsonl")
+    assert [e.status for e in reloaded._entries.values()] == ["done", "done"]
+
+
+def test_auto_mode_sends_token_stream_text(tmp_path, fake_gemini):
+    doc = pymupdf.open()
+    for i in range(6):
+        page = doc.new_page()
+        if i in (0, 3):
+            page.insert_text((72, 72), f"ARTICLE {i // 3 + 1}")
+        for j in range(3):
+            page.insert_text((72, 100 + 20 * j), f"Statute text on page {i + 1}. " * 3)
+    token_stream_path = tmp_path / "doc.txt"
+    write_clean_token_stream(doc, token_stream_path)
+
+    root = HeaderTreeNode.from_toc(TOC, num_pages=len(doc))
+    article_1 = root.children[0]
+    manifest = SplitManifest.from_tree(
+        None, len(doc), root, [(article_1, "ARTICLE 1.pdf")], str(token_stream_path)
+    )
+    pdf_path = tmp_path / "ARTICLE 1.pdf"
+    doc.save(pdf_path)
+
+    summarizer = Summarizer(
+        api_key="test-key",
+        upload_registry_path=tmp_path / "uploads.json",
+        base_url=fake_gemini.base_url,
+    )
+    request = summarizer.prepare(manifest, manifest.splits[0].node_id, pdf_path, 1)
+    assert request.mode == "text"
+    assert request.text.startswith("# ARTICLE 1\n")
+    assert "page 4" not in request.text
+
+    asyncio.run(summarizer.summarize(request))
+    assert len(fake_gemini.uploads) == 0
+    parts = fake_gemini.generate_requests[0]["contents"][0]["parts"]
+    assert parts[0]["text"] == request.text
+
+
+def test_context_cache_is_shared_by_a_titles_splits(tmp_path, fake_gemini):
+    doc = pymupdf.open()
+    for i in range(40):
+        page = doc.new_page()
+        if i in (0, 20):
+            page.insert_text((72, 72), f"ARTICLE {i // 20 + 1}")
+        for j in range(30):
+            page.insert_text((72, 100 + 20 * j), f"Statute text on page {i + 1}. " * 3)
+    source_path = tmp_path / "title.pdf"
+    doc.save(source_path)
+    token_stream_path = tmp_path / "title.txt"
+    write_clean_token_stream(doc, token_stream_path)
+
+    toc = DocumentTOC(
+        header_types=["title", "article"],
+        headers=[
+            Header(type="title", text="TITLE 1", sub_text="GENERAL", page=1),
+            Header(type="article", text="ARTICLE 1", sub_text="First", page=1),
+            Header(type="article", text="ARTICLE 2", sub_text="Second", page=21),
+        ],
+    )
+    root = HeaderTreeNode.from_toc(toc, num_pages=len(doc))
+    split_dir = tmp_path / "split"
+    split_dir.mkdir()
+    split_nodes = split_pdf(doc, root, split_dir, max_num_pages_hint=25)
+    manifest = SplitManifest.from_tree(
+        str(source_path),
+        len(doc),
+        root,
+        [(node, f"{header_path}.pdf") for node, header_path in split_nodes],
+        str(token_stream_path),
+    )
+
+    summarizer = Summarizer(
+        api_key="test-key",
+        upload_registry_path=tmp_path / "uploads.json",
+        engine=RateLimitedEngine(max_concurrency=2, base_delay=0.01),
+        base_url=fake_gemini.base_url,
+        context_cache=True,
+    )
+    p_args = [
+        (summarizer, manifest, s.node_id, split_dir / s.file_name, tmp_path)
+        for s in manifest.splits
+    ]
+    journal = Journal(tmp_path / "journal.jsonl")
+    asyncio.run(_process_all(p_args, num_candidates=1, journal=journal))
+
+    assert fake_gemini.num_caches_created == 1
+    assert fake_gemini.caches == {}  # deleted once both splits were done
+    assert len(fake_gemini.uploads) == 0
+    assert len(fake_gemini.generate_requests) == 2
+    for body in fake_gemini.generate_requests:
+        assert body["cachedContent"] == "cachedContents/1"
+        assert len(body["contents"][0]["parts"]) == 1
+
+
+def test_hierarchical_summaries_build_on_child_summaries(tmp_path, fake_gemini):
+    p_args = _split_args(tmp_path, fake_gemini, tmp_path)
+    journal = Journal(tmp_path / "journal.jsonl")
+    asyncio.run(
+        _process_all(p_args, num_candidates=1, journal=journal, hierarchical=True)
+    )
+
+    assert len(fake_gemini.generate_requests) == 3
+    parent_prompt = fake_gemini.generate_requests[-1]["contents"][0]["parts"][0]["text"]
+    assert "## ARTICLE 1 (First)\n\nSummary 1 from" in parent_prompt
+    assert "## ARTICLE 2 (Second)\n\nSummary 1 from" in parent_prompt
+    assert (tmp_path / "TITLE 1_summary_1.txt").exists()
+
+    asyncio.run(
+        _process_all(
+            p_args, num_candidates=1, journal=journal, resume=True, hierarchical=True
+        )
+    )
+    assert len(fake_gemini.generate_requests) == 3
+
+
+def test_hierarchical_summaries_skip_empty_candidates(tmp_path, fake_gemini):
+    p_args = _split_args(tmp_path, fake_gemini, tmp_path)
+    fake_gemini.empty_candidates = {0}
+    journal = Journal(tmp_path / "journal.jsonl")
+    asyncio.run(
+        _process_all(p_args, num_candidates=2, journal=journal, hierarchical=True)
+    )
+
+    parent_prompt = fake_gemini.generate_requests[-1]["contents"][0]["parts"][0]["text"]
+    assert "## ARTICLE 1 (First)\n\nSummary 2 from" in parent_prompt
+    assert not (tmp_path / "TITLE 1_summary_1.txt").exists()
+    assert (tmp_path / "TITLE 1_summary_2.txt").exists()
+
+    # a split without any summary fails, and so does its parent
+    fake_gemini.empty_candidates = {0, 1}
+    journal = Journal(tmp_path / "empty.jsonl")
+    with pytest.raises(RuntimeError):
+        asyncio.run(_process_all(p_args, num_candidates=2, journal=journal))
+    assert [e.status for e in journal._entries.values()] == ["failed", "failed"]
+
+
+def test_batch_mode_submits_splits_as_a_batch_job(tmp_path, fake_gemini):
+    summary_dir = tmp_path / "summaries"
+    p_args = _split_args(tmp_path, fake_gemini, summary_dir)
+    batch = BatchRunner(
+        p_args[0][0].client,
+        SUMMARIZE_MODEL,
+        tmp_path / "batch_jobs.json",
+        poll_interval=0.01,
+    )
+    journal = Journal(tmp_path / "journal.jsonl")
+    asyncio.run(_process_all(p_args, 2, journal=journal, batch=batch))
+
+    assert len(fake_gemini.batches) == 1
+    assert len(fake_gemini.generate_requests) == 0
+    assert len(list(summary_dir.glob("*_summary_*.txt"))) == 4
+    assert (summary_dir / "TITLE 1--ARTICLE 2_summary_2.txt").read_text() != ""
+
+    # finished jobs are dropped from the state file
+    assert (tmp_path / "batch_jobs.json").read_text().strip() == "{}"
+
+
+def test_recorded_run_replays_offline(tmp_path, fake_gemini):
+    def run(backend: LLMBackend, name: str) -> None:
+        p_args = _split_args(
+            tmp_path,
+            fake_gemini,
+            tmp_path / name,
+            engine=RateLimitedEngine(base_delay=0.01, max_retries=20),
+            input_mode="pdf",
+            backend=backend,
+        )
+        journal = Journal(tmp_path / f"{name}.jsonl")
+        asyncio.run(_process_all(p_args, 2, journal=journal))
+
+    recording_dir = tmp_path / "recording"
+    run(LLMBackend(mode="record", recording_dir=recording_dir), "recorded")
+    assert len(fake_gemini.uploads) == 2
+
+    # uploads and summaries all come from the recording, despite injected 429s
+    fake_gemini.stop()
+    options = ReplayOptions(latency_scale=0, rate_limit_rate=0.3, seed=0)
+    run(LLMBackend("replay", recording_dir, options), "replayed")
+    for path in (tmp_path / "recorded").glob("*.txt"):
+        assert (tmp_path / "replayed" / path.name).read_text() == path.read_text()
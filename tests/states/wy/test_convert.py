@@ -0,0 +1,33 @@
+import pymupdf
+
+from deep_statutes.states.wy.convert import convert_title
+
+
+def test_convert_title_skips_up_to_date_stages(tmp_path):
+    pdf_path = tmp_path / "title01.pdf"
+    doc = pymupdf.open()
+    for i in range(3):
+        doc.new_page().insert_text((72, 72), f"Page {i + 1}", fontsize=12)
+    doc.save(pdf_path)
+
+    token_stream_path = tmp_path / "title01.txt"
+    toc_path = tmp_path / "title01.md"
+
+    index_path = tmp_path / "sections.sqlite"
+    record, timings = convert_title(
+        pdf_path, token_stream_path, toc_path, tmp_path, {}, index_path
+    )
+    assert set(timings) == {"token_stream", "toc", "sections"}
+    assert token_stream_path.exists() and toc_path.exists()
+
+    record, timings = convert_title(
+        pdf_path, token_stream_path, toc_path, tmp_path, record, index_path
+    )
+    assert timings == {}
+
+    # a deleted output is rebuilt on its own
+    toc_path.unlink()
+    record, timings = convert_title(
+        pdf_path, token_stream_path, toc_path, tmp_path, record
+    )
+    assert set(timings) == {"toc"}
@@ -0,0 +1,16 @@
+from deep_statutes.build import code_version
+
+
+def test_code_version_tracks_module_source(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(tmp_path)
+    (tmp_path / "stage_a.py").write_text("X = 1\n")
+    (tmp_path / "stage_b.py").write_text("Y = 1\n")
+
+    before = code_version("stage_a", "stage_b")
+    assert code_version("stage_b", "stage_a") == before
+    assert code_version("stage_a") != before
+
+    (tmp_path / "stage_a.py").write_text("X = 2\n")
+    code_version.cache_clear()
+    assert code_version("stage_a", "stage_b") != before
+    assert code_version() == code_version()
@@ -0,0 +1,85 @@
+import hashlib
+import zipfile
+
+from deep_statutes.download import (
+    Download,
+    DownloadManifest,
+    Downloader,
+    extract_zip,
+)
+
+
+def test_downloads_resume_and_skip_unchanged_files(tmp_path, file_server):
+    a = b"a" * 300_000
+    b = b"b" * 100_000
+    file_server.files = {"/a.pdf": a, "/b.pdf": b}
+    file_server.truncate_next = {"/a.pdf"}
+
+    downloads = [
+        Download(f"{file_server.base_url}/a.pdf", tmp_path / "a.pdf"),
+        Download(f"{file_server.base_url}/b.pdf", tmp_path / "sub" / "b.pdf"),
+        Download(f"{file_server.base_url}/missing.pdf", tmp_path / "missing.pdf"),
+    ]
+    results = Downloader(tmp_path, max_per_host=2).download_all(downloads)
+
+    assert [r.status for r in results] == ["downloaded", "downloaded", "missing"]
+    assert (tmp_path / "a.pdf").read_bytes() == a
+    assert (tmp_path / "sub" / "b.pdf").read_bytes() == b
+    assert not (tmp_path / "a.pdf.part").exists()
+
+    # the dropped download of a.pdf was continued where it stopped
+    a_requests = [h for path, h in file_server.requests if path == "/a.pdf"]
+    assert len(a_requests) == 2
+    offset = int(a_requests[1]["Range"].removeprefix("bytes=").rstrip("-"))
+    assert 0 < offset <= 150_000
+
+    manifest = DownloadManifest.load(tmp_path / "download_manifest.json")
+    record = manifest.files[f"{file_server.base_url}/a.pdf"]
+    assert record.sha256 == hashlib.sha256(a).hexdigest()
+
+    # a second run only transfers what changed
+    file_server.files["/b.pdf"] = b"c" * 1000
+    file_server.requests.clear()
+    results = Downloader(tmp_path).download_all(downloads[:2])
+
+    assert [r.status for r in results] == ["unchanged", "downloaded"]
+    assert (tmp_path / "sub" / "b.pdf").read_bytes() == b"c" * 1000
+
+
+def test_download_checksum_mismatch_fails(tmp_path, file_server):
+    file_server.files = {"/a.pdf": b"data"}
+    download = Download(
+        f"{file_server.base_url}/a.pdf", tmp_path / "a.pdf", sha256="0" * 64
+    )
+    result = Downloader(tmp_path).download(download)
+
+    assert result.status == "failed"
+    assert not (tmp_path / "a.pdf").exists()
+
+
+def test_extract_zip_selects_and_skips_extracted_files(tmp_path):
+    zip_path = tmp_path / "all.zip"
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("usc01.pdf", b"title 1" * 1000)
+        zf.writestr("usc02.pdf", b"title 2" * 1000)
+        zf.writestr("notes/usc02-notes.txt", b"notes")
+        zf.writestr("../evil.pdf", b"evil")
+
+    out_dir = tmp_path / "out"
+    paths = extract_zip(zip_path, out_dir, include=["usc0*.pdf", "*.txt"])
+
+    assert sorted(p.relative_to(out_dir).as_posix() for p in paths) == [
+        "notes/usc02-notes.txt",
+        "usc01.pdf",
+        "usc02.pdf",
+    ]
+    assert (out_dir / "usc02.pdf").read_bytes() == b"title 2" * 1000
+    assert not (tmp_path / "evil.pdf").exists()
+
+    # unchanged files aren't rewritten; changed ones are
+    (out_dir / "usc01.pdf").write_bytes(b"title 0" * 1000)
+    mtime = (out_dir / "usc02.pdf").stat().st_mtime_ns
+    extract_zip(zip_path, out_dir, include=["usc0*.pdf"])
+
+    assert (out_dir / "usc01.pdf").read_bytes() == b"title 1" * 1000
+    assert (out_dir / "usc02.pdf").stat().st_mtime_ns == mtime
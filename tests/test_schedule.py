@@ -0,0 +1,38 @@
+from deep_statutes.schedule import Progress, Task, run_tasks
+
+
+def _square(x: int) -> int:
+    return x * x
+
+
+def test_run_tasks_largest_first_with_follow_ups():
+    order = []
+
+    def _then(key):
+        def _f(result):
+            order.append(key)
+            if key == "small":
+                return [Task(key="follow_up", fn=_square, args=(result,), num_pages=1)]
+            return []
+
+        return _f
+
+    tasks = [
+        Task(key="small", fn=_square, args=(2,), num_pages=1, then=_then("small")),
+        Task(key="large", fn=_square, args=(3,), num_pages=10, then=_then("large")),
+    ]
+
+    progress = Progress()
+    results = run_tasks(tasks, num_jobs=1, progress=progress)
+
+    assert order == ["large", "small"]
+    assert results == {"large": 9, "small": 4, "follow_up": 16}
+    assert progress.done_pages == progress.total_pages == 12
+
+
+def test_run_tasks_process_pool():
+    tasks = [Task(key=str(i), fn=_square, args=(i,), num_pages=i) for i in range(8)]
+
+    results = run_tasks(tasks, num_jobs=2)
+
+    assert results == {str(i): i * i for i in range(8)}